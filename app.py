@@ -1,26 +1,30 @@
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context, g, send_from_directory
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
-from config import Config
+import os
+import datetime
+from config import config_by_name, engine_options
 from sqlalchemy.exc import IntegrityError
 import logging
-from logging.handlers import RotatingFileHandler
-from flask_login import LoginManager, login_required, UserMixin
-from flask_bcrypt import Bcrypt
+from decimal import Decimal
+from flask_login import LoginManager, current_user, login_required, login_user, logout_user, UserMixin
 from flask_wtf.csrf import CSRFProtect
 from flask_caching import Cache
 from celery import Celery
+import click
+from flask.cli import AppGroup
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField
 from wtforms.validators import DataRequired, Email
+from services.replicas import RoutingSession
 
-# Create SQLAlchemy, Migrate, Bcrypt, CSRFProtect, Cache, and Celery instances
-db = SQLAlchemy()
+# Create SQLAlchemy, Migrate, CSRFProtect, Cache, and Celery instances
+# GET requests may read from replica binds (see services/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
-bcrypt = Bcrypt()
 csrf = CSRFProtect()
 cache = Cache(config={'CACHE_TYPE': 'simple'})
 celery = Celery()
@@ -29,23 +33,50 @@ class LoginForm(FlaskForm):
     email_address = StringField('Email Address', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
 
-def create_app():
+def create_app(config_name=None):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    config_name = config_name or os.environ.get('APP_CONFIG', 'development')
+    app.config.from_object(config_by_name[config_name])
+    app.config['CONFIG_NAME'] = config_name
+    options = engine_options(app.config)
+    if options and app.config['DB_POOL_INSTRUMENTATION']:
+        from services.pool_stats import InstrumentedQueuePool
+        options['poolclass'] = InstrumentedQueuePool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+    # orjson-backed JSON responses, with ISO dates and numeric Decimals
+    from services.fast_json import FastJSONProvider
+    app.json = FastJSONProvider(app)
 
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     CORS(app)
+
+    # Behind trusted reverse proxies, remote_addr (rate limits, idempotency
+    # scopes) comes from X-Forwarded-For; otherwise the header is ignored
+    if app.config['TRUSTED_PROXY_COUNT']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'],
+                                x_proto=app.config['TRUSTED_PROXY_COUNT'])
+
+    # Per-endpoint latency histograms and header-triggered deep profiling (opt-in)
+    from services.profiling import profiler
+    profiler.init_app(app)
+
+    # Per-route token buckets, checked before any view (and so any DB or hashing work)
+    from services.rate_limit import rate_limiter
+    rate_limiter.init_app(app)
     
+    # Route reads of GET requests to replicas, except just after a client's write
+    from services import replicas
+    replicas.init_app(app)
+
     # Initialize login manager
     login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'login'  # Set the login view
 
-    # Initialize bcrypt
-    bcrypt.init_app(app)
-
     # Initialize CSRF protection
     csrf.init_app(app)
 
@@ -55,15 +86,26 @@ def create_app():
     # Initialize Celery
     celery.conf.update(app.config)
     celery.conf.update(
-        result_backend=Config.CELERY_RESULT_BACKEND,
-        broker_url=Config.CELERY_BROKER_URL
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+        broker_url=app.config['CELERY_BROKER_URL'],
+        task_always_eager=app.config['CELERY_TASK_ALWAYS_EAGER'],
+        task_eager_propagates=app.config['CELERY_TASK_ALWAYS_EAGER'],
+        # Eager results are stored too, so /tasks/<id> works the same in tests
+        task_store_eager_result=True
     )
 
-    # Setup logging
+    # Run Celery tasks inside the application context
+    class ContextTask(celery.Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery.Task = ContextTask
+
+    # Setup logging: queue + background writer, JSON lines, sampled repeats
     if not app.debug:
-        handler = RotatingFileHandler('app.log', maxBytes=10000, backupCount=1)
-        handler.setLevel(logging.INFO)
-        app.logger.addHandler(handler)
+        from services.log_pipeline import setup_logging
+        setup_logging(app)
 
 
     # Import models after initializing db and migrate
@@ -77,14 +119,209 @@ def create_app():
     from models.Customer import Customer
     from models.Card import Card
     from models.Credit import Credit
+    from models.LedgerEntry import LedgerEntry
+    from models.JobWatermark import JobWatermark
+    from models.LoanReconciliation import LoanReconciliation
+    from models.IdempotencyKey import IdempotencyKey
+    from models.AgencyStats import AgencyStats
+    from models.AgencyDailyStats import AgencyDailyStats
+    from models.FxRate import FxRate
+    from models.EodBalance import EodBalance
+
+    # Services depend on the models, so they are imported after them
+    from services import ledger
+    from services.money import Money
+    from services import fx
+    fx.rate_cache.init_app(app)
+    from services.transfer import transfer_engine, TransferError
+    transfer_engine.init_app(app)
+    from services.fraud import fraud_engine
+    fraud_engine.init_app(app)
+    from services.transfer_batch import apply_batch, apply_batch_task, parse_ndjson
+    from services import statements
+    from services import repayments
+    from services import rollups
+    from services import query_plans
+    query_plans.init_app(app)
+    from services import importer
+    importer.init_app(app)
+    from services.idempotency import idempotent, idempotency_store
+    from services.internal_api import internal_only
+    idempotency_store.init_app(app)
+    from services.entity_cache import entity_cache
+    from services.serialization import serializer_for
+    entity_cache.init_app(app, {
+        User: 'customer',
+        Account: 'account',
+        Agency: 'agency',
+        Loan: 'loan',
+        Repayment: 'repayment'
+    })
+
+    def cached_dict(kind, model, entity_id):
+        def load():
+            return serializer_for(model).get(entity_id)
+        # A replica may lag behind the commit that just evicted this key:
+        # only keep what it returns for as long as the read-your-writes window
+        ttl = app.config['READ_YOUR_WRITES_WINDOW'] if g.get('use_replica') else None
+        return entity_cache.get_or_load(kind, entity_id, load, ttl=ttl)
+
+    from services import tasks
+    tasks.init_app(app)
+
+    from services.passwords import password_hasher, HashingBusy
+    password_hasher.init_app(app)
+    from services import identity
+    identity.identity_cache.init_app(app, {User: 'identity'})
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return identity.load_identity(user_id, app.config['IDENTITY_SESSION_MAX_AGE'])
+
+    # Loan commands; NumPy is only needed when they run
+    loans_cli = AppGroup('loans', help='Loan amortization and interest accrual.')
+
+    @loans_cli.command('accrue')
+    @click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Accrue up to this date (default: today).')
+    def accrue_loans(as_of):
+        from services.amortization import accrue_interest
+        result = accrue_interest(as_of.date() if as_of else None)
+        click.echo(f"Accrued {result['interest']} on {result['loans']} loans through {result['as_of']}")
+
+    @loans_cli.command('schedule')
+    @click.argument('loan_id', type=int)
+    def loan_schedule(loan_id):
+        from services.amortization import loan_schedule as build_schedule
+        loan = Loan.query.get(loan_id)
+        if not loan:
+            raise click.ClickException(f"Loan {loan_id} not found")
+        for row in build_schedule(loan):
+            click.echo(f"{row['period']:>4} {row['payment']:>12.2f} {row['interest']:>12.2f} "
+                       f"{row['principal']:>12.2f} {row['balance']:>14.2f}")
+
+    @loans_cli.command('post-repayments')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def post_repayments_file(path):
+        """Post a CSV (loan_id,repayment_date,repayment_amount) or NDJSON file."""
+        import csv
+        with open(path, newline='') as f:
+            items = list(csv.DictReader(f)) if path.endswith('.csv') else list(parse_ndjson(f))
+        result = repayments.post_repayments(items)
+        click.echo(f"{result['accepted']} repayments posted on {result['loans_updated']} loans, "
+                   f"{result['rejected']} rejected")
+        for item in result['results']:
+            if item['status'] == 'rejected':
+                click.echo(f"  line {item['index'] + 1}: {item['error']}")
+
+    @loans_cli.command('reconcile')
+    def reconcile_loans():
+        result = repayments.reconcile()
+        click.echo(f"{result['loans_checked']} loans checked, {len(result['mismatches'])} out of balance")
+        for mismatch in result['mismatches']:
+            click.echo(f"  loan {mismatch['loan_id']}: outstanding {mismatch['outstanding_balance']:.2f}, "
+                       f"expected {mismatch['expected_balance']:.2f}")
+
+    app.cli.add_command(loans_cli)
+
+    agencies_cli = AppGroup('agencies', help='Agency rollups.')
+
+    @agencies_cli.command('backfill-stats')
+    def backfill_agency_stats():
+        result = rollups.backfill()
+        click.echo(f"Rebuilt stats for {result['agencies']} agencies, {result['days']} agency-days "
+                   f"(ledger watermark {result['watermark']})")
+
+    @agencies_cli.command('update-stats')
+    def update_agency_stats():
+        result = rollups.apply_ledger()
+        click.echo(f"Applied {result['entries']} ledger entries (watermark {result['watermark']})")
+
+    @agencies_cli.command('reaggregate-stats')
+    @click.option('--days', default=rollups.REAGGREGATE_DAYS, show_default=True, type=int)
+    def reaggregate_agency_stats(days):
+        result = rollups.reaggregate(days)
+        click.echo(f"Rebuilt stats for {result['agencies']} agencies, {result['days']} agency-days "
+                   f"since {result['since'].isoformat()}")
+
+    app.cli.add_command(agencies_cli)
+
+    fx_cli = AppGroup('fx', help='Exchange rates and revaluation of foreign-currency balances.')
+
+    @fx_cli.command('set-rate')
+    @click.argument('base')
+    @click.argument('quote')
+    @click.argument('rate', type=click.FloatRange(min=0, min_open=True))
+    @click.option('--date', 'effective_date', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Effective from this date (default: today).')
+    def set_fx_rate(base, quote, rate, effective_date):
+        fx.rate_cache.set_rates([{
+            'base_currency': base.upper(), 'quote_currency': quote.upper(), 'rate': Decimal(str(rate)),
+            'effective_date': effective_date.date() if effective_date else datetime.date.today(),
+        }])
+        click.echo(f"1 {base.upper()} = {rate} {quote.upper()}")
+
+    @fx_cli.command('load-rates')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    def load_fx_rates(path):
+        """Load a CSV file (base_currency,quote_currency,rate,effective_date)."""
+        import csv
+        with open(path, newline='') as f:
+            rates = [{
+                'base_currency': row['base_currency'].strip().upper(),
+                'quote_currency': row['quote_currency'].strip().upper(),
+                'rate': Decimal(row['rate']),
+                'effective_date': datetime.date.fromisoformat(row['effective_date'].strip()),
+            } for row in csv.DictReader(f)]
+        fx.rate_cache.set_rates(rates)
+        click.echo(f"Loaded {len(rates)} rates")
+
+    @fx_cli.command('revalue')
+    @click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Revalue at the rates effective on this date (default: today).')
+    def revalue_balances(as_of):
+        result = fx.revalue(as_of.date() if as_of else None)
+        for currency, total in result['currencies'].items():
+            click.echo(f"{currency}: {total['accounts']} accounts, {total['base_value']:.2f} "
+                       f"{result['base_currency']} ({total['change']:+.2f})")
+        if result['missing_rates']:
+            click.echo(f"No rate for: {', '.join(result['missing_rates'])}")
+
+    app.cli.add_command(fx_cli)
+
+    eod_cli = AppGroup('eod', help='End-of-day reconciliation and statements.')
+
+    @eod_cli.command('run')
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Day to reconcile (default: yesterday).')
+    @click.option('--workers', type=int, help='Processes (default: EOD_WORKERS).')
+    def run_eod(day, workers):
+        from services import eod
+        result = eod.run_eod(day.date() if day else None, workers)
+        click.echo(f"{result['day']}: {result['entities']} balances of {result['customers']} customers "
+                   f"in {result['partitions']} partitions, {result['movements']} movements, "
+                   f"{result['statements']} statements, {result['drifted']} out of balance "
+                   f"({result['seconds']:.1f}s)")
+        for item in result['drift']:
+            click.echo(f"  {item['kind']} {item['entity_id']}: actual {item['actual_balance']:.2f}, "
+                       f"expected {item['expected_balance']:.2f} ({item['drift']:+.2f})")
+
+    @eod_cli.command('drift')
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Day of the run (default: yesterday).')
+    def eod_drift(day):
+        from services import eod
+        day = day.date() if day else datetime.date.today() - datetime.timedelta(days=1)
+        for item in eod.drift_report(day):
+            click.echo(f"{item['kind']} {item['entity_id']} (customer {item['customer_id']}): "
+                       f"actual {item['actual_balance']:.2f}, expected {item['expected_balance']:.2f} "
+                       f"({item['drift']:+.2f})")
+
+    app.cli.add_command(eod_cli)
 
     @app.errorhandler(404)
     def page_not_found(error):
-        app.logger.error(f"Page not found: {error}")
+        app.logger.warning("Page not found", extra={'path': request.path, 'sample_key': 'not_found'})
         return render_template('404.html'), 404
 
     @app.errorhandler(500)
@@ -108,7 +345,17 @@ def create_app():
     
         user = User.query.filter_by(email_address=email).first()
 
-        if user and user.check_password(password):  # Ensure User model has a method to check password
+        try:
+            # Unknown emails still pay for one hash, so timing does not reveal registered ones
+            valid = user.check_password(password) if user is not None else password_hasher.reject(password)
+        except HashingBusy:
+            return jsonify({'error': 'Too many login attempts in progress, retry shortly'}), 503, {'Retry-After': '1'}
+
+        if valid:
+            if db.session.is_modified(user):
+                # The password hash was upgraded to the current algorithm/cost
+                db.session.commit()
+            login_user(identity.remember(user))
             return jsonify({'message': 'Login successful'}), 200
         else:
             return jsonify({'error': 'Invalid credentials'}), 401
@@ -129,8 +376,8 @@ def create_app():
                 if field not in data:
                     return jsonify({"error": f"Missing required field: {field}"}), 400
         
-            # Hash the password before storing
-            hashed_password = generate_password_hash(data['password'])
+            # Hash the password before storing (bcrypt, in the hashing pool)
+            hashed_password = password_hasher.hash(data['password'])
         
             new_user = User(
                 id=data.get('id'),
@@ -151,7 +398,12 @@ def create_app():
         
             db.session.add(new_user)
             db.session.commit()
-            return jsonify({"message": "User created successfully!"}), 201
+            task_id = tasks.enqueue(tasks.send_welcome, new_user.id)
+            status_url = url_for('get_task_status', token=tasks.status_token(task_id, new_user.id)) if task_id else None
+            return jsonify({"message": "User created successfully!", "task_id": task_id,
+                            "status_url": status_url}), 201
+        except HashingBusy:
+            return jsonify({"error": "Server busy, retry shortly"}), 503, {'Retry-After': '1'}
         except IntegrityError:
             db.session.rollback()
             return jsonify({"error": "User with this email already exists!"}), 400
@@ -168,17 +420,23 @@ def create_app():
                 if field not in data:
                     return jsonify({"error": f"Missing required field: {field}"}), 400
 
+            currency = data.get('currency', app.config['FX_BASE_CURRENCY'])
+            fx.check_amount(data['balance'], currency)
             new_account = Account(
                 customer_id=data['customer_id'],
                 account_number=data['account_number'],
                 account_type=data['account_type'],
-                balance=data['balance'],
+                balance=Money.of(data['balance']),
+                currency=currency,
                 agency_id=data['agency_id'],
                 user_id=data['user_id']
             )
             db.session.add(new_account)
+            rollups.record_account(new_account)
             db.session.commit()
             return jsonify({"message": "Account created successfully!"}), 201
+        except fx.FxError as e:
+            return jsonify({"error": str(e)}), e.status_code
         except IntegrityError:
             db.session.rollback()
             return jsonify({"error": "Account with this number already exists!"}), 400
@@ -189,38 +447,160 @@ def create_app():
     @app.route('/logout', methods=['GET'])
     def logout():
         session.pop('user_id', None)
+        identity.forget()
+        logout_user()
         return jsonify({"message": "Logged out successfully"}), 200
 
     @app.route('/customer/<int:customer_id>', methods=['GET'])
     def get_customer_info(customer_id):
-        customer = User.query.get(customer_id)
+        customer = cached_dict('customer', User, customer_id)
         if customer:
-            return jsonify(customer.to_dict())
+            return jsonify(customer)
         else:
             return jsonify({"error": "Customer not found"}), 404
 
     @app.route('/account/<int:account_id>', methods=['GET'])
     def get_account_details(account_id):
-        account = Account.query.get(account_id)
+        account = cached_dict('account', Account, account_id)
         if account:
-            return jsonify(account.to_dict())
+            return jsonify(account)
         else:
             return jsonify({"error": "Account not found"}), 404
 
+    @app.route('/accounts', methods=['GET'])
+    def list_accounts():
+        try:
+            page = statements.accounts_page(
+                user_id=request.args.get('user_id', type=int),
+                cursor=request.args.get('cursor'),
+                limit=statements.page_size(request.args.get('limit'))
+            )
+        except statements.InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(page)
+
+    @app.route('/account/<int:account_id>/transactions', methods=['GET'])
+    def get_account_transactions(account_id):
+        if not db.session.query(Account.id).filter_by(id=account_id).first():
+            return jsonify({"error": "Account not found"}), 404
+
+        fmt = request.args.get('format', 'json')
+        if fmt in ('ndjson', 'csv'):
+            mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+            response = Response(
+                stream_with_context(statements.stream_transactions(account_id, fmt)),
+                mimetype=mimetype
+            )
+            if fmt == 'csv':
+                response.headers['Content-Disposition'] = f'attachment; filename=account-{account_id}.csv'
+            return response
+
+        try:
+            page = statements.transactions_page(
+                account_id,
+                cursor=request.args.get('cursor'),
+                limit=statements.page_size(request.args.get('limit'))
+            )
+        except statements.InvalidCursor as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(page)
+
+    @app.route('/account/<int:account_id>/statements', methods=['POST'])
+    def request_statement(account_id):
+        if not current_user.is_authenticated:
+            return jsonify({"error": "Authentication required"}), 401
+        data = request.get_json() or {}
+        try:
+            start = datetime.date.fromisoformat(data['start'])
+            end = datetime.date.fromisoformat(data['end'])
+        except KeyError as e:
+            return jsonify({"error": f"Missing required field: {e.args[0]}"}), 400
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        if end < start:
+            return jsonify({"error": "end is before start"}), 400
+        # Someone else's account is reported as missing, not as forbidden
+        if not db.session.query(Account.id).filter_by(id=account_id, user_id=current_user.id).first():
+            return jsonify({"error": "Account not found"}), 404
+        task = tasks.generate_statement.delay(account_id, start.isoformat(), end.isoformat(), current_user.id)
+        token = tasks.status_token(task.id, current_user.id)
+        return jsonify({"task_id": task.id, "status_url": url_for('get_task_status', token=token)}), 202
+
+    @app.route('/statements/<path:name>', methods=['GET'])
+    def download_statement(name):
+        # Only the signed-in user's own statements directory is served
+        if not current_user.is_authenticated:
+            return jsonify({"error": "Authentication required"}), 401
+        return send_from_directory(tasks.statements_dir(current_user.id), name, as_attachment=True)
+
+    @app.route('/tasks/<token>', methods=['GET'])
+    def get_task_status(token):
+        reference = tasks.read_status_token(token)
+        if reference is None:
+            return jsonify({"error": "Task not found"}), 404
+        task_id, owner_id = reference
+        if owner_id is not None and (not current_user.is_authenticated or current_user.id != owner_id):
+            return jsonify({"error": "Task not found"}), 404
+        return jsonify(tasks.task_status(task_id))
+
     @app.route('/agency/<int:agency_id>', methods=['GET'])
     def get_agency_details(agency_id):
-        agency = Agency.query.get(agency_id)
+        agency = cached_dict('agency', Agency, agency_id)
         if agency:
-            return jsonify(agency.to_dict())
+            return jsonify(agency)
         else:
             return jsonify({"error": "Agency not found"}), 404
 
+    @app.route('/agency/<int:agency_id>/stats', methods=['GET'])
+    def get_agency_stats(agency_id):
+        if not cached_dict('agency', Agency, agency_id):
+            return jsonify({"error": "Agency not found"}), 404
+        days = max(1, min(request.args.get('days', 1, type=int), 366))
+        return jsonify(rollups.agency_stats(agency_id, days))
+
+    @app.route('/internal/stats/pool', methods=['GET'])
+    @internal_only
+    def pool_stats():
+        from services.pool_stats import pool_stats as collect_pool_stats
+        return jsonify(collect_pool_stats(db.engine))
+
+    @app.route('/internal/metrics', methods=['GET'])
+    @internal_only
+    def request_metrics():
+        if profiler.app is None:
+            return jsonify({"error": "Profiling is disabled"}), 404
+        if request.args.get('format') == 'prometheus':
+            return Response(profiler.metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+        return jsonify(profiler.metrics.snapshot())
+
+    @app.route('/internal/profiles', methods=['GET'])
+    @internal_only
+    def list_profiles():
+        if profiler.app is None:
+            return jsonify({"error": "Profiling is disabled"}), 404
+        return jsonify([{key: value for key, value in report.items() if key != 'profile'}
+                        for report in reversed(profiler.reports)])
+
+    @app.route('/internal/profiles/<report_id>', methods=['GET'])
+    @internal_only
+    def get_profile(report_id):
+        report = profiler.get_report(report_id)
+        if not report:
+            return jsonify({"error": "Profile not found"}), 404
+        return jsonify(report)
+
+    @app.route('/cache/stats', methods=['GET'])
+    @internal_only
+    def cache_stats():
+        return jsonify(entity_cache.stats())
+
     @app.route('/transaction', methods=['POST'])
+    @idempotent
     def create_transaction():
         data = request.get_json()
         try:
             new_transaction = Transaction(
-                amount=data['amount'],
+                amount=Money.of(data['amount']),
                 currency=data['currency'],
                 date=data['date'],
                 transaction_type=data['transaction_type']
@@ -233,42 +613,65 @@ def create_app():
             return jsonify({"error": str(e)}), 500
 
     @app.route('/transfer', methods=['POST'])
+    @idempotent
     def transfer():
         data = request.get_json()
         try:
-            sender_account = Account.query.get(data['from_account_id'])
-            receiver_account = Account.query.get(data['to_account_id'])
-
-            if sender_account and receiver_account:
-                if sender_account.balance >= data['amount']:
-                    sender_account.balance -= data['amount']
-                    receiver_account.balance += data['amount']
-
-                    transaction_sender = Transaction(
-                        amount=data['amount'],
-                        currency=data['currency'],
-                        date=data['date'],
-                        transaction_type='debit'
-                    )
-                    transaction_receiver = Transaction(
-                        amount=data['amount'],
-                        currency=data['currency'],
-                        date=data['date'],
-                        transaction_type='credit'
-                    )
-                    db.session.add(transaction_sender)
-                    db.session.add(transaction_receiver)
-                    db.session.commit()
-
-                    return jsonify({"message": "Transfer successful"}), 200
-                else:
-                    return jsonify({"error": "Insufficient funds"}), 400
-            else:
-                return jsonify({"error": "Invalid accounts"}), 404
+            transfer_engine.transfer(
+                data['from_account_id'],
+                data['to_account_id'],
+                data['amount'],
+                data['currency'],
+                data['date']
+            )
+            return jsonify({"message": "Transfer successful"}), 200
+        except TransferError as e:
+            return jsonify({"error": str(e)}), e.status_code
         except Exception as e:
             app.logger.error(f"Error during transfer: {e}")
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/transfer/stats', methods=['GET'])
+    @internal_only
+    def transfer_stats():
+        return jsonify(transfer_engine.stats())
+
+    @app.route('/fraud/stats', methods=['GET'])
+    @internal_only
+    def fraud_stats():
+        return jsonify(fraud_engine.stats())
+
+    @app.route('/rate-limit/stats', methods=['GET'])
+    @internal_only
+    def rate_limit_stats():
+        return jsonify(rate_limiter.stats())
+
+    @app.route('/transfers/batch', methods=['POST'])
+    def batch_transfer():
+        if request.mimetype == 'application/x-ndjson':
+            try:
+                items = list(parse_ndjson(request.stream))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid NDJSON: {e}"}), 400
+        else:
+            data = request.get_json()
+            items = data.get('transfers') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"error": "Expected a list of transfers"}), 400
+        if len(items) > app.config['BATCH_TRANSFER_MAX_ITEMS']:
+            return jsonify({"error": "Too many transfers in one batch"}), 413
+
+        try:
+            if request.args.get('async'):
+                task = apply_batch_task.delay(items)
+                status_url = url_for('get_task_status', token=tasks.status_token(
+                    task.id, current_user.id if current_user.is_authenticated else None))
+                return jsonify({"task_id": task.id, "status_url": status_url}), 202
+            return jsonify(apply_batch(items)), 200
+        except Exception as e:
+            app.logger.error(f"Error during batch transfer: {e}")
+            return jsonify({"error": str(e)}), 500
+
     @app.route('/cards', methods=['POST'])
     def add_card():
         data = request.get_json()
@@ -278,7 +681,7 @@ def create_app():
                 card_type=data['card_type'],
                 expiration_date=data['expiration_date'],
                 cardholder_name=data['cardholder_name'],
-                balance=data['balance'],
+                balance=Money.of(data['balance']),
                 customer_id=data['customer_id']
             )
             db.session.add(new_card)
@@ -289,19 +692,29 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/credits', methods=['POST'])
+    @idempotent
     def add_credit():
         data = request.get_json()
         try:
+            credit_date = data['credit_date']
+            if isinstance(credit_date, str):
+                credit_date = datetime.date.fromisoformat(credit_date)
+            amount = Money.of(data['credit_amount'])
             new_credit = Credit(
                 card_id=data['card_id'],
-                credit_amount=data['credit_amount'],
-                credit_date=data['credit_date']
+                credit_amount=amount,
+                credit_date=credit_date
             )
-            card = Card.query.get(data['card_id'])
+            decision = fraud_engine.score(ledger.CARD, data['card_id'], amount)
+            if decision.blocked:
+                return jsonify({'error': 'Credit refused by risk rules', 'rules': list(decision.rules)}), 403
+            card = Card.query.filter_by(id=data['card_id']).with_for_update().first()
             if card:
-                card.balance += data['credit_amount']
+                ledger.post(ledger.CARD, card.id, 'credit', amount, card.balance, credit_date)
+                card.balance += amount
                 db.session.add(new_credit)
                 db.session.commit()
+                fraud_engine.record(ledger.CARD, card.id, amount)
                 return jsonify({'message': 'Credit added successfully!'}), 201
             return jsonify({'error': 'Card not found!'}), 404
         except Exception as e:
@@ -310,17 +723,17 @@ def create_app():
 
     @app.route('/loan/<int:loan_id>', methods=['GET'])
     def get_loan_details(loan_id):
-        loan = Loan.query.get(loan_id)
+        loan = cached_dict('loan', Loan, loan_id)
         if loan:
-            return jsonify(loan.to_dict())
+            return jsonify(loan)
         else:
             return jsonify({"error": "Loan not found"}), 404
 
     @app.route('/repayment/<int:repayment_id>', methods=['GET'])
     def get_repayment_details(repayment_id):
-        repayment = Repayment.query.get(repayment_id)
+        repayment = cached_dict('repayment', Repayment, repayment_id)
         if repayment:
-            return jsonify(repayment.to_dict())
+            return jsonify(repayment)
         else:
             return jsonify({"error": "Repayment not found"}), 404
 
@@ -339,9 +752,11 @@ def create_app():
                 interest_rate=data['interest_rate'],
                 start_date=data['start_date'],
                 end_date=data['end_date'],
-                outstanding_balance=data.get('outstanding_balance', 0)
+                outstanding_balance=data.get('outstanding_balance', data['loan_amount'])
             )
+            new_loan.opening_balance = new_loan.outstanding_balance
             db.session.add(new_loan)
+            rollups.record_loan(new_loan)
             db.session.commit()
             return jsonify({"message": "Loan created successfully!"}), 201
         except IntegrityError:
@@ -352,6 +767,7 @@ def create_app():
             return jsonify({"error": str(e)}), 500
 
     @app.route('/repayment', methods=['POST'])
+    @idempotent
     def create_repayment():
         data = request.get_json()
         try:
@@ -360,14 +776,10 @@ def create_app():
                 if field not in data:
                     return jsonify({"error": f"Missing required field: {field}"}), 400
 
-            new_repayment = Repayment(
-                loan_id=data['loan_id'],
-                repayment_date=data['repayment_date'],
-                repayment_amount=data['repayment_amount']
-            )
-            db.session.add(new_repayment)
-            db.session.commit()
+            repayments.post_repayment(data['loan_id'], data['repayment_date'], data['repayment_amount'])
             return jsonify({"message": "Repayment created successfully!"}), 201
+        except repayments.RepaymentError as e:
+            return jsonify({"error": str(e)}), e.status_code
         except IntegrityError:
             db.session.rollback()
             return jsonify({"error": "Error creating repayment"}), 400
@@ -375,24 +787,68 @@ def create_app():
             app.logger.error(f"Error creating repayment: {e}")
             return jsonify({"error": str(e)}), 500
 
+    @app.route('/repayments/batch', methods=['POST'])
+    def batch_repayments():
+        if request.mimetype == 'application/x-ndjson':
+            try:
+                items = list(parse_ndjson(request.stream))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid NDJSON: {e}"}), 400
+        else:
+            data = request.get_json()
+            items = data.get('repayments') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"error": "Expected a list of repayments"}), 400
+
+        try:
+            return jsonify(repayments.post_repayments(items)), 200
+        except Exception as e:
+            app.logger.error(f"Error posting repayments: {e}")
+            return jsonify({"error": str(e)}), 500
+
     @app.route('/contact', methods=['POST'])
     def contact():
         data = request.get_json()
         if all(key in data for key in ('full_name', 'email_address', 'phone_number', 'message')):
             contact_message = ContactMessage(
                 full_name=data['full_name'],
-                email_address=data['email_address'],
+                email=data['email_address'],
                 phone_number=data['phone_number'],
                 message=data['message']
             )
             db.session.add(contact_message)
             db.session.commit()
-            return jsonify({"message": "Message received"}), 201
+            # Notifications are sent by a worker, not in the request
+            task_id = tasks.enqueue(tasks.process_contact_message, contact_message.id)
+            status_url = url_for('get_task_status', token=tasks.status_token(task_id)) if task_id else None
+            return jsonify({"message": "Message received", "task_id": task_id, "status_url": status_url}), 202
         else:
             return jsonify({"error": "Missing data"}), 400
 
     return app
 
+def start_embedded_worker(app):
+    """Run a Celery worker in a thread of the development server.
+
+    memory:// only reaches workers in the same process, so without a real
+    broker the dev server consumes its own tasks. Only the server entry
+    points call this: CLI commands and the real worker never start one.
+    """
+    if not app.config['CELERY_EMBEDDED_WORKER'] or app.config['CELERY_TASK_ALWAYS_EAGER']:
+        return None
+    import threading
+    celery.finalize()
+    celery.set_current()
+    celery.set_default()
+    worker = celery.WorkController(pool='threads', concurrency=2, loglevel='WARNING',
+                                   without_heartbeat=True, without_mingle=True, without_gossip=True)
+    threading.Thread(target=worker.start, name='celery-embedded', daemon=True).start()
+    return worker
+
+
 if __name__ == '__main__':
     app = create_app()
+    # With the reloader, only the child process serving requests gets a worker
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_embedded_worker(app)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Benchmarks de l'API : `python -m benchmarks.run --help`.
+# Base SQLite synthetique (seed.py), clients concurrents (run.py).
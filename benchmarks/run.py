@@ -0,0 +1,320 @@
+"""Load test the API against a synthetic bank in SQLite.
+
+    python -m benchmarks.run --scale 1 --clients 8 --requests 400 --output baseline.json
+    python -m benchmarks.run --compare baseline.json --max-regression 20
+
+Each scenario is driven by --clients concurrent threads, through the Flask
+test client (in-process, no network) and/or a threaded WSGI server over
+HTTP. Results are throughput, p50/p95/p99 latency and queries per request
+(the X-Query-Count header of the profiling middleware). Requests and seed
+data come from fixed random seeds, so two runs on the same machine are
+comparable; --compare diffs a run against a saved JSON baseline.
+
+SQLite has no row locks (FOR UPDATE is ignored), so concurrent credits or
+transfers on the same card/account can collide on the ledger's unique
+sequence and show up as a few 500s; MySQL serializes them instead.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCENARIOS = (
+    'login',
+    'transfer',
+    'credit',
+    'repayment',
+    'get_customer',
+    'get_account',
+    'get_agency',
+    'get_loan',
+    'get_repayment',
+    'list_accounts',
+    'account_transactions',
+)
+
+
+def build_request(name, rng, counts):
+    """(method, path, json body) for one request of a scenario."""
+    from benchmarks.seed import PASSWORD
+
+    today = datetime.date.today().isoformat()
+    if name == 'login':
+        user_id = rng.randint(1, counts['users'])
+        return 'POST', '/login', {'email_address': f'user{user_id}@bench.local', 'password': PASSWORD}
+    if name == 'transfer':
+        from_id, to_id = rng.sample(range(1, counts['accounts'] + 1), 2)
+        return 'POST', '/transfer', {'from_account_id': from_id, 'to_account_id': to_id,
+                                     'amount': round(rng.uniform(0.01, 5), 2), 'currency': 'DZD',
+                                     'date': today}
+    if name == 'credit':
+        return 'POST', '/credits', {'card_id': rng.randint(1, counts['cards']),
+                                    'credit_amount': round(rng.uniform(1, 50), 2), 'credit_date': today}
+    if name == 'repayment':
+        return 'POST', '/repayment', {'loan_id': rng.randint(1, counts['loans']),
+                                      'repayment_amount': 0.01, 'repayment_date': today}
+    if name == 'get_customer':
+        return 'GET', f"/customer/{rng.randint(1, counts['users'])}", None
+    if name == 'get_account':
+        return 'GET', f"/account/{rng.randint(1, counts['accounts'])}", None
+    if name == 'get_agency':
+        return 'GET', f"/agency/{rng.randint(1, counts['agencies'])}", None
+    if name == 'get_loan':
+        return 'GET', f"/loan/{rng.randint(1, counts['loans'])}", None
+    if name == 'get_repayment':
+        return 'GET', f"/repayment/{rng.randint(1, counts['repayments'])}", None
+    if name == 'list_accounts':
+        return 'GET', f"/accounts?user_id={rng.randint(1, counts['users'])}", None
+    if name == 'account_transactions':
+        return 'GET', f"/account/{rng.randint(1, counts['accounts'])}/transactions", None
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+class TestClientDriver:
+    """Sends requests in-process through app.test_client()."""
+
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            response.close()
+            return response.status_code, response.headers.get('X-Query-Count')
+        return send
+
+    def close(self):
+        pass
+
+
+class WSGIServerDriver:
+    """Serves the app with werkzeug's threaded server; clients use keep-alive HTTP."""
+
+    name = 'wsgi'
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class KeepAliveHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def client(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+
+        def send(method, path, body):
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status, response.getheader('X-Query-Count')
+        return send
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(driver, name, counts, clients, total_requests, seed):
+    per_client = max(1, total_requests // clients)
+    latencies = []
+    queries = []
+    errors = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(index):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        send = driver.client()
+        requests = [build_request(name, rng, counts) for _ in range(per_client)]
+        local_latencies = []
+        local_queries = []
+        local_errors = {}
+        barrier.wait()
+        for method, path, body in requests:
+            start = time.perf_counter()
+            try:
+                status, query_count = send(method, path, body)
+            except Exception as e:
+                status, query_count = type(e).__name__, None
+            local_latencies.append((time.perf_counter() - start) * 1000)
+            if query_count is not None:
+                local_queries.append(int(query_count))
+            if not isinstance(status, int) or status >= 400:
+                local_errors[str(status)] = local_errors.get(str(status), 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            for status, count in local_errors.items():
+                errors[status] = errors.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, max_regression):
+    """Print per-scenario changes; return the regressions beyond max_regression %."""
+    regressions = []
+    print(f"\n{'driver/scenario':<36}{'p95 ms':>22}{'rps':>22}")
+    for driver, scenarios in current['results'].items():
+        for name, now in scenarios.items():
+            before = baseline.get('results', {}).get(driver, {}).get(name)
+            if not before:
+                continue
+            p95_change = _change(before['p95_ms'], now['p95_ms'])
+            rps_change = _change(before['throughput_rps'], now['throughput_rps'])
+            print(f"{driver + '/' + name:<36}"
+                  f"{before['p95_ms']:>8.2f} -> {now['p95_ms']:>7.2f} {p95_change:>+5.0f}%"
+                  f"{before['throughput_rps']:>8.0f} -> {now['throughput_rps']:>7.0f} {rps_change:>+5.0f}%")
+            if p95_change > max_regression or rps_change < -max_regression:
+                regressions.append(f'{driver}/{name}')
+    return regressions
+
+
+def _change(before, now):
+    return (now - before) / before * 100 if before else 0.0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1, help='multiplier of the seed sizes (1 = 500 users)')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--requests', type=int, default=400, help='requests per scenario and driver')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of scenarios')
+    parser.add_argument('--drivers', default='test_client,wsgi', help='test_client, wsgi or both')
+    parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'bank_benchmark.db'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON to diff against')
+    parser.add_argument('--max-regression', type=float, default=20,
+                        help='with --compare, exit 1 if p95 grows or throughput drops by more than this %%')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # The configuration is read at import time, so set it up before importing the app
+    os.environ['APP_CONFIG'] = 'testing'
+    os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+    os.environ.setdefault('PROFILING_ENABLED', '1')
+    # Synthetic traffic from one client would trip the velocity rules and
+    # the rate limits, turning requests into 403s and 429s
+    os.environ.setdefault('FRAUD_ENABLED', '0')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'bank_benchmark.log'))
+
+    from app import create_app, db
+    from benchmarks.seed import seed
+
+    app = create_app('testing')
+    with app.app_context():
+        start = time.perf_counter()
+        counts = seed(args.scale, rng_seed=args.seed)
+        print(f"Seeded {counts} in {time.perf_counter() - start:.1f}s")
+        db.session.remove()
+
+    drivers = {'test_client': TestClientDriver, 'wsgi': WSGIServerDriver}
+    results = {}
+    for driver_name in [name.strip() for name in args.drivers.split(',') if name.strip()]:
+        driver = drivers[driver_name](app)
+        results[driver_name] = {}
+        try:
+            for name in scenarios:
+                stats = run_scenario(driver, name, counts, args.clients, args.requests, args.seed)
+                results[driver_name][name] = stats
+                print(f"{driver_name:<12}{name:<22}{stats['throughput_rps']:>9.1f} rps"
+                      f"  p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms"
+                      f"  q/req {stats['queries_per_request']}  errors {stats['errors'] or 0}")
+        finally:
+            driver.close()
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'clients': args.clients,
+            'requests': args.requests,
+            'seed': args.seed,
+            'counts': counts,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.max_regression)
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import datetime
+import random
+
+from app import db
+
+# Row counts at --scale 1; every count is multiplied by the scale
+BASE_SIZES = {
+    'agencies': 5,
+    'users': 500,
+    'accounts_per_user': 2,
+    'loans_per_customer': 0.5,
+    'repayments_per_loan': 3,
+}
+PASSWORD = 'bench-password'
+CHUNK_SIZE = 5000
+
+
+def sizes_for(scale):
+    return {
+        'agencies': max(1, int(BASE_SIZES['agencies'] * scale)),
+        'users': max(2, int(BASE_SIZES['users'] * scale)),
+        'accounts_per_user': BASE_SIZES['accounts_per_user'],
+        'loans_per_customer': BASE_SIZES['loans_per_customer'],
+        'repayments_per_loan': BASE_SIZES['repayments_per_loan'],
+    }
+
+
+def _insert(table, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[i:i + CHUNK_SIZE])
+
+
+def seed(scale=1, rng_seed=42):
+    """Create the schema and fill it with a synthetic bank.
+
+    Users and customers are paired one to one (user i is customer i). Every
+    user can log in with PASSWORD. Balances are large enough that the
+    benchmark's transfers and credits never run out of funds. Returns the
+    number of rows per table, which run.py uses to pick valid ids.
+    """
+    from models.Agency import Agency
+    from models.User import User
+    from models.Customer import Customer
+    from models.Account import Account
+    from models.Card import Card
+    from models.Loan import Loan
+    from models.Repayment import Repayment
+    from services.passwords import password_hasher
+
+    rng = random.Random(rng_seed)
+    sizes = sizes_for(scale)
+    db.drop_all()
+    db.create_all()
+
+    today = datetime.date.today()
+    password_hash = password_hasher.hash(PASSWORD)
+    n_agencies = sizes['agencies']
+    n_users = sizes['users']
+
+    _insert(Agency.__table__, [
+        {'id': i, 'name': f'Agency {i}', 'location': f'City {i}'}
+        for i in range(1, n_agencies + 1)
+    ])
+    _insert(User.__table__, [
+        {'id': i, 'username': f'user{i}', 'password_hash': password_hash,
+         'email_address': f'user{i}@bench.local', 'first_name': 'Bench', 'last_name': f'User{i}',
+         'agency_id': rng.randint(1, n_agencies)}
+        for i in range(1, n_users + 1)
+    ])
+    _insert(Customer.__table__, [
+        {'id': i, 'name': f'Customer {i}', 'email': f'customer{i}@bench.local',
+         'first_name': 'Bench', 'last_name': f'Customer{i}',
+         'date_of_birth': datetime.date(1970, 1, 1) + datetime.timedelta(days=rng.randint(0, 15000)),
+         'phone_number': f'0{i:09d}', 'email_address': f'customer{i}@bench.local',
+         'nin_cust': f'NIN{i:012d}', 'rib_cust': f'RIB{i:018d}'}
+        for i in range(1, n_users + 1)
+    ])
+
+    accounts = []
+    for user_id in range(1, n_users + 1):
+        for _ in range(sizes['accounts_per_user']):
+            account_id = len(accounts) + 1
+            accounts.append({
+                'id': account_id, 'customer_id': user_id, 'account_number': f'{account_id:010d}',
+                'account_type': rng.choice(('savings', 'checking')), 'balance': 1000000.0,
+                'agency_id': rng.randint(1, n_agencies), 'user_id': user_id,
+            })
+    _insert(Account.__table__, accounts)
+    _insert(Card.__table__, [
+        {'id': i, 'card_number': f'4{i:015d}', 'card_type': 'debit',
+         'expiration_date': today + datetime.timedelta(days=3 * 365), 'cardholder_name': f'Customer {i}',
+         'balance': 1000.0, 'customer_id': i}
+        for i in range(1, n_users + 1)
+    ])
+
+    loans = []
+    for customer_id in rng.sample(range(1, n_users + 1), int(n_users * sizes['loans_per_customer'])):
+        amount = rng.randint(1000, 50000)
+        start = today - datetime.timedelta(days=rng.randint(30, 720))
+        loans.append({
+            'loan_id': len(loans) + 1, 'client_id': customer_id, 'loan_amount': amount,
+            'interest_rate': rng.choice((2.5, 3.75, 5.25, 7.0)), 'start_date': start,
+            'end_date': start + datetime.timedelta(days=365 * rng.randint(2, 10)),
+            'outstanding_balance': amount, 'accrued_interest': 0,
+        })
+    repayments = []
+    for loan in loans:
+        for n in range(sizes['repayments_per_loan']):
+            amount = round(loan['loan_amount'] / 100, 2)
+            loan['outstanding_balance'] -= amount
+            repayments.append({
+                'loan_id': loan['loan_id'], 'repayment_amount': amount,
+                'repayment_date': loan['start_date'] + datetime.timedelta(days=30 * (n + 1)),
+            })
+    _insert(Loan.__table__, loans)
+    _insert(Repayment.__table__, repayments)
+    db.session.commit()
+
+    return {
+        'agencies': n_agencies,
+        'users': n_users,
+        'customers': n_users,
+        'accounts': len(accounts),
+        'cards': n_users,
+        'loans': len(loans),
+        'repayments': len(repayments),
+    }
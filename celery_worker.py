@@ -0,0 +1,11 @@
+# Point d'entree des workers : celery -A celery_worker.celery worker --beat
+# create_app() enregistre les taches (services/tasks.py, transfer_batch) et la config.
+# Par defaut la config de production : un worker a part ne recoit rien sur memory://
+import os
+
+from app import create_app, celery
+
+app = create_app(os.environ.get('APP_CONFIG', 'production'))
+if app.config['CELERY_BROKER_URL'].startswith('memory://'):
+    raise RuntimeError("The Celery worker needs a shared broker: set CELERY_BROKER_URL "
+                       "(memory:// only reaches the process that queued the task)")
@@ -1,4 +1,6 @@
-from app import create_app, db
+import os
+
+from app import create_app, db, start_embedded_worker
 from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager
 from flask.cli import AppGroup
@@ -10,4 +12,6 @@ manager.add_command('db', MigrateCommand)
 
 @app.cli.command("run")
 def run():
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_embedded_worker(app)
     app.run(debug=True)
@@ -0,0 +1,52 @@
+"""add ledger entries and transactions.account_id
+
+Revision ID: 5b7e2d91a4c3
+Revises: c03db014e82b
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2d91a4c3'
+down_revision = 'c03db014e82b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ledger_entries',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('account_kind', sa.String(length=10), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entry_type', sa.String(length=10), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('balance_after', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('entry_date', sa.Date(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_ledger_entries_account_seq', ['account_kind', 'account_id', 'seq'], unique=True)
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('account_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_transactions_account_id'), ['account_id'], unique=False)
+        batch_op.create_foreign_key('fk_transactions_account_id', 'accounts', ['account_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_transactions_account_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_transactions_account_id'))
+        batch_op.drop_column('account_id')
+
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_ledger_entries_account_seq')
+
+    op.drop_table('ledger_entries')
@@ -0,0 +1,29 @@
+"""index transactions on (account_id, date, id) for keyset pagination
+
+Revision ID: 8e1f4a6c2d07
+Revises: 5b7e2d91a4c3
+Create Date: 2026-10-18 10:03:27.540119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1f4a6c2d07'
+down_revision = '5b7e2d91a4c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_account_date_id', ['account_id', 'date', 'id'], unique=False)
+        # The composite index also serves lookups on account_id alone
+        batch_op.drop_index('ix_transactions_account_id')
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_account_id', ['account_id'], unique=False)
+        batch_op.drop_index('ix_transactions_account_date_id')
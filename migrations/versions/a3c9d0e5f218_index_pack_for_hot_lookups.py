@@ -0,0 +1,54 @@
+"""index pack for hot lookups
+
+Restores the customers unique indexes dropped by c03db014e82b and adds the
+foreign-key / composite indexes used by the routes.
+
+Revision ID: a3c9d0e5f218
+Revises: 8e1f4a6c2d07
+Create Date: 2026-10-18 11:20:05.377641
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9d0e5f218'
+down_revision = '8e1f4a6c2d07'
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns, unique)
+INDEXES = [
+    ('customers', 'email_address', ['email_address'], True),
+    ('customers', 'nin_cust', ['nin_cust'], True),
+    ('customers', 'rib_cust', ['rib_cust'], True),
+    ('accounts', 'ix_accounts_customer_id', ['customer_id'], False),
+    ('accounts', 'ix_accounts_user_id', ['user_id'], False),
+    ('loans', 'ix_loans_client_id', ['client_id'], False),
+    ('repayments', 'ix_repayments_loan_id_date', ['loan_id', 'repayment_date'], False),
+    ('cards', 'ix_cards_customer_id', ['customer_id'], False),
+    ('credits', 'ix_credits_card_id_date', ['card_id', 'credit_date'], False),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Some of these tables were dropped by the first migration or are only
+    # created by db.create_all(), so only index the ones that exist.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table, name, columns, unique in INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table, name, columns, unique in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
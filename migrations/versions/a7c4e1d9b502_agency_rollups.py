@@ -0,0 +1,45 @@
+"""agency stats and daily rollups
+
+Revision ID: a7c4e1d9b502
+Revises: f3b8d2a7c961
+Create Date: 2026-10-18 17:40:03.215874
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e1d9b502'
+down_revision = 'f3b8d2a7c961'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('agency_stats',
+    sa.Column('agency_id', sa.Integer(), nullable=False),
+    sa.Column('account_count', sa.Integer(), nullable=False),
+    sa.Column('total_deposits', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('loan_count', sa.Integer(), nullable=False),
+    sa.Column('loan_exposure', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['agency_id'], ['agencies.id'], ),
+    sa.PrimaryKeyConstraint('agency_id')
+    )
+    op.create_table('agency_daily_stats',
+    sa.Column('agency_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column('credit_volume', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('debit_volume', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('repayment_count', sa.Integer(), nullable=False),
+    sa.Column('repayment_volume', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['agency_id'], ['agencies.id'], ),
+    sa.PrimaryKeyConstraint('agency_id', 'day')
+    )
+
+
+def downgrade():
+    op.drop_table('agency_daily_stats')
+    op.drop_table('agency_stats')
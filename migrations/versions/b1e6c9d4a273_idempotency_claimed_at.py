@@ -0,0 +1,29 @@
+"""idempotency_keys.claimed_at
+
+Revision ID: b1e6c9d4a273
+Revises: e2a7c5d1f936
+Create Date: 2026-10-19 14:22:05.671390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1e6c9d4a273'
+down_revision = 'e2a7c5d1f936'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('idempotency_keys', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE idempotency_keys SET claimed_at = created_at')
+    with op.batch_alter_table('idempotency_keys', schema=None) as batch_op:
+        batch_op.alter_column('claimed_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('idempotency_keys', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
@@ -0,0 +1,43 @@
+"""fx rates and account currency
+
+Revision ID: b5d8e2f1c094
+Revises: a7c4e1d9b502
+Create Date: 2026-10-18 19:05:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d8e2f1c094'
+down_revision = 'a7c4e1d9b502'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fx_rates',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('base_currency', sa.String(length=3), nullable=False),
+    sa.Column('quote_currency', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=20, scale=10), nullable=False),
+    sa.Column('effective_date', sa.Date(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('base_currency', 'quote_currency', 'effective_date', name='uq_fx_rates_pair_date')
+    )
+    # Existing accounts are in the base currency
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), server_default='DZD', nullable=False))
+        batch_op.add_column(sa.Column('base_balance', sa.Numeric(precision=18, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('revalued_on', sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('accounts', schema=None) as batch_op:
+        batch_op.drop_column('revalued_on')
+        batch_op.drop_column('base_balance')
+        batch_op.drop_column('currency')
+
+    op.drop_table('fx_rates')
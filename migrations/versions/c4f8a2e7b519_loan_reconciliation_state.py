@@ -0,0 +1,80 @@
+"""loans.opening_balance and loans.needs_reconcile
+
+Revision ID: c4f8a2e7b519
+Revises: b1e6c9d4a273
+Create Date: 2026-10-19 15:08:44.203518
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a2e7b519'
+down_revision = 'b1e6c9d4a273'
+branch_labels = None
+depends_on = None
+
+# Loans updated per committed UPDATE while the application keeps running
+BATCH_SIZE = int(os.environ.get('LOAN_MIGRATION_BATCH_SIZE', 5000))
+
+
+def _backfill():
+    """Bring loans from before repayment posting up to date, by loan_id range.
+
+    Their outstanding_balance was never maintained (NULL or 0): it becomes
+    loan_amount minus what was repaid. opening_balance is the outstanding
+    amount plus the repayments, the best record there is of what was
+    granted, and every loan is flagged for the next reconciliation run.
+    """
+    bind = op.get_bind()
+    loans = sa.table('loans', sa.column('loan_id'), sa.column('loan_amount'),
+                     sa.column('outstanding_balance'), sa.column('opening_balance'),
+                     sa.column('needs_reconcile'))
+    repayments = sa.table('repayments', sa.column('loan_id'), sa.column('repayment_amount'))
+    repaid = (
+        sa.select(sa.func.coalesce(sa.func.sum(repayments.c.repayment_amount), 0))
+        .where(repayments.c.loan_id == loans.c.loan_id)
+        .scalar_subquery()
+    )
+    remaining = loans.c.loan_amount - repaid
+    upper = bind.execute(sa.select(sa.func.max(loans.c.loan_id))).scalar() or 0
+    low = 0
+    while low < upper:
+        in_batch = sa.and_(loans.c.loan_id > low, loans.c.loan_id <= low + BATCH_SIZE)
+        with op.get_context().autocommit_block():
+            bind.execute(
+                loans.update()
+                .where(in_batch, loans.c.loan_amount.isnot(None),
+                       sa.or_(loans.c.outstanding_balance.is_(None), loans.c.outstanding_balance == 0))
+                .values(outstanding_balance=sa.case((remaining > 0, remaining), else_=0))
+            )
+            bind.execute(
+                loans.update()
+                .where(in_batch)
+                .values(opening_balance=sa.func.coalesce(loans.c.outstanding_balance, 0) + repaid,
+                        needs_reconcile=True)
+            )
+        low += BATCH_SIZE
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('opening_balance', sa.Numeric(precision=10, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('needs_reconcile', sa.Boolean(), nullable=False,
+                                      server_default=sa.false()))
+        batch_op.create_index(batch_op.f('ix_loans_needs_reconcile'), ['needs_reconcile'], unique=False)
+    _backfill()
+    # Reconciliation no longer accumulates repayments from an id watermark
+    op.execute("DELETE FROM job_watermarks WHERE name = 'loan_reconciliation'")
+
+
+def downgrade():
+    # The watermark-based job would add every repayment again on top of these totals
+    op.execute('DELETE FROM loan_reconciliations')
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_loans_needs_reconcile'))
+        batch_op.drop_column('needs_reconcile')
+        batch_op.drop_column('opening_balance')
@@ -0,0 +1,44 @@
+"""end-of-day balances
+
+Revision ID: c8e4a1f7d263
+Revises: b5d8e2f1c094
+Create Date: 2026-10-18 20:12:09.731546
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4a1f7d263'
+down_revision = 'b5d8e2f1c094'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('eod_balances',
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=True),
+    sa.Column('agency_id', sa.Integer(), nullable=True),
+    sa.Column('opening_balance', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('movement_count', sa.Integer(), nullable=False),
+    sa.Column('net_amount', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('expected_balance', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('actual_balance', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('drift', sa.Numeric(precision=15, scale=2), nullable=False),
+    sa.Column('in_balance', sa.Boolean(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('kind', 'entity_id', 'day')
+    )
+    with op.batch_alter_table('eod_balances', schema=None) as batch_op:
+        batch_op.create_index('ix_eod_balances_day_in_balance', ['day', 'in_balance'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('eod_balances', schema=None) as batch_op:
+        batch_op.drop_index('ix_eod_balances_day_in_balance')
+
+    op.drop_table('eod_balances')
@@ -0,0 +1,28 @@
+"""loan interest accrual columns
+
+Revision ID: d41b7c8e9f30
+Revises: a3c9d0e5f218
+Create Date: 2026-10-18 13:41:52.902316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7c8e9f30'
+down_revision = 'a3c9d0e5f218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('accrued_interest', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('accrued_through', sa.Date(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('loans', schema=None) as batch_op:
+        batch_op.drop_column('accrued_through')
+        batch_op.drop_column('accrued_interest')
@@ -0,0 +1,180 @@
+"""money columns as integer hundredths
+
+Revision ID: d9f3b6a2e481
+Revises: c8e4a1f7d263
+Create Date: 2026-10-18 21:03:27.114802
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b6a2e481'
+down_revision = 'c8e4a1f7d263'
+branch_labels = None
+depends_on = None
+
+# (table, column) moving from FLOAT to BIGINT hundredths
+MONEY_COLUMNS = (
+    ('accounts', 'balance'),
+    ('cards', 'balance'),
+    ('credits', 'credit_amount'),
+    ('transactions', 'amount'),
+)
+# Rows converted per committed UPDATE while the application keeps running
+BATCH_SIZE = int(os.environ.get('MONEY_MIGRATION_BATCH_SIZE', 20000))
+
+
+def _table(table_name, source, target):
+    return sa.table(table_name, sa.column('id'), sa.column(source), sa.column(target))
+
+
+def _sql(expression):
+    bind = op.get_bind()
+    return str(expression.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _create_sync_trigger(table_name, source, target, convert):
+    """Have every insert and update of `source` also write `target` from now on.
+
+    Rows the application writes during the backfill are then already
+    converted when their batch comes, and nothing needs copying again
+    once the backfill is over.
+    """
+    dialect = op.get_bind().dialect.name
+    name = f'{table_name}_{target}_sync'
+    if dialect in ('mysql', 'mariadb'):
+        value = _sql(convert(sa.literal_column(f'NEW.{source}')))
+        op.execute(f'CREATE TRIGGER {name}_ins BEFORE INSERT ON {table_name} '
+                   f'FOR EACH ROW SET NEW.{target} = {value}')
+        op.execute(f'CREATE TRIGGER {name}_upd BEFORE UPDATE ON {table_name} '
+                   f'FOR EACH ROW SET NEW.{target} = {value}')
+    elif dialect == 'postgresql':
+        value = _sql(convert(sa.literal_column(f'NEW.{source}')))
+        op.execute(f'CREATE FUNCTION {name}() RETURNS trigger AS $$ '
+                   f'BEGIN NEW.{target} := {value}; RETURN NEW; END $$ LANGUAGE plpgsql')
+        op.execute(f'CREATE TRIGGER {name} BEFORE INSERT OR UPDATE ON {table_name} '
+                   f'FOR EACH ROW EXECUTE FUNCTION {name}()')
+    else:
+        # SQLite triggers cannot assign NEW: update the row after the write
+        value = _sql(convert(sa.literal_column(f'NEW.{source}')))
+        for suffix, event in (('ins', 'INSERT'), ('upd', f'UPDATE OF {source}')):
+            op.execute(f'CREATE TRIGGER {name}_{suffix} AFTER {event} ON {table_name} '
+                       f'BEGIN UPDATE {table_name} SET {target} = {value} WHERE id = NEW.id; END')
+
+
+def _drop_sync_trigger(table_name, target):
+    dialect = op.get_bind().dialect.name
+    name = f'{table_name}_{target}_sync'
+    if dialect == 'postgresql':
+        op.execute(f'DROP TRIGGER IF EXISTS {name} ON {table_name}')
+        op.execute(f'DROP FUNCTION IF EXISTS {name}()')
+    else:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}_ins')
+        op.execute(f'DROP TRIGGER IF EXISTS {name}_upd')
+
+
+def _backfill(table_name, source, target, convert):
+    """Fill `target` from `source` by primary key range, one commit per batch.
+
+    Batches run outside the migration's transaction, so each one only
+    holds its rows' locks for a single short UPDATE and writers are never
+    blocked for the whole table. Rows written meanwhile are kept in sync
+    by the trigger and skipped here.
+    """
+    bind = op.get_bind()
+    table = _table(table_name, source, target)
+    upper = bind.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0
+    low = 0
+    while low < upper:
+        with op.get_context().autocommit_block():
+            bind.execute(
+                table.update()
+                .where(table.c.id > low, table.c.id <= low + BATCH_SIZE, table.c[target].is_(None))
+                .values({target: convert(table.c[source])})
+            )
+        low += BATCH_SIZE
+
+
+def _swap(table_name, column, temporary, column_type):
+    """Drop the trigger and `column`, then rename `temporary` to `column`.
+
+    On MySQL (8.0.29+) and PostgreSQL these are metadata-only changes, so
+    the table lock is held for an instant and no row is read or rewritten.
+    SQLite cannot drop or rename in place: the table is copied.
+    """
+    dialect = op.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        op.execute(f'LOCK TABLES {table_name} WRITE')
+        try:
+            _drop_sync_trigger(table_name, temporary)
+            op.execute(f'ALTER TABLE {table_name} DROP COLUMN {column}, '
+                       f'RENAME COLUMN {temporary} TO {column}')
+        finally:
+            op.execute('UNLOCK TABLES')
+    elif dialect == 'postgresql':
+        op.execute(f'LOCK TABLE {table_name} IN ACCESS EXCLUSIVE MODE')
+        _drop_sync_trigger(table_name, temporary)
+        op.drop_column(table_name, column)
+        op.alter_column(table_name, temporary, new_column_name=column)
+        # Commit now rather than at the end of the migration, releasing the lock
+        with op.get_context().autocommit_block():
+            pass
+    else:
+        _drop_sync_trigger(table_name, temporary)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_column(column)
+            batch_op.alter_column(temporary, new_column_name=column, existing_type=column_type, nullable=False)
+
+
+def _set_not_null(table_name, column, column_type):
+    """Make the swapped column NOT NULL without blocking writes.
+
+    MySQL rebuilds the table for this, online with ALGORITHM=INPLACE,
+    LOCK=NONE. PostgreSQL (12+) skips its own scan when a validated CHECK
+    already proves it, and validating the CHECK does not block writers.
+    Every row has a value at this point: the backfill filled the old rows
+    and the trigger the new ones.
+    """
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    with op.get_context().autocommit_block():
+        if dialect in ('mysql', 'mariadb'):
+            op.execute(f'ALTER TABLE {table_name} MODIFY {column} {column_type.compile(bind.dialect)} NOT NULL, '
+                       'ALGORITHM=INPLACE, LOCK=NONE')
+        elif dialect == 'postgresql':
+            check = f'{table_name}_{column}_not_null'
+            op.execute(f'ALTER TABLE {table_name} ADD CONSTRAINT {check} CHECK ({column} IS NOT NULL) NOT VALID')
+            op.execute(f'ALTER TABLE {table_name} VALIDATE CONSTRAINT {check}')
+            op.execute(f'ALTER TABLE {table_name} ALTER COLUMN {column} SET NOT NULL')
+            op.execute(f'ALTER TABLE {table_name} DROP CONSTRAINT {check}')
+
+
+def _to_minor(value):
+    return sa.cast(sa.func.round(value * 100), sa.BigInteger())
+
+
+def _to_float(value):
+    return value / 100.0
+
+
+def _convert(table_name, column, temporary, column_type, convert):
+    with op.batch_alter_table(table_name, schema=None) as batch_op:
+        batch_op.add_column(sa.Column(temporary, column_type, nullable=True))
+    _create_sync_trigger(table_name, column, temporary, convert)
+    _backfill(table_name, column, temporary, convert)
+    _swap(table_name, column, temporary, column_type)
+    _set_not_null(table_name, column, column_type)
+
+
+def upgrade():
+    for table_name, column in MONEY_COLUMNS:
+        _convert(table_name, column, f'{column}_minor', sa.BigInteger(), _to_minor)
+
+
+def downgrade():
+    for table_name, column in reversed(MONEY_COLUMNS):
+        _convert(table_name, column, f'{column}_float', sa.Float(), _to_float)
@@ -0,0 +1,26 @@
+"""ledger_entries.counterparty_id
+
+Revision ID: e2a7c5d1f936
+Revises: d9f3b6a2e481
+Create Date: 2026-10-19 09:41:12.530817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c5d1f936'
+down_revision = 'd9f3b6a2e481'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counterparty_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.drop_column('counterparty_id')
@@ -0,0 +1,39 @@
+"""job watermarks and loan reconciliation state
+
+Revision ID: e6a2f9b3c815
+Revises: d41b7c8e9f30
+Create Date: 2026-10-18 14:58:11.640273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2f9b3c815'
+down_revision = 'd41b7c8e9f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_watermarks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('loan_reconciliations',
+    sa.Column('loan_id', sa.Integer(), nullable=False),
+    sa.Column('repaid_total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('expected_balance', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('in_balance', sa.Boolean(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['loan_id'], ['loans.loan_id'], ),
+    sa.PrimaryKeyConstraint('loan_id')
+    )
+
+
+def downgrade():
+    op.drop_table('loan_reconciliations')
+    op.drop_table('job_watermarks')
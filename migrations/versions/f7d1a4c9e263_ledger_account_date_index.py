@@ -0,0 +1,27 @@
+"""index ledger_entries on (account_kind, account_id, entry_date, amount)
+
+Revision ID: f7d1a4c9e263
+Revises: c4f8a2e7b519
+Create Date: 2026-10-19 17:22:05.816340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d1a4c9e263'
+down_revision = 'c4f8a2e7b519'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_ledger_entries_account_date',
+                              ['account_kind', 'account_id', 'entry_date', 'amount'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ledger_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_ledger_entries_account_date')
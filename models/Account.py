@@ -1,17 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, Date, ForeignKey
 from sqlalchemy.orm import relationship
 from app import db
+from services.money import MoneyType
 
 class Account(db.Model):
     __tablename__ = 'accounts'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    customer_id = Column(Integer, nullable=False)
+    customer_id = Column(Integer, nullable=False, index=True)
     account_number = Column(String(20), unique=True, nullable=False)
     account_type = Column(String(20), nullable=False)
-    balance = Column(Float, nullable=False)
+    balance = Column(MoneyType, nullable=False)  # hundredths, as Money
+    currency = Column(String(3), nullable=False, default='DZD', server_default='DZD')
+    # Foreign-currency accounts: balance in the base currency at the last revaluation
+    base_balance = Column(Numeric(18, 2))
+    revalued_on = Column(Date)
     agency_id = Column(Integer, ForeignKey('agencies.id'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
 
     # Relationships
     user = relationship('User', back_populates='accounts')
@@ -20,6 +25,7 @@ class Account(db.Model):
     def to_dict(self):
         return {
             'id': self.id,
-            'balance': self.balance,
+            'balance': float(self.balance),
+            'currency': self.currency,
             'user_id': self.user_id
         }
@@ -0,0 +1,23 @@
+from app import db
+
+class AgencyDailyStats(db.Model):
+    __tablename__ = 'agency_daily_stats'
+
+    # Money movements of an agency's accounts and loans on one day
+    agency_id = db.Column(db.Integer, db.ForeignKey('agencies.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    credit_volume = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    debit_volume = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    repayment_count = db.Column(db.Integer, nullable=False, default=0)
+    repayment_volume = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'transaction_count': self.transaction_count,
+            'credit_volume': float(self.credit_volume),
+            'debit_volume': float(self.debit_volume),
+            'repayment_count': self.repayment_count,
+            'repayment_volume': float(self.repayment_volume)
+        }
@@ -0,0 +1,23 @@
+from datetime import datetime
+from app import db
+
+class AgencyStats(db.Model):
+    __tablename__ = 'agency_stats'
+
+    # Current totals of an agency, kept up to date by services/rollups.py
+    agency_id = db.Column(db.Integer, db.ForeignKey('agencies.id'), primary_key=True)
+    account_count = db.Column(db.Integer, nullable=False, default=0)
+    total_deposits = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    loan_count = db.Column(db.Integer, nullable=False, default=0)
+    loan_exposure = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'agency_id': self.agency_id,
+            'account_count': self.account_count,
+            'total_deposits': float(self.total_deposits),
+            'loan_count': self.loan_count,
+            'loan_exposure': float(self.loan_exposure),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
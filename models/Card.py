@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, ForeignKey
 from sqlalchemy.orm import relationship
 from app import db
+from services.money import MoneyType
 class Card(db.Model):
     __tablename__ = 'cards'
     id = Column(Integer, primary_key=True)
@@ -8,8 +9,8 @@ class Card(db.Model):
     card_type = Column(String(20), nullable=False)
     expiration_date = Column(Date, nullable=False)
     cardholder_name = Column(String(100), nullable=False)
-    balance = Column(Float, nullable=False)
-    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
+    balance = Column(MoneyType, nullable=False)  # hundredths, as Money
+    customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False, index=True)
     customer = relationship('Customer', backref='cards')
 
     def __repr__(self):
@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app import db
+from services.money import MoneyType
 
 
 class Credit(db.Model):
     __tablename__ = 'credits'
+    __table_args__ = (
+        Index('ix_credits_card_id_date', 'card_id', 'credit_date'),
+    )
     id = Column(Integer, primary_key=True)
     card_id = Column(Integer, ForeignKey('cards.id'), nullable=False)
-    credit_amount = Column(Float, nullable=False)
+    credit_amount = Column(MoneyType, nullable=False)  # hundredths, as Money
     credit_date = Column(Date, nullable=False)
     card = relationship('Card', backref='credits')
 
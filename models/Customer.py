@@ -12,9 +12,9 @@ class Customer(db.Model):
     last_name = db.Column(db.String(50), nullable=False)
     date_of_birth = db.Column(db.Date, nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
-    email_address = db.Column(db.String(100), nullable=False)
-    nin_cust = db.Column(db.String(20), nullable=False)
-    rib_cust = db.Column(db.String(24), nullable=False)
+    email_address = db.Column(db.String(100), nullable=False, unique=True)
+    nin_cust = db.Column(db.String(20), nullable=False, unique=True)
+    rib_cust = db.Column(db.String(24), nullable=False, unique=True)
 
     loans = db.relationship('Loan', back_populates='customer', lazy=True)
 
@@ -0,0 +1,40 @@
+from datetime import datetime
+from app import db
+
+class EodBalance(db.Model):
+    __tablename__ = 'eod_balances'
+    __table_args__ = (
+        # Drift report of a day reads the out-of-balance rows only
+        db.Index('ix_eod_balances_day_in_balance', 'day', 'in_balance'),
+    )
+
+    # Closing balance of an account, card or loan recomputed at end of day
+    kind = db.Column(db.String(10), primary_key=True)  # 'account', 'card' or 'loan'
+    entity_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    customer_id = db.Column(db.Integer)
+    agency_id = db.Column(db.Integer)
+    opening_balance = db.Column(db.Numeric(15, 2), nullable=False)
+    movement_count = db.Column(db.Integer, nullable=False, default=0)
+    net_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    expected_balance = db.Column(db.Numeric(15, 2), nullable=False)
+    actual_balance = db.Column(db.Numeric(15, 2), nullable=False)
+    drift = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    in_balance = db.Column(db.Boolean, nullable=False, default=True)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'entity_id': self.entity_id,
+            'day': self.day.isoformat(),
+            'customer_id': self.customer_id,
+            'agency_id': self.agency_id,
+            'opening_balance': float(self.opening_balance),
+            'movement_count': self.movement_count,
+            'net_amount': float(self.net_amount),
+            'expected_balance': float(self.expected_balance),
+            'actual_balance': float(self.actual_balance),
+            'drift': float(self.drift),
+            'in_balance': self.in_balance
+        }
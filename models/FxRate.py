@@ -0,0 +1,25 @@
+from datetime import datetime
+from app import db
+
+class FxRate(db.Model):
+    __tablename__ = 'fx_rates'
+    __table_args__ = (
+        # One rate per currency pair and effective date
+        db.UniqueConstraint('base_currency', 'quote_currency', 'effective_date', name='uq_fx_rates_pair_date'),
+    )
+
+    # 1 base_currency = rate quote_currency, from effective_date until the next rate of the pair
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    base_currency = db.Column(db.String(3), nullable=False)
+    quote_currency = db.Column(db.String(3), nullable=False)
+    rate = db.Column(db.Numeric(20, 10), nullable=False)
+    effective_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'base_currency': self.base_currency,
+            'quote_currency': self.quote_currency,
+            'rate': float(self.rate),
+            'effective_date': self.effective_date.isoformat() if self.effective_date else None
+        }
@@ -0,0 +1,28 @@
+from datetime import datetime
+from app import db
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    # Idempotency-Key header of a money-moving request (hashed with the client
+    # it came from) and the response it got. status_code is NULL while the
+    # first request is still being processed; claimed_at starts its lease.
+    key = db.Column(db.String(128), primary_key=True)
+    endpoint = db.Column(db.String(64), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    mimetype = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'endpoint': self.endpoint,
+            'status_code': self.status_code,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -0,0 +1,17 @@
+from datetime import datetime
+from app import db
+
+class JobWatermark(db.Model):
+    __tablename__ = 'job_watermarks'
+
+    # Last source row id processed by an incremental job
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'last_id': self.last_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
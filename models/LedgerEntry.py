@@ -0,0 +1,40 @@
+from datetime import datetime
+from app import db
+
+class LedgerEntry(db.Model):
+    __tablename__ = 'ledger_entries'
+    __table_args__ = (
+        # Statements are range scans on this index
+        db.Index('ix_ledger_entries_account_seq', 'account_kind', 'account_id', 'seq', unique=True),
+        # Point-in-time balances sum by entry_date: amount is included so the sum never reads the rows
+        db.Index('ix_ledger_entries_account_date', 'account_kind', 'account_id', 'entry_date', 'amount'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    account_kind = db.Column(db.String(10), nullable=False)  # 'account', 'card' or 'loan'
+    account_id = db.Column(db.Integer, nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    entry_type = db.Column(db.String(10), nullable=False)
+    amount = db.Column(db.Numeric(15, 2), nullable=False)  # signed: credit > 0, debit < 0
+    balance_after = db.Column(db.Numeric(15, 2), nullable=False)
+    entry_date = db.Column(db.Date, nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'))
+    # Transfers: the account on the other side, for the fraud windows
+    counterparty_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    transaction = db.relationship('Transaction')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account_kind': self.account_kind,
+            'account_id': self.account_id,
+            'seq': self.seq,
+            'entry_type': self.entry_type,
+            'amount': float(self.amount),
+            'balance_after': float(self.balance_after),
+            'entry_date': self.entry_date.isoformat() if self.entry_date else None,
+            'transaction_id': self.transaction_id,
+            'counterparty_id': self.counterparty_id
+        }
@@ -4,12 +4,19 @@ class Loan(db.Model):
     __tablename__ = 'loans'
     
     loan_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
+    client_id = db.Column(db.Integer, db.ForeignKey('customers.id'), index=True)
     loan_amount = db.Column(db.Numeric(10, 2))
     interest_rate = db.Column(db.Numeric(5, 2))
     start_date = db.Column(db.Date)
     end_date = db.Column(db.Date)
     outstanding_balance = db.Column(db.Numeric(10, 2))
+    # Outstanding amount when the loan was granted; reconciliation expects
+    # outstanding_balance == opening_balance - repayments
+    opening_balance = db.Column(db.Numeric(10, 2))
+    # Set in the same transaction as every repayment, cleared by reconciliation
+    needs_reconcile = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false(), index=True)
+    accrued_interest = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
+    accrued_through = db.Column(db.Date)
 
     customer = db.relationship('Customer', back_populates='loans')
     repayments = db.relationship('Repayment', back_populates='loan', lazy=True)
@@ -22,5 +29,7 @@ class Loan(db.Model):
             'interest_rate': float(self.interest_rate),
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
-            'outstanding_balance': float(self.outstanding_balance)
+            'outstanding_balance': float(self.outstanding_balance),
+            'accrued_interest': float(self.accrued_interest or 0),
+            'accrued_through': self.accrued_through.isoformat() if self.accrued_through else None
         }
@@ -0,0 +1,20 @@
+from datetime import datetime
+from app import db
+
+class LoanReconciliation(db.Model):
+    __tablename__ = 'loan_reconciliations'
+
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.loan_id'), primary_key=True)
+    repaid_total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    expected_balance = db.Column(db.Numeric(10, 2))
+    in_balance = db.Column(db.Boolean, nullable=False, default=True)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'loan_id': self.loan_id,
+            'repaid_total': float(self.repaid_total),
+            'expected_balance': float(self.expected_balance) if self.expected_balance is not None else None,
+            'in_balance': self.in_balance,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None
+        }
@@ -2,6 +2,9 @@ from app import db
 
 class Repayment(db.Model):
     __tablename__ = 'repayments'
+    __table_args__ = (
+        db.Index('ix_repayments_loan_id_date', 'loan_id', 'repayment_date'),
+    )
     
     repayment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     loan_id = db.Column(db.Integer, db.ForeignKey('loans.loan_id'), nullable=False)
@@ -1,10 +1,16 @@
 from app import db
+from services.money import MoneyType
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Keyset pagination of account statements: (account_id, date, id)
+        db.Index('ix_transactions_account_date_id', 'account_id', 'date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_transaction = db.Column(db.Integer, unique=True)
-    amount = db.Column(db.Float, nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'))
+    amount = db.Column(MoneyType, nullable=False)  # hundredths, as Money
     currency = db.Column(db.String(3), nullable=False)
     date = db.Column(db.Date, nullable=False)
     transaction_type = db.Column(db.String(10), nullable=False)
@@ -13,7 +19,8 @@ class Transaction(db.Model):
         return {
             'id': self.id,
             'id_transaction': self.id_transaction,
-            'amount': self.amount,
+            'account_id': self.account_id,
+            'amount': float(self.amount),
             'currency': self.currency,
             'date': self.date.isoformat() if self.date else None,
             'transaction_type': self.transaction_type
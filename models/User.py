@@ -25,18 +25,30 @@ class User(db.Model):
     agency = relationship('Agency', back_populates='users')
     accounts = relationship('Account', back_populates='user', lazy=True)
     
+    def set_password(self, password):
+        from services.passwords import password_hasher
+        self.password_hash = password_hasher.hash(password)
+
+    def check_password(self, password):
+        # Legacy or outdated hashes are upgraded in place; the caller commits
+        from services.passwords import password_hasher
+        ok, new_hash = password_hasher.verify(self.password_hash, password)
+        if ok and new_hash:
+            self.password_hash = new_hash
+        return ok
+
     def to_dict(self):
         return {
             'id': self.id,
             'username': self.username,
             'first_name': self.first_name,
             'last_name': self.last_name,
-            'date_of_birth': self.date_of_birth,
+            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
             'address': self.address,
             'phone_number': self.phone_number,
             'email_address': self.email_address,
             'nin_cust': self.nin_cust,
             'rib_cust': self.rib_cust,
             'agency_id': self.agency_id,
-            'registration_date': self.registration_date,
+            'registration_date': self.registration_date.isoformat() if self.registration_date else None,
         }
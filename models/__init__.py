@@ -6,3 +6,11 @@ from .Account import Account
 from .Transaction import Transaction
 from .Agency import Agency
 from .ContactMessage import ContactMessage
+from .LedgerEntry import LedgerEntry
+from .JobWatermark import JobWatermark
+from .LoanReconciliation import LoanReconciliation
+from .IdempotencyKey import IdempotencyKey
+from .AgencyStats import AgencyStats
+from .AgencyDailyStats import AgencyDailyStats
+from .FxRate import FxRate
+from .EodBalance import EodBalance
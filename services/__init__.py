@@ -0,0 +1,2 @@
+# Services metier (moteur de virement, etc.) utilises par les routes de app.py.
+# Les modules importent `db` et les modeles : a n'importer qu'apres create_app().
@@ -0,0 +1,153 @@
+import datetime
+
+import numpy as np
+from sqlalchemy import bindparam, or_, select
+
+from app import db
+from models.Loan import Loan
+from services.entity_cache import entity_cache
+from services.money import Money, to_minor
+
+# interest_rate is an annual percentage with 2 decimals: 5.25 -> 525 hundredths,
+# scaled like amounts by money.to_minor()
+RATE_SCALE = 100 * 100
+DAYS_PER_YEAR = 365
+CHUNK_SIZE = 10000
+
+
+def _div_round(numerator, denominator):
+    # Integer division rounding half up, for non-negative int64 arrays
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def daily_interest(outstanding_cents, rate_hundredths, days):
+    """Simple interest in cents for `days` days, on whole arrays at once."""
+    outstanding_cents = np.asarray(outstanding_cents, dtype=np.int64)
+    rate_hundredths = np.asarray(rate_hundredths, dtype=np.int64)
+    days = np.clip(np.asarray(days, dtype=np.int64), 0, None)
+    return _div_round(outstanding_cents * rate_hundredths * days, RATE_SCALE * DAYS_PER_YEAR)
+
+
+def term_in_months(start_dates, end_dates):
+    start = np.array(start_dates, dtype='datetime64[M]')
+    end = np.array(end_dates, dtype='datetime64[M]')
+    return np.maximum((end - start).astype(np.int64), 1)
+
+
+def amortization_schedule(principal_cents, rate_hundredths, months):
+    """Monthly annuity schedules for many loans at once.
+
+    Returns (payment, interest, principal, balance) as int64 arrays of shape
+    (n_loans, max(months)) in cents. Periods beyond a loan's term are zero and
+    the final period absorbs the rounding residual so every schedule repays
+    the principal exactly.
+    """
+    principal_cents = np.asarray(principal_cents, dtype=np.int64)
+    rate_hundredths = np.asarray(rate_hundredths, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    n_loans = principal_cents.shape[0]
+    periods = int(months.max()) if n_loans else 0
+
+    monthly_rate = rate_hundredths / (RATE_SCALE * 12.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = principal_cents * monthly_rate / (1 - (1 + monthly_rate) ** -months)
+    level_payment = np.where(monthly_rate > 0, np.rint(annuity), np.ceil(principal_cents / months))
+    level_payment = level_payment.astype(np.int64)
+
+    payment = np.zeros((n_loans, periods), dtype=np.int64)
+    interest = np.zeros_like(payment)
+    principal = np.zeros_like(payment)
+    balance = np.zeros_like(payment)
+    remaining = principal_cents.copy()
+    for period in range(periods):
+        active = period < months
+        last = period == months - 1
+        period_interest = _div_round(remaining * rate_hundredths, RATE_SCALE * 12)
+        period_principal = np.where(last, remaining,
+                                    np.minimum(level_payment - period_interest, remaining))
+        period_principal = np.where(active, np.maximum(period_principal, 0), 0)
+        period_interest = np.where(active, period_interest, 0)
+        remaining = remaining - period_principal
+        interest[:, period] = period_interest
+        principal[:, period] = period_principal
+        payment[:, period] = period_interest + period_principal
+        balance[:, period] = remaining
+    return payment, interest, principal, balance
+
+
+def loan_schedule(loan):
+    payment, interest, principal, balance = amortization_schedule(
+        [to_minor(loan.loan_amount or 0)],
+        [to_minor(loan.interest_rate or 0)],
+        term_in_months([loan.start_date], [loan.end_date])
+    )
+    return [
+        {
+            'period': period + 1,
+            'payment': float(Money(int(payment[0, period]))),
+            'interest': float(Money(int(interest[0, period]))),
+            'principal': float(Money(int(principal[0, period]))),
+            'balance': float(Money(int(balance[0, period])))
+        }
+        for period in range(payment.shape[1])
+    ]
+
+
+def _portfolio_chunks(as_of):
+    """Open loans still to accrue, in keyset pages of CHUNK_SIZE by loan_id."""
+    loans = Loan.__table__
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(loans.c.loan_id, loans.c.outstanding_balance, loans.c.interest_rate,
+                   loans.c.start_date, loans.c.end_date, loans.c.accrued_through)
+            .where(loans.c.loan_id > last_id)
+            .where(loans.c.outstanding_balance > 0)
+            .where(loans.c.start_date < as_of)
+            .where(or_(loans.c.accrued_through.is_(None), loans.c.accrued_through < as_of))
+            .order_by(loans.c.loan_id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].loan_id
+
+
+def accrue_interest(as_of=None):
+    """Accrue simple daily interest on every open loan up to `as_of`.
+
+    Interest runs from the later of start_date and accrued_through to the
+    earlier of as_of and end_date, computed per chunk of loans with NumPy and
+    written back with one executemany UPDATE per chunk. Re-running for the
+    same date is a no-op.
+    """
+    as_of = as_of or datetime.date.today()
+    loans = Loan.__table__
+    update_loan = (
+        loans.update()
+        .where(loans.c.loan_id == bindparam('b_loan_id'))
+        .values(accrued_interest=loans.c.accrued_interest + bindparam('b_interest'),
+                accrued_through=bindparam('b_as_of'))
+    )
+    total_loans = 0
+    total_cents = 0
+    for rows in _portfolio_chunks(as_of):
+        ids = np.array([row.loan_id for row in rows], dtype=np.int64)
+        outstanding = np.array([to_minor(row.outstanding_balance or 0) for row in rows], dtype=np.int64)
+        rates = np.array([to_minor(row.interest_rate or 0) for row in rows], dtype=np.int64)
+        start = np.array([row.accrued_through or row.start_date for row in rows], dtype='datetime64[D]')
+        end = np.array([min(as_of, row.end_date) if row.end_date else as_of for row in rows],
+                       dtype='datetime64[D]')
+        days = (end - start).astype(np.int64)
+
+        interest = daily_interest(outstanding, rates, days)
+        db.session.execute(update_loan, [
+            {'b_loan_id': int(loan_id), 'b_interest': Money(int(cents)).to_decimal(), 'b_as_of': as_of}
+            for loan_id, cents in zip(ids, interest)
+        ])
+        entity_cache.mark_dirty(db.session, 'loan', ids.tolist())
+        db.session.commit()
+        total_loans += len(rows)
+        total_cents += int(interest.sum())
+    return {'loans': total_loans, 'interest': float(Money(total_cents)), 'as_of': as_of.isoformat()}
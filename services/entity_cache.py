@@ -0,0 +1,185 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+from app import db
+
+_MISSING = object()
+
+
+class LRUBackend:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Backend for Redis or any server speaking its protocol (KeyDB, Dragonfly...)."""
+
+    def __init__(self, url, prefix='entity:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("ENTITY_CACHE_BACKEND='redis' requires the redis package")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete_many(self, keys):
+        if keys:
+            self._client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+class EntityCache:
+    """Read-through cache of to_dict() payloads keyed by (kind, primary key).
+
+    Entries are evicted when a session that flushed changes to the entity
+    commits, so readers never see a value older than the last commit.
+    """
+
+    def __init__(self, config_prefix='ENTITY_CACHE'):
+        self.config_prefix = config_prefix
+        # Each cache keeps its own pending set in session.info
+        self._info_key = f'{config_prefix.lower()}_dirty'
+        self.backend = None
+        self.default_ttl = 60
+        self.ttls = {}
+        self.models = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def init_app(self, app, models):
+        prefix = self.config_prefix
+        backend = app.config.get(f'{prefix}_BACKEND', 'lru')
+        if backend == 'redis':
+            self.backend = RedisBackend(app.config[f'{prefix}_REDIS_URL'], prefix=f'{prefix.lower()}:')
+        elif backend == 'lru':
+            self.backend = LRUBackend(app.config.get(f'{prefix}_MAXSIZE', 10000))
+        else:
+            self.backend = None
+        self.default_ttl = app.config.get(f'{prefix}_TTL', self.default_ttl)
+        self.ttls = app.config.get(f'{prefix}_TTLS', {})
+        # models maps a model class to the cache kind its rows are stored under
+        self.models = models
+        self._stats = {kind: {'hits': 0, 'misses': 0, 'evictions': 0} for kind in models.values()}
+
+        if not getattr(self, '_listening', False):
+            event.listen(db.session, 'after_flush', self._collect_changes)
+            event.listen(db.session, 'after_commit', self._evict_changes)
+            event.listen(db.session, 'after_rollback', self._discard_changes)
+            self._listening = True
+
+    @staticmethod
+    def key(kind, entity_id):
+        return f'{kind}:{entity_id}'
+
+    def get_or_load(self, kind, entity_id, loader, ttl=None):
+        """Return the cached payload, or call `loader()` and cache its result.
+
+        `loader` returns the payload or None when the entity does not exist;
+        missing entities are not cached. `ttl` overrides the kind's TTL.
+        """
+        if self.backend is None:
+            return loader()
+        key = self.key(kind, entity_id)
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self._count(kind, 'hits')
+            return value
+        self._count(kind, 'misses')
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value, ttl or self.ttls.get(kind, self.default_ttl))
+        return value
+
+    def mark_dirty(self, session, kind, entity_ids):
+        """Schedule eviction for rows changed outside the ORM (Core UPDATEs)."""
+        pending = session.info.setdefault(self._info_key, set())
+        pending.update((kind, entity_id) for entity_id in entity_ids)
+
+    def invalidate(self, kind, entity_ids):
+        if self.backend is None:
+            return
+        self.backend.delete_many([self.key(kind, entity_id) for entity_id in entity_ids])
+        self._count(kind, 'evictions', len(entity_ids))
+
+    def _collect_changes(self, session, flush_context):
+        pending = session.info.setdefault(self._info_key, set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            kind = self.models.get(type(obj))
+            if kind is not None:
+                identity = inspect(obj).identity
+                if identity:
+                    pending.add((kind, identity[0]))
+
+    def _evict_changes(self, session):
+        pending = session.info.pop(self._info_key, None)
+        if not pending:
+            return
+        by_kind = {}
+        for kind, entity_id in pending:
+            by_kind.setdefault(kind, []).append(entity_id)
+        for kind, entity_ids in by_kind.items():
+            self.invalidate(kind, entity_ids)
+
+    def _discard_changes(self, session):
+        session.info.pop(self._info_key, None)
+
+    def _count(self, kind, name, amount=1):
+        with self._lock:
+            self._stats.setdefault(kind, {'hits': 0, 'misses': 0, 'evictions': 0})[name] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = {kind: dict(values) for kind, values in self._stats.items()}
+        for values in stats.values():
+            lookups = values['hits'] + values['misses']
+            values['hit_ratio'] = values['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+entity_cache = EntityCache()
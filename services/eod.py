@@ -0,0 +1,315 @@
+import concurrent.futures
+import csv
+import datetime
+import gzip
+import multiprocessing
+import os
+import time
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import and_, func, literal, select
+
+from app import db
+from models.Account import Account
+from models.Agency import Agency
+from models.Card import Card
+from models.Credit import Credit
+from models.EodBalance import EodBalance
+from models.LedgerEntry import LedgerEntry
+from models.Loan import Loan
+from models.Repayment import Repayment
+from models.Transaction import Transaction
+from services import ledger
+from services.rollups import _customer_agency
+
+# Customers per chunk, and ids per IN (...) list
+CHUNK_SIZE = 500
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+# Drifted rows returned in the summary (all of them are in eod_balances)
+REPORT_LIMIT = 100
+STATEMENT_COLUMNS = ('kind', 'id', 'date', 'reference', 'type', 'amount', 'balance')
+
+
+def _money(value):
+    if value is None:
+        return ZERO
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT)
+
+
+class _Kind:
+    """Where the balances of one kind of entity and their movements live."""
+
+    def __init__(self, name, entity_id, customer_id, balance, movement_fk, movement_date, movement_id,
+                 movement_type, movement_amount, sign):
+        self.name = name
+        self.entity_id = entity_id
+        self.customer_id = customer_id
+        self.balance = balance
+        self.movement_fk = movement_fk
+        self.movement_date = movement_date
+        self.movement_id = movement_id
+        self.movement_type = movement_type
+        self.movement_amount = movement_amount
+        self.sign = sign
+
+    def entities(self, customer_ids):
+        return (select(self.entity_id, self.customer_id, self.balance)
+                .where(self.customer_id.in_(customer_ids))
+                .order_by(self.entity_id))
+
+    def movements(self, entity_ids, day):
+        # Rows after `day` are read too: they are already in the live balance
+        return (select(self.movement_fk, self.movement_date, self.movement_id, self.movement_type,
+                       self.movement_amount)
+                .where(self.movement_fk.in_(entity_ids), self.movement_date >= day)
+                .order_by(self.movement_fk, self.movement_date, self.movement_id))
+
+
+def _kinds():
+    accounts = Account.__table__
+    transactions = Transaction.__table__
+    cards = Card.__table__
+    credits = Credit.__table__
+    loans = Loan.__table__
+    repayments = Repayment.__table__
+    return (
+        _Kind(ledger.ACCOUNT, accounts.c.id, accounts.c.customer_id, accounts.c.balance,
+              transactions.c.account_id, transactions.c.date, transactions.c.id,
+              transactions.c.transaction_type, transactions.c.amount,
+              lambda entry_type, amount: -amount if entry_type == 'debit' else amount),
+        _Kind(ledger.CARD, cards.c.id, cards.c.customer_id, cards.c.balance,
+              credits.c.card_id, credits.c.credit_date, credits.c.id,
+              literal('credit'), credits.c.credit_amount,
+              lambda entry_type, amount: amount),
+        # A repayment lowers the outstanding balance of its loan
+        _Kind(ledger.LOAN, loans.c.loan_id, loans.c.client_id, loans.c.outstanding_balance,
+              repayments.c.loan_id, repayments.c.repayment_date, repayments.c.repayment_id,
+              literal('repayment'), repayments.c.repayment_amount,
+              lambda entry_type, amount: -amount),
+    )
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def partition_customers(agency_id):
+    """Customers reconciled by one agency's partition, in id order.
+
+    A customer belongs to the agency of their first account (as for the
+    rollups), so all of their accounts, cards and loans are reconciled by
+    the same worker and end up in one statement. Partition None holds the
+    customers with cards or loans but no account.
+    """
+    if agency_id is not None:
+        mapping = _customer_agency()
+        return [customer_id for customer_id, in db.session.execute(
+            select(mapping.c.customer_id).where(mapping.c.agency_id == agency_id).order_by(mapping.c.customer_id))]
+    with_account = select(Account.__table__.c.customer_id)
+    cards = select(Card.__table__.c.customer_id).where(Card.__table__.c.customer_id.not_in(with_account))
+    loans = select(Loan.__table__.c.client_id).where(Loan.__table__.c.client_id.not_in(with_account),
+                                                     Loan.__table__.c.client_id.is_not(None))
+    customers = {customer_id for customer_id, in db.session.execute(cards.union(loans))}
+    return sorted(customers)
+
+
+def _openings(kind, entity_ids, day):
+    """Balance at the end of the previous day: last EOD run, else the ledger.
+
+    From the ledger, it is the balance before the first entry plus every
+    entry dated before `day`, summed by date rather than read from the
+    latest seq, so back-dated postings land on the day they are dated.
+    Entities whose ledger starts later get the balance before their first
+    entry.
+    """
+    previous = day - datetime.timedelta(days=1)
+    entries = LedgerEntry.__table__
+    openings = dict(db.session.execute(
+        select(EodBalance.entity_id, EodBalance.actual_balance)
+        .where(EodBalance.kind == kind.name, EodBalance.entity_id.in_(entity_ids), EodBalance.day == previous)
+    ).all())
+    missing = [entity_id for entity_id in entity_ids if entity_id not in openings]
+    if missing:
+        baselines = db.session.execute(
+            select(entries.c.account_id, entries.c.balance_after - entries.c.amount)
+            .where(entries.c.account_kind == kind.name, entries.c.account_id.in_(missing),
+                   entries.c.seq == 1)
+        ).all()
+        dated = dict(db.session.execute(
+            select(entries.c.account_id, func.sum(entries.c.amount))
+            .where(entries.c.account_kind == kind.name, entries.c.account_id.in_(missing),
+                   entries.c.entry_date <= previous)
+            .group_by(entries.c.account_id)
+        ).all())
+        for entity_id, baseline in baselines:
+            openings[entity_id] = _money(baseline) + _money(dated.get(entity_id))
+    return openings
+
+
+def _reconcile_chunk(kind, customer_ids, day, agency_id, checked_at, statements):
+    entities = db.session.execute(kind.entities(customer_ids)).all()
+    if not entities:
+        return []
+    entity_ids = [entity_id for entity_id, _, _ in entities]
+    movements = {}
+    for ids in _chunks(entity_ids):
+        for entity_id, date, reference, entry_type, amount in db.session.execute(kind.movements(ids, day)):
+            movements.setdefault(entity_id, []).append((date, reference, entry_type,
+                                                        kind.sign(entry_type, _money(amount))))
+    openings = {}
+    for ids in _chunks(entity_ids):
+        openings.update(_openings(kind, ids, day))
+
+    rows = []
+    for entity_id, customer_id, balance in entities:
+        moves = movements.get(entity_id, [])
+        today = [move for move in moves if move[0] == day]
+        net_today = sum((move[3] for move in today), ZERO)
+        net_after = sum((move[3] for move in moves if move[0] > day), ZERO)
+        actual = _money(balance) - net_after
+        opening = openings.get(entity_id)
+        # No earlier run nor ledger entry: today's closing is the baseline
+        opening = _money(opening) if opening is not None else actual - net_today
+        expected = opening + net_today
+        drift = actual - expected
+        rows.append({
+            'kind': kind.name, 'entity_id': entity_id, 'day': day, 'customer_id': customer_id,
+            'agency_id': agency_id, 'opening_balance': opening, 'movement_count': len(today),
+            'net_amount': net_today, 'expected_balance': expected, 'actual_balance': actual,
+            'drift': drift, 'in_balance': drift == ZERO, 'checked_at': checked_at,
+        })
+        if today:
+            statements.setdefault(customer_id, []).append((kind.name, entity_id, opening, today, expected))
+    return rows
+
+
+def _write_statement(directory, customer_id, day, sections, compresslevel):
+    path = os.path.join(directory, f'customer-{customer_id}.csv.gz')
+    with gzip.open(path, 'wt', newline='', compresslevel=compresslevel) as f:
+        writer = csv.writer(f)
+        writer.writerow(STATEMENT_COLUMNS)
+        for kind, entity_id, opening, moves, closing in sections:
+            writer.writerow((kind, entity_id, day.isoformat(), '', 'opening', '', opening))
+            running = opening
+            for date, reference, entry_type, amount in moves:
+                running += amount
+                writer.writerow((kind, entity_id, date.isoformat(), reference, entry_type, amount, running))
+            writer.writerow((kind, entity_id, day.isoformat(), '', 'closing', '', closing))
+
+
+def reconcile_partition(agency_id, day):
+    """Recompute one partition's closing balances for `day` and write its statements.
+
+    Customers are processed CHUNK_SIZE at a time: their accounts, cards and
+    loans are read, then the movements dated `day` or later for those
+    entities only (index range scans on (entity, date)), so memory is
+    bounded by the chunk, not the day. Each chunk's results replace any
+    earlier run of the same day in eod_balances and are committed before
+    the next chunk; customers with movements get a gzipped CSV statement.
+    """
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    started = time.monotonic()
+    config = current_app.config
+    directory = os.path.join(config['EOD_STATEMENTS_DIR'], day.isoformat(),
+                             f'agency-{agency_id}' if agency_id is not None else 'no-agency')
+    os.makedirs(directory, exist_ok=True)
+    checked_at = datetime.datetime.utcnow()
+    kinds = _kinds()
+    summary = {'agency_id': agency_id, 'customers': 0, 'entities': 0, 'movements': 0,
+               'drifted': 0, 'statements': 0, 'drift': []}
+    customers = partition_customers(agency_id)
+    for customer_ids in _chunks(customers):
+        statements = {}
+        for kind in kinds:
+            rows = _reconcile_chunk(kind, customer_ids, day, agency_id, checked_at, statements)
+            if not rows:
+                continue
+            db.session.query(EodBalance).filter(
+                EodBalance.kind == kind.name, EodBalance.day == day,
+                EodBalance.entity_id.in_([row['entity_id'] for row in rows])
+            ).delete(synchronize_session=False)
+            db.session.execute(EodBalance.__table__.insert(), rows)
+            summary['entities'] += len(rows)
+            for row in rows:
+                summary['movements'] += row['movement_count']
+                if not row['in_balance']:
+                    summary['drifted'] += 1
+                    if len(summary['drift']) < REPORT_LIMIT:
+                        summary['drift'].append({
+                            'kind': row['kind'], 'entity_id': row['entity_id'],
+                            'customer_id': row['customer_id'], 'expected_balance': float(row['expected_balance']),
+                            'actual_balance': float(row['actual_balance']), 'drift': float(row['drift']),
+                        })
+        db.session.commit()
+        for customer_id, sections in statements.items():
+            _write_statement(directory, customer_id, day, sections, config['EOD_COMPRESSLEVEL'])
+        summary['customers'] += len(customer_ids)
+        summary['statements'] += len(statements)
+    summary['seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
+
+# Process pool workers: each builds its own app (and so its own engine and pool)
+_worker_app = None
+
+
+def _init_worker(config_name):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config_name)
+    _worker_app.app_context().push()
+
+
+def _run_partition(agency_id, day):
+    try:
+        return reconcile_partition(agency_id, day)
+    finally:
+        db.session.remove()
+
+
+def run_eod(day=None, workers=None):
+    """Reconcile every balance for `day` (default: yesterday), one partition per agency.
+
+    Partitions run in a process pool of `workers` processes (EOD_WORKERS).
+    Workers are started with 'spawn' so each opens its own database
+    connections. With workers <= 1, or inside a daemonic process (a
+    prefork Celery worker cannot have children), partitions run here one
+    after the other.
+    """
+    day = day or datetime.date.today() - datetime.timedelta(days=1)
+    workers = current_app.config['EOD_WORKERS'] if workers is None else workers
+    started = time.monotonic()
+    partitions = [agency_id for agency_id, in db.session.execute(select(Agency.id).order_by(Agency.id))] + [None]
+    db.session.remove()
+
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        results = [reconcile_partition(agency_id, day) for agency_id in partitions]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(workers, len(partitions)), mp_context=context,
+                initializer=_init_worker, initargs=(current_app.config['CONFIG_NAME'],)) as pool:
+            results = list(pool.map(_run_partition, partitions, [day.isoformat()] * len(partitions)))
+
+    totals = {name: sum(result[name] for result in results)
+              for name in ('customers', 'entities', 'movements', 'drifted', 'statements')}
+    drift = [item for result in results for item in result['drift']][:REPORT_LIMIT]
+    return {'day': day.isoformat(), **totals, 'drift': drift, 'partitions': len(partitions),
+            'seconds': round(time.monotonic() - started, 3)}
+
+
+def drift_report(day, limit=REPORT_LIMIT):
+    rows = (
+        EodBalance.query
+        .filter(EodBalance.day == day, EodBalance.in_balance.is_(False))
+        .order_by(EodBalance.kind, EodBalance.entity_id)
+        .limit(limit)
+        .all()
+    )
+    return [row.to_dict() for row in rows]
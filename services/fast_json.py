@@ -0,0 +1,61 @@
+import datetime
+import decimal
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+from services.money import Money
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (decimal.Decimal, Money)):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, sort_keys=False):
+        return orjson.dumps(obj, default=_default,
+                            option=_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _OPTIONS)
+else:
+    def dumps_bytes(obj, sort_keys=False):
+        return json.dumps(obj, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj, sort_keys=False):
+    """JSON text with native Decimal, date and datetime support (orjson when installed)."""
+    return dumps_bytes(obj, sort_keys).decode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider on top of dumps_bytes.
+
+    Dates are written as ISO 8601 (Flask's default provider uses HTTP dates)
+    and Decimals and Money as numbers. dumps() calls with extra json.dumps options,
+    such as indent, go through the stdlib encoder.
+    """
+
+    default = staticmethod(_default)
+
+    def encode(self, obj):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return json.dumps(obj, default=_default, sort_keys=self.sort_keys, indent=2).encode('utf-8')
+        return dumps_bytes(obj, self.sort_keys)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.sort_keys)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
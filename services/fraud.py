@@ -0,0 +1,298 @@
+import datetime
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from models.LedgerEntry import LedgerEntry
+from services import ledger
+from services.profiling import Histogram
+
+ALLOW = 'allow'
+REVIEW = 'review'
+BLOCK = 'block'
+# Points added to the score by each rule that fires
+RULE_WEIGHTS = {
+    'velocity_amount': 100,
+    'velocity_count': 100,
+    'new_counterparties': 60,
+}
+# Decision latency buckets, in microseconds
+US_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+REBUILD_MAX_ROWS = 500000
+
+
+class Decision:
+    __slots__ = ('outcome', 'score', 'rules')
+
+    def __init__(self, outcome, score, rules):
+        self.outcome = outcome
+        self.score = score
+        self.rules = rules
+
+    @property
+    def blocked(self):
+        return self.outcome == BLOCK
+
+    def to_dict(self):
+        return {'outcome': self.outcome, 'score': self.score, 'rules': list(self.rules)}
+
+
+class _Window:
+    """Last `size` movements of one account or card, as two ring buffers.
+
+    `times` and `amounts` are preallocated C arrays written at `head`, so
+    recording is O(1) and a window sum walks back from the newest entry
+    until it leaves the window. Counterparties seen recently are kept in
+    insertion order (oldest evicted first); first-time counterparties get
+    their own ring of timestamps for the burst rule.
+    """
+
+    __slots__ = ('times', 'amounts', 'head', 'peers', 'new_peer_times', 'new_peer_head')
+
+    def __init__(self, size, peer_size):
+        self.times = array('d', bytes(8 * size))
+        self.amounts = array('d', bytes(8 * size))
+        self.head = 0
+        self.peers = {}
+        self.new_peer_times = array('d', bytes(8 * peer_size))
+        self.new_peer_head = 0
+
+    def totals(self, since):
+        times = self.times
+        amounts = self.amounts
+        size = len(times)
+        count = 0
+        total = 0.0
+        i = self.head
+        while count < size:
+            i = (i - 1) % size
+            if times[i] < since:
+                break
+            count += 1
+            total += amounts[i]
+        return count, total
+
+    def new_peers_since(self, since):
+        times = self.new_peer_times
+        size = len(times)
+        count = 0
+        i = self.new_peer_head
+        while count < size:
+            i = (i - 1) % size
+            if times[i] < since:
+                break
+            count += 1
+        return count
+
+    def record(self, now, amount, counterparty, peer_memory):
+        self.times[self.head] = now
+        self.amounts[self.head] = amount
+        self.head = (self.head + 1) % len(self.times)
+        if counterparty is None:
+            return
+        if counterparty in self.peers:
+            return
+        self.peers[counterparty] = None
+        if len(self.peers) > peer_memory:
+            del self.peers[next(iter(self.peers))]
+        self.new_peer_times[self.new_peer_head] = now
+        self.new_peer_head = (self.new_peer_head + 1) % len(self.new_peer_times)
+
+
+class FraudEngine:
+    """In-process velocity scoring of outgoing transfers and card credits.
+
+    Each account or card has a _Window; idle ones are evicted LRU-style
+    once more than `max_tracked` are held. A decision sums the weights of
+    the rules that would fire if the movement went through: amount or
+    count over the sliding window, or too many first-time counterparties
+    in a short window. Amounts are in the currency of the account or card.
+    Windows are updated with record() once the money has moved, and
+    rebuilt from the last window of the ledger in a background thread
+    started by the first decision, so a restart does not reset the limits
+    and no request waits for the rebuild.
+
+    State is per process: with several workers, each sees only the
+    movements it handled itself since the rebuild.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.window = 3600.0
+        self.max_count = 20
+        self.max_amount = 1000000.0
+        self.new_peer_window = 600.0
+        self.max_new_peers = 3
+        self.review_score = 50
+        self.block_score = 100
+        self.ring_size = 64
+        self.peer_memory = 32
+        self.max_tracked = 100000
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self._rebuild_started = False
+        # Movements recorded while a rebuild runs, replayed on top of it
+        self._pending = None
+        self._latency = Histogram(US_BUCKETS)
+        self._outcomes = {ALLOW: 0, REVIEW: 0, BLOCK: 0}
+        self._rules = dict.fromkeys(RULE_WEIGHTS, 0)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('FRAUD_ENABLED', self.enabled)
+        self.window = float(app.config.get('FRAUD_WINDOW_SECONDS', self.window))
+        self.max_count = app.config.get('FRAUD_MAX_COUNT', self.max_count)
+        self.max_amount = float(app.config.get('FRAUD_MAX_AMOUNT', self.max_amount))
+        self.new_peer_window = float(app.config.get('FRAUD_NEW_PEER_WINDOW_SECONDS', self.new_peer_window))
+        self.max_new_peers = app.config.get('FRAUD_MAX_NEW_PEERS', self.max_new_peers)
+        self.review_score = app.config.get('FRAUD_REVIEW_SCORE', self.review_score)
+        self.block_score = app.config.get('FRAUD_BLOCK_SCORE', self.block_score)
+        self.max_tracked = app.config.get('FRAUD_MAX_TRACKED', self.max_tracked)
+        # The rings must hold one event more than the limits they check
+        self.ring_size = max(app.config.get('FRAUD_RING_SIZE', self.ring_size), self.max_count + 1)
+
+    def _get(self, key, windows=None):
+        windows = self._windows if windows is None else windows
+        window = windows.get(key)
+        if window is None:
+            window = windows[key] = _Window(self.ring_size, self.max_new_peers + 1)
+            while len(windows) > self.max_tracked:
+                windows.popitem(last=False)
+        else:
+            windows.move_to_end(key)
+        return window
+
+    def score(self, kind, entity_id, amount, counterparty=None):
+        """Decision for moving `amount` out of (kind, entity_id), without recording it."""
+        if not self.enabled:
+            return Decision(ALLOW, 0, ())
+        if not self._rebuild_started:
+            self.start_rebuild(current_app._get_current_object())
+        start = time.perf_counter()
+        now = time.time()
+        amount = float(amount)
+        rules = []
+        with self._lock:
+            window = self._get((kind, entity_id))
+            count, total = window.totals(now - self.window)
+            if count + 1 > self.max_count:
+                rules.append('velocity_count')
+            if total + amount > self.max_amount:
+                rules.append('velocity_amount')
+            if counterparty is not None and counterparty not in window.peers \
+                    and window.new_peers_since(now - self.new_peer_window) + 1 > self.max_new_peers:
+                rules.append('new_counterparties')
+        score = sum(RULE_WEIGHTS[rule] for rule in rules)
+        if score >= self.block_score:
+            outcome = BLOCK
+        elif score >= self.review_score:
+            outcome = REVIEW
+        else:
+            outcome = ALLOW
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self._latency.observe(elapsed_us)
+            self._outcomes[outcome] += 1
+            for rule in rules:
+                self._rules[rule] += 1
+        if outcome != ALLOW:
+            current_app.logger.warning(
+                f"Fraud rules {', '.join(rules)} fired for {kind} {entity_id}: {outcome}",
+                extra={'kind': kind, 'entity_id': entity_id, 'amount': amount, 'score': score})
+        return Decision(outcome, score, tuple(rules))
+
+    def record(self, kind, entity_id, amount, counterparty=None, at=None):
+        """Add a movement that went through to its window."""
+        if not self.enabled:
+            return
+        event = ((kind, entity_id), at or time.time(), float(amount), counterparty)
+        with self._lock:
+            self._record(self._windows, *event)
+            if self._pending is not None:
+                self._pending.append(event)
+
+    def _record(self, windows, key, at, amount, counterparty):
+        self._get(key, windows).record(at, amount, counterparty, self.peer_memory)
+
+    def start_rebuild(self, app):
+        """Run rebuild() once, in a daemon thread with its own app context."""
+        with self._lock:
+            if self._rebuild_started:
+                return None
+            self._rebuild_started = True
+        thread = threading.Thread(target=self._rebuild_in, args=(app,), name='fraud-rebuild', daemon=True)
+        thread.start()
+        return thread
+
+    def _rebuild_in(self, app):
+        with app.app_context():
+            try:
+                self.rebuild()
+            finally:
+                db.session.remove()
+
+    def rebuild(self):
+        """Reload the windows from the ledger entries of the last window.
+
+        Transfer debits carry the receiving account as their counterparty
+        (entries written before it was recorded have none); card credits
+        come from the card ledger, which has one entry per Credit row with
+        the time it was posted. The windows are built apart, then the
+        movements recorded meanwhile are replayed on top and the result
+        replaces the live windows.
+        """
+        with self._lock:
+            self._pending = []
+        # Movements posted from now on are recorded live, and so in _pending
+        until = datetime.datetime.utcnow()
+        since = until - datetime.timedelta(seconds=max(self.window, self.new_peer_window))
+        entries = LedgerEntry.__table__
+        try:
+            rows = db.session.execute(
+                select(entries.c.account_kind, entries.c.account_id, entries.c.amount,
+                       entries.c.counterparty_id, entries.c.created_at)
+                .where(or_(and_(entries.c.account_kind == ledger.ACCOUNT, entries.c.entry_type == 'debit'),
+                           and_(entries.c.account_kind == ledger.CARD, entries.c.entry_type == 'credit')),
+                       entries.c.created_at >= since, entries.c.created_at < until)
+                .order_by(entries.c.id.desc())
+                .limit(REBUILD_MAX_ROWS)
+            ).all()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            with self._lock:
+                self._pending = None
+            current_app.logger.error(f"Could not rebuild fraud windows: {e}")
+            return
+        windows = OrderedDict()
+        for row in sorted(rows, key=lambda row: row.created_at):
+            self._record(windows, (row.account_kind, row.account_id), _timestamp(row.created_at),
+                         float(abs(row.amount)), row.counterparty_id)
+        with self._lock:
+            for event in self._pending:
+                self._record(windows, *event)
+            self._pending = None
+            self._windows = windows
+        current_app.logger.info(f"Fraud windows rebuilt from {len(rows)} movements")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'tracked': len(self._windows),
+                'decisions': dict(self._outcomes),
+                'rules': dict(self._rules),
+                'latency_us': self._latency.to_dict(),
+                'avg_latency_us': self._latency.sum / self._latency.count if self._latency.count else 0.0,
+            }
+
+
+def _timestamp(value):
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+fraud_engine = FraudEngine()
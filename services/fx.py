@@ -0,0 +1,220 @@
+import bisect
+import datetime
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from sqlalchemy import bindparam, select
+
+from app import db
+from models.Account import Account
+from models.FxRate import FxRate
+from models.JobWatermark import JobWatermark
+from services.money import DIGITS
+
+# Digits after the decimal point, for currencies that do not use 2 (ISO 4217)
+CURRENCY_EXPONENTS = {
+    'JPY': 0, 'KRW': 0, 'XOF': 0, 'XAF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+}
+# job_watermarks row whose last_id is bumped whenever fx_rates changes
+VERSION_KEY = 'fx_rates'
+REVALUATION_CHUNK_SIZE = 5000
+ONE = Decimal(1)
+
+
+class FxError(Exception):
+    status_code = 422
+
+
+def minor_unit(currency):
+    return ONE.scaleb(-CURRENCY_EXPONENTS.get(currency, 2))
+
+
+def quantize(amount, currency):
+    """Round an amount to the minor unit of its currency (banker's rounding)."""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return amount.quantize(minor_unit(currency), rounding=ROUND_HALF_EVEN)
+
+
+def check_currency(currency):
+    # Money columns hold hundredths: 3-decimal currencies (KWD, BHD...) would be rounded
+    if CURRENCY_EXPONENTS.get(currency, 2) > DIGITS:
+        raise FxError(f"Currency {currency} is not supported: amounts are kept to {DIGITS} decimals")
+
+
+def check_amount(amount, currency):
+    """Refuse an amount with more decimals than `currency` has (JPY: whole yen only)."""
+    check_currency(currency)
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    if quantize(value, currency) != value:
+        raise FxError(f"Invalid amount for {currency}: {amount}")
+
+
+class RateCache:
+    """FX rates held in memory, reloaded when the rate table's version changes.
+
+    For each currency pair the cache keeps the sorted effective dates and
+    their rates, so a lookup is a bisect. Writers bump a version number in
+    job_watermarks along with the rates; readers compare it at most every
+    `check_interval` seconds, so a transfer never queries the rate table
+    and other processes pick up new rates within that interval. Pairs
+    without a rate of their own go through the inverse rate or through the
+    base currency.
+    """
+
+    def __init__(self):
+        self.base_currency = 'DZD'
+        self.check_interval = 5.0
+        self._rates = {}
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.base_currency = app.config.get('FX_BASE_CURRENCY', self.base_currency)
+        self.check_interval = app.config.get('FX_VERSION_CHECK_INTERVAL', self.check_interval)
+
+    def _stored_version(self):
+        return db.session.query(JobWatermark.last_id).filter_by(name=VERSION_KEY).scalar() or 0
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            if not force and self._version is not None and now - self._checked < self.check_interval:
+                return
+            version = self._stored_version()
+            if force or version != self._version:
+                rates = {}
+                table = FxRate.__table__
+                for base, quote, effective_date, rate in db.session.execute(
+                        select(table.c.base_currency, table.c.quote_currency, table.c.effective_date, table.c.rate)
+                        .order_by(table.c.base_currency, table.c.quote_currency, table.c.effective_date)):
+                    dates, values = rates.setdefault((base, quote), ([], []))
+                    dates.append(effective_date)
+                    values.append(Decimal(rate))
+                self._rates = rates
+                self._version = version
+            self._checked = now
+
+    def _lookup(self, base, quote, on):
+        entry = self._rates.get((base, quote))
+        if entry is not None:
+            i = bisect.bisect_right(entry[0], on) - 1
+            if i >= 0:
+                return entry[1][i]
+        entry = self._rates.get((quote, base))
+        if entry is not None:
+            i = bisect.bisect_right(entry[0], on) - 1
+            if i >= 0:
+                return ONE / entry[1][i]
+        return None
+
+    def rate(self, base, quote, on=None):
+        """Units of `quote` for one unit of `base`, effective on `on` (default today)."""
+        if base == quote:
+            return ONE
+        self.refresh()
+        on = on or datetime.date.today()
+        rate = self._lookup(base, quote, on)
+        if rate is None and self.base_currency not in (base, quote):
+            to_base = self._lookup(base, self.base_currency, on)
+            from_base = self._lookup(self.base_currency, quote, on)
+            if to_base is not None and from_base is not None:
+                rate = to_base * from_base
+        if rate is None:
+            raise FxError(f"No exchange rate for {base}/{quote} on {on.isoformat()}")
+        return rate
+
+    def convert(self, amount, from_currency, to_currency, on=None):
+        """`amount` in `to_currency`, computed in Decimal and rounded to its minor unit."""
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+        return quantize(amount * self.rate(from_currency, to_currency, on), to_currency)
+
+    def set_rates(self, rates):
+        """Insert or replace rates given as dicts (base_currency, quote_currency, rate, effective_date).
+
+        Commits the rates together with a new version, so every process
+        reloads its cache at its next version check.
+        """
+        for item in rates:
+            existing = FxRate.query.filter_by(base_currency=item['base_currency'],
+                                              quote_currency=item['quote_currency'],
+                                              effective_date=item['effective_date']).first()
+            if existing is None:
+                db.session.add(FxRate(**item))
+            else:
+                existing.rate = item['rate']
+        watermark = db.session.query(JobWatermark).filter_by(name=VERSION_KEY).with_for_update().first()
+        if watermark is None:
+            db.session.add(JobWatermark(name=VERSION_KEY, last_id=1))
+        else:
+            watermark.last_id += 1
+        db.session.commit()
+        self.refresh(force=True)
+
+
+def revalue(as_of=None, chunk_size=REVALUATION_CHUNK_SIZE):
+    """Revalue every foreign-currency balance into the base currency.
+
+    Accounts are read by primary key range, converted in memory at the
+    rates effective on `as_of`, and written back with one executemany
+    UPDATE per chunk (one commit per chunk). Returns per currency the
+    number of accounts, their base-currency value and the revaluation
+    gain or loss since the previous run.
+    """
+    as_of = as_of or datetime.date.today()
+    base = rate_cache.base_currency
+    rate_cache.refresh(force=True)
+    accounts = Account.__table__
+    update = (
+        accounts.update()
+        .where(accounts.c.id == bindparam('account_id'))
+        .values(base_balance=bindparam('value'), revalued_on=as_of)
+    )
+    totals = {}
+    missing = set()
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(accounts.c.id, accounts.c.currency, accounts.c.balance, accounts.c.base_balance)
+            .where(accounts.c.currency != base, accounts.c.id > last_id)
+            .order_by(accounts.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for account_id, currency, balance, previous in rows:
+            try:
+                rate = rate_cache.rate(currency, base, as_of)
+            except FxError:
+                missing.add(currency)
+                continue
+            value = quantize(balance.to_decimal() * rate, base)
+            total = totals.setdefault(currency, {'accounts': 0, 'base_value': Decimal(0), 'change': Decimal(0),
+                                                 'rate': float(rate)})
+            total['accounts'] += 1
+            total['base_value'] += value
+            total['change'] += value - (previous if previous is not None else value)
+            params.append({'account_id': account_id, 'value': value})
+        if params:
+            db.session.execute(update, params)
+        db.session.commit()
+        last_id = rows[-1].id
+        if len(rows) < chunk_size:
+            break
+    return {
+        'as_of': as_of.isoformat(),
+        'base_currency': base,
+        'currencies': {currency: {**total, 'base_value': float(total['base_value']), 'change': float(total['change'])}
+                       for currency, total in totals.items()},
+        'missing_rates': sorted(missing),
+    }
+
+
+rate_cache = RateCache()
@@ -0,0 +1,232 @@
+import datetime
+import functools
+import hashlib
+
+import click
+from flask import Response, current_app, jsonify, request
+from flask.cli import with_appcontext
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from models.IdempotencyKey import IdempotencyKey
+from services.entity_cache import LRUBackend, _MISSING
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 128
+PURGE_CHUNK_SIZE = 5000
+# Session.info flag set once the wrapped view has committed something
+_COMMITTED = 'idempotent_view_committed'
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_committed(session):
+    if _COMMITTED in session.info:
+        session.info[_COMMITTED] = True
+
+
+class IdempotencyStore:
+    """Stored responses of money-moving requests, keyed by the Idempotency-Key header.
+
+    Completed responses are immutable, so each process also keeps them in a
+    small LRU: a retry is normally answered from memory, otherwise from one
+    primary-key lookup. The database row is the source of truth and is what
+    makes concurrent retries in other processes safe. An in-progress row
+    is a lease: once it is older than `lease` seconds (its worker crashed),
+    a retry takes it over instead of getting 409s until the key expires.
+    """
+
+    def __init__(self):
+        self.ttl = 24 * 3600
+        self.lease = 120
+        self.front = LRUBackend(10000)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', self.ttl)
+        self.lease = app.config.get('IDEMPOTENCY_LEASE', self.lease)
+        self.front = LRUBackend(app.config.get('IDEMPOTENCY_CACHE_MAXSIZE', 10000))
+        app.cli.add_command(purge_idempotency_keys_command)
+
+    def lookup(self, key):
+        cached = self.front.get(key)
+        if cached is not _MISSING:
+            return cached
+        record = db.session.get(IdempotencyKey, key)
+        if record is None:
+            return None
+        if record.expires_at < datetime.datetime.utcnow():
+            return None
+        result = _as_result(record)
+        if result['status_code'] is not None:
+            self.front.set(key, result, self.ttl)
+        return result
+
+    def claim(self, key, endpoint, request_hash):
+        """Insert an in-progress row for `key`; False if another request got there first.
+
+        An in-progress row whose lease ran out is taken over with a
+        conditional UPDATE, so only one of several concurrent retries wins.
+        """
+        now = datetime.datetime.utcnow()
+        record = db.session.get(IdempotencyKey, key, populate_existing=True)
+        if record is not None and record.expires_at < now:
+            db.session.delete(record)
+            db.session.flush()
+        elif record is not None:
+            if record.status_code is not None or \
+                    record.claimed_at >= now - datetime.timedelta(seconds=self.lease):
+                return False
+            taken = (
+                db.session.query(IdempotencyKey)
+                .filter(IdempotencyKey.key == key,
+                        IdempotencyKey.status_code.is_(None),
+                        IdempotencyKey.claimed_at == record.claimed_at)
+                .update({IdempotencyKey.claimed_at: now}, synchronize_session=False)
+            )
+            db.session.commit()
+            return taken == 1
+        db.session.add(IdempotencyKey(key=key, endpoint=endpoint, request_hash=request_hash,
+                                      created_at=now, claimed_at=now,
+                                      expires_at=now + datetime.timedelta(seconds=self.ttl)))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def complete(self, key, response):
+        record = db.session.get(IdempotencyKey, key)
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        record.mimetype = response.mimetype
+        db.session.commit()
+        self.front.set(key, _as_result(record), self.ttl)
+
+    def release(self, key):
+        # The request failed before moving money: let the client retry with the same key
+        db.session.query(IdempotencyKey).filter_by(key=key, status_code=None).delete()
+        db.session.commit()
+
+    def purge_expired(self, chunk_size=PURGE_CHUNK_SIZE):
+        """Delete expired keys in chunks so the table lock is never held for long."""
+        now = datetime.datetime.utcnow()
+        deleted = 0
+        while True:
+            keys = [key for key, in db.session.query(IdempotencyKey.key)
+                    .filter(IdempotencyKey.expires_at < now)
+                    .limit(chunk_size)]
+            if not keys:
+                break
+            db.session.query(IdempotencyKey).filter(IdempotencyKey.key.in_(keys)) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(keys)
+        return deleted
+
+
+def _as_result(record):
+    return {
+        'endpoint': record.endpoint,
+        'request_hash': record.request_hash,
+        'status_code': record.status_code,
+        'response_body': record.response_body,
+        'mimetype': record.mimetype,
+    }
+
+
+def _scoped_key(key):
+    # A logged-in user's keys are their own. Anonymous keys are global, never
+    # per address: a retry from a new IP (NAT, mobile) must find its key, and
+    # another client's request with the same key fails the body check (422)
+    client = f'user:{current_user.id}' if current_user.is_authenticated else 'anonymous'
+    return hashlib.sha256(f'{client}\n{key}'.encode()).hexdigest()
+
+
+def _request_hash():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(result):
+    response = Response(result['response_body'], status=result['status_code'], mimetype=result['mimetype'])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _run(key, view, args, kwargs):
+    """Run the view for a claimed key and store or release the key."""
+    db.session.info[_COMMITTED] = False
+    try:
+        response = current_app.make_response(view(*args, **kwargs))
+    except Exception:
+        db.session.rollback()
+        committed = db.session.info.pop(_COMMITTED, False)
+        if committed:
+            idempotency_store.complete(key, current_app.make_response(
+                (jsonify({"error": "Internal server error"}), 500)))
+        else:
+            idempotency_store.release(key)
+        raise
+    # Drop anything an error path of the view left uncommitted
+    db.session.rollback()
+    committed = db.session.info.pop(_COMMITTED, False)
+    if response.status_code >= 500 and not committed:
+        idempotency_store.release(key)
+    else:
+        idempotency_store.complete(key, response)
+    return response
+
+
+def idempotent(view):
+    """Make a POST view safe to retry when the client sends an Idempotency-Key.
+
+    Keys are scoped to the logged-in user, or shared by anonymous callers,
+    whose requests are told apart by their body. The first request claims
+    the key, runs the view and stores its response; later requests with the
+    same key and body get that response back without running the view.
+    Reusing a key with a different body is a 422; a retry while the first
+    request is still running is a 409, until its lease runs out. A 5xx is
+    only forgotten when the view committed nothing, so the key can be
+    retried; once money moved, the error is stored like any other
+    response. Requests without the header run as before.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} is longer than {MAX_KEY_LENGTH} characters"}), 400
+
+        key = _scoped_key(key)
+        request_hash = _request_hash()
+        result = idempotency_store.lookup(key)
+        if result is not None and (result['endpoint'] != request.endpoint
+                                   or result['request_hash'] != request_hash):
+            return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+        if result is None or result['status_code'] is None:
+            if idempotency_store.claim(key, request.endpoint, request_hash):
+                return _run(key, view, args, kwargs)
+            result = idempotency_store.lookup(key)
+            if result is None or result['status_code'] is None:
+                return jsonify({"error": "Request with this Idempotency-Key is in progress"}), 409, {'Retry-After': '1'}
+            if result['endpoint'] != request.endpoint or result['request_hash'] != request_hash:
+                return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+        return _replay(result)
+    return wrapper
+
+
+@click.command('purge-idempotency-keys')
+@with_appcontext
+def purge_idempotency_keys_command():
+    """Delete idempotency keys past their expiry."""
+    click.echo(f"Deleted {idempotency_store.purge_expired()} expired idempotency keys")
+
+
+idempotency_store = IdempotencyStore()
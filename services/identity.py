@@ -0,0 +1,59 @@
+import time
+
+from flask import session
+from flask_login import UserMixin
+
+from models.User import User
+from services.entity_cache import EntityCache
+
+# Fields the templates and API need from current_user
+IDENTITY_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email_address', 'agency_id')
+SESSION_KEY = 'identity'
+
+# Per-process, bounded, short TTL; evicted when a users row is committed
+identity_cache = EntityCache(config_prefix='IDENTITY_CACHE')
+
+
+class SessionUser(UserMixin):
+    """Lightweight current_user built from a cached identity payload."""
+
+    def __init__(self, payload):
+        for field in IDENTITY_FIELDS:
+            setattr(self, field, payload.get(field))
+
+    def get_id(self):
+        return str(self.id)
+
+
+def identity_payload(user):
+    return {field: getattr(user, field) for field in IDENTITY_FIELDS}
+
+
+def remember(user):
+    """Store the identity in the signed session cookie after a login."""
+    payload = identity_payload(user)
+    session[SESSION_KEY] = dict(payload, issued_at=int(time.time()))
+    return SessionUser(payload)
+
+
+def forget():
+    session.pop(SESSION_KEY, None)
+
+
+def load_identity(user_id, session_max_age):
+    """user_loader: session payload first, then the identity cache, then the database."""
+    user_id = int(user_id)
+    payload = session.get(SESSION_KEY)
+    if (payload and payload.get('id') == user_id
+            and time.time() - payload.get('issued_at', 0) < session_max_age):
+        return SessionUser(payload)
+
+    def load():
+        user = User.query.get(user_id)
+        return identity_payload(user) if user else None
+
+    payload = identity_cache.get_or_load('identity', user_id, load)
+    if payload is None:
+        return None
+    session[SESSION_KEY] = dict(payload, issued_at=int(time.time()))
+    return SessionUser(payload)
@@ -0,0 +1,378 @@
+import csv
+import datetime
+import os
+import re
+import time
+from decimal import Decimal
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, String, Text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from services.money import Money, MoneyType
+
+BATCH_SIZE = 5000
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+# Not data: the schema version is managed by the migrations
+SKIPPED_TABLES = {'alembic_version'}
+# Columns renamed since the phpMyAdmin dump was taken: dump name -> model column
+LEGACY_COLUMNS = {
+    'agencies': {'agency_name': 'name', 'agency_address': 'location'},
+}
+
+_INSERT_RE = re.compile(r"\s*INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.I)
+_STRING = r"'(?:[^'\\]|\\.|'')*'"
+_VALUE = rf"{_STRING}|NULL|[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|0x[0-9A-Fa-f]+"
+# One complete row and the separator after it: ',' (more rows) or ';' (end of INSERT)
+_ROW_RE = re.compile(rf"\s*\(\s*((?:(?:{_VALUE})\s*,\s*)*(?:{_VALUE})?)\s*\)\s*([,;])", re.S | re.I)
+_VALUE_RE = re.compile(_VALUE, re.S | re.I)
+_ESCAPE_RE = re.compile(r"\\(.)|''", re.S)
+_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+
+class DumpImportError(Exception):
+    pass
+
+
+def _unescape(token):
+    body = token[1:-1]
+    if '\\' not in body and "''" not in body:
+        return body
+    return _ESCAPE_RE.sub(lambda m: "'" if m.group(1) is None else _ESCAPES.get(m.group(1), m.group(1)), body)
+
+
+def _parse_value(token):
+    if token[0] == "'":
+        return _unescape(token)
+    if token[0] in 'Nn':
+        return None
+    if token[:2] in ('0x', '0X'):
+        return bytes.fromhex(token[2:])
+    if '.' in token or 'e' in token or 'E' in token:
+        return Decimal(token)
+    return int(token)
+
+
+def iter_dump(lines):
+    """Yield (table, columns, values) for every row INSERTed by a SQL dump.
+
+    Made for mysqldump/phpMyAdmin output; other statements (CREATE TABLE,
+    ALTER TABLE, SET...) are skipped, the schema comes from the migrations.
+    A row is parsed as soon as the line holding its end has been read, so
+    memory stays flat whatever the size of the dump, and quoted values may
+    span lines.
+    """
+    lines = iter(lines)
+    for line in lines:
+        match = _INSERT_RE.match(line)
+        if not match:
+            continue
+        table = match.group(1)
+        columns = [name.strip().strip('`') for name in match.group(2).split(',')] if match.group(2) else None
+        buffer, pos = line[match.end():], 0
+        while True:
+            row = _ROW_RE.match(buffer, pos)
+            if row is None:
+                more = next(lines, None)
+                if more is None:
+                    raise DumpImportError(f"Unterminated INSERT INTO `{table}`")
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield table, columns, [_parse_value(token) for token in _VALUE_RE.findall(row.group(1))]
+            pos = row.end()
+            if row.group(2) == ';':
+                break
+
+
+def _converter(column_type):
+    """Function turning a dump/CSV value into what the column type binds."""
+    if isinstance(column_type, DateTime):
+        def convert(value):
+            if isinstance(value, str):
+                return None if value.startswith('0000-00-00') else datetime.datetime.fromisoformat(value)
+            return value
+    elif isinstance(column_type, Date):
+        def convert(value):
+            if isinstance(value, str):
+                return None if value.startswith('0000-00-00') else datetime.date.fromisoformat(value[:10])
+            return value
+    elif isinstance(column_type, Boolean):
+        def convert(value):
+            return bool(int(value)) if value is not None else None
+    elif isinstance(column_type, MoneyType):
+        def convert(value):
+            # Dumps and CSV files hold amounts in major units
+            return Money.of(value)
+    elif isinstance(column_type, Integer):
+        def convert(value):
+            return int(value) if value is not None else None
+    elif isinstance(column_type, Float):
+        def convert(value):
+            return float(value) if value is not None else None
+    elif isinstance(column_type, Numeric):
+        def convert(value):
+            return Decimal(str(value)) if value is not None and not isinstance(value, Decimal) else value
+    elif isinstance(column_type, (String, Text)):
+        def convert(value):
+            return str(value) if value is not None and not isinstance(value, str) else value
+    else:
+        def convert(value):
+            return value
+    return convert
+
+
+class _Progress:
+    """Counts rows and input characters and prints a line every PROGRESS_INTERVAL."""
+
+    def __init__(self, path):
+        self.total = os.path.getsize(path) or 1
+        self.read = 0
+        self.rows = 0
+        self.started = self.last = time.monotonic()
+
+    def lines(self, f):
+        for line in f:
+            self.read += len(line)
+            yield line
+
+    def tick(self, table, rows):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            click.echo(f"  {table}: {self.rows:,} rows, {self.rate():,.0f} rows/s, "
+                       f"{min(100, 100 * self.read // self.total)}% read")
+
+    def rate(self):
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+
+class Importer:
+    """Loads rows into the model tables in multi-row batches.
+
+    Rows go through Core executemany on one connection, which SQLite runs
+    as a prepared-statement loop and the MySQL drivers rewrite into
+    multi-row INSERTs. Non-unique indexes of each table are dropped before
+    its first batch and rebuilt once at the end (unique ones stay: they
+    are what rejects or skips duplicates), and the session is set up for
+    bulk loading (no fsync per commit on SQLite, no foreign key checks). Only the columns the models know are
+    kept; dump columns are matched by name, through LEGACY_COLUMNS.
+    """
+
+    def __init__(self, connection, batch_size=BATCH_SIZE, skip_duplicates=False, defer_indexes=True,
+                 tables=None, progress=None):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.batch_size = batch_size
+        self.skip_duplicates = skip_duplicates
+        self.defer_indexes = defer_indexes
+        self.tables = set(tables) if tables else None
+        self.progress = progress
+        self.plans = {}
+        self.batches = {}
+        self.counts = {}
+        self.dropped_indexes = []
+        self.restore = []
+        self.warnings = []
+
+    def __enter__(self):
+        if self.dialect == 'sqlite':
+            synchronous = self.connection.exec_driver_sql('PRAGMA synchronous').scalar()
+            foreign_keys = self.connection.exec_driver_sql('PRAGMA foreign_keys').scalar()
+            self.connection.exec_driver_sql('PRAGMA synchronous = OFF')
+            self.connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+            self.restore = [f'PRAGMA synchronous = {synchronous}', f'PRAGMA foreign_keys = {foreign_keys}']
+        elif self.dialect in ('mysql', 'mariadb'):
+            # unique_checks stays on: InnoDB would let duplicate keys through
+            self.connection.exec_driver_sql('SET foreign_key_checks = 0')
+            self.restore = ['SET foreign_key_checks = 1']
+        self.connection.commit()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.connection.rollback()
+        try:
+            self._create_indexes()
+        finally:
+            for statement in self.restore:
+                self.connection.exec_driver_sql(statement)
+            self.connection.commit()
+
+    def _plan(self, name, columns):
+        table = db.metadata.tables.get(name)
+        if table is None or name in SKIPPED_TABLES:
+            self.warnings.append(f"{name}: no such model table, rows skipped")
+            return None
+        if columns is None:
+            columns = [column.name for column in table.columns]
+        renames = LEGACY_COLUMNS.get(name, {})
+        targets = []
+        for position, column in enumerate(columns):
+            target = renames.get(column, column)
+            if target in table.c:
+                targets.append((position, target, _converter(table.c[target].type)))
+            else:
+                self.warnings.append(f"{name}.{column}: no such column, values dropped")
+        statement = table.insert()
+        if self.skip_duplicates:
+            if self.dialect == 'sqlite':
+                statement = statement.prefix_with('OR IGNORE')
+            elif self.dialect in ('mysql', 'mariadb'):
+                statement = statement.prefix_with('IGNORE')
+            elif self.dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+                statement = insert(table).on_conflict_do_nothing()
+        if self.defer_indexes:
+            self._drop_indexes(table)
+        return table, len(columns), targets, statement
+
+    def _drop_indexes(self, table):
+        # MySQL refuses to drop the index backing a foreign key
+        fk_columns = {fk.parent.name for fk in table.foreign_keys} if self.dialect in ('mysql', 'mariadb') else set()
+        for index in table.indexes:
+            if index.unique or index in self.dropped_indexes:
+                continue
+            if next(iter(index.columns)).name in fk_columns:
+                continue
+            index.drop(self.connection, checkfirst=True)
+            self.dropped_indexes.append(index)
+        self.connection.commit()
+
+    def _create_indexes(self):
+        while self.dropped_indexes:
+            index = self.dropped_indexes.pop()
+            started = time.monotonic()
+            index.create(self.connection, checkfirst=True)
+            self.connection.commit()
+            click.echo(f"  rebuilt index {index.name} in {time.monotonic() - started:.1f}s")
+
+    def add(self, name, columns, values):
+        key = (name, tuple(columns) if columns else None)
+        plan = self.plans.get(key, False)
+        if plan is False:
+            plan = self.plans[key] = self._plan(name, columns) if self.tables is None or name in self.tables else None
+        if plan is None:
+            return
+        table, width, targets, statement = plan
+        if len(values) != width:
+            raise DumpImportError(f"{name}: row has {len(values)} values, expected {width}")
+        row = {}
+        for position, target, convert in targets:
+            row[target] = convert(values[position])
+        batch = self.batches.setdefault(key, [])
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+            self._flush(key)
+
+    def _flush(self, key):
+        batch = self.batches.pop(key, None)
+        if not batch:
+            return
+        table, _, _, statement = self.plans[key]
+        result = self.connection.execute(statement, batch)
+        self.connection.commit()
+        # Rows actually written: skipped duplicates are not counted
+        written = result.rowcount if result.rowcount >= 0 else len(batch)
+        self.counts[table.name] = self.counts.get(table.name, 0) + written
+        if self.progress:
+            self.progress.tick(table.name, len(batch))
+
+    def flush(self):
+        for key in list(self.batches):
+            self._flush(key)
+
+
+def import_dump(path, **options):
+    """Load the INSERTs of a SQL dump; returns rows written per table."""
+    progress = _Progress(path)
+    with db.engine.connect() as connection, Importer(connection, progress=progress, **options) as importer:
+        with open(path, encoding='utf-8', newline='') as f:
+            for name, columns, values in iter_dump(progress.lines(f)):
+                importer.add(name, columns, values)
+        importer.flush()
+    return importer
+
+
+def import_csv(table, path, delimiter=',', **options):
+    """Load a CSV file whose header row names the columns; empty fields are NULL."""
+    progress = _Progress(path)
+    with db.engine.connect() as connection, Importer(connection, progress=progress, **options) as importer:
+        with open(path, encoding='utf-8', newline='') as f:
+            reader = csv.reader(progress.lines(f), delimiter=delimiter)
+            columns = [name.strip() for name in next(reader, [])]
+            if not columns:
+                raise DumpImportError(f"{path}: empty file")
+            for values in reader:
+                if values:
+                    importer.add(table, columns, [value if value != '' else None for value in values])
+        importer.flush()
+    return importer
+
+
+def _report(importer, started):
+    for warning in dict.fromkeys(importer.warnings):
+        click.echo(f"  warning: {warning}")
+    total = sum(importer.counts.values())
+    for name, count in importer.counts.items():
+        click.echo(f"{name}: {count:,} rows")
+    elapsed = time.monotonic() - started
+    click.echo(f"Imported {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    if 'accounts' in importer.counts or 'loans' in importer.counts:
+        click.echo("Run `flask agencies backfill-stats` to rebuild the agency rollups.")
+
+
+def _load_options(func):
+    func = click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+                        help='Rows per INSERT batch (and per commit).')(func)
+    func = click.option('--skip-duplicates', is_flag=True,
+                        help='Skip rows whose primary or unique key already exists.')(func)
+    func = click.option('--keep-indexes', is_flag=True,
+                        help='Maintain secondary indexes during the load instead of rebuilding them after.')(func)
+    return func
+
+
+import_cli = AppGroup('import', help='Bulk import of SQL dumps and CSV files.')
+
+
+@import_cli.command('dump')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--table', 'tables', multiple=True, help='Only import this table (repeatable).')
+@_load_options
+def import_dump_command(path, tables, batch_size, skip_duplicates, keep_indexes):
+    """Import the rows of a phpMyAdmin/mysqldump SQL file."""
+    started = time.monotonic()
+    try:
+        importer = import_dump(path, batch_size=batch_size, skip_duplicates=skip_duplicates,
+                               defer_indexes=not keep_indexes, tables=tables)
+    except DumpImportError as e:
+        raise click.ClickException(str(e))
+    except IntegrityError as e:
+        raise click.ClickException(f"{e.orig} (use --skip-duplicates to skip existing rows)")
+    _report(importer, started)
+
+
+@import_cli.command('csv')
+@click.argument('table')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--delimiter', default=',', show_default=True)
+@_load_options
+def import_csv_command(table, path, delimiter, batch_size, skip_duplicates, keep_indexes):
+    """Import a CSV file (header row = column names) into TABLE."""
+    if table not in db.metadata.tables:
+        raise click.ClickException(f"Unknown table {table}")
+    started = time.monotonic()
+    try:
+        importer = import_csv(table, path, delimiter=delimiter, batch_size=batch_size,
+                              skip_duplicates=skip_duplicates, defer_indexes=not keep_indexes)
+    except DumpImportError as e:
+        raise click.ClickException(str(e))
+    except IntegrityError as e:
+        raise click.ClickException(f"{e.orig} (use --skip-duplicates to skip existing rows)")
+    _report(importer, started)
+
+
+def init_app(app):
+    app.cli.add_command(import_cli)
@@ -0,0 +1,27 @@
+import functools
+import hmac
+
+from flask import current_app, jsonify, request
+
+HEADER = 'Authorization'
+SCHEME = 'Bearer '
+
+
+def internal_only(view):
+    """Restrict a view to monitoring: `Authorization: Bearer <INTERNAL_API_TOKEN>`.
+
+    Pool, cache and engine statistics and request profiles expose traffic
+    and internals, so without INTERNAL_API_TOKEN configured these routes
+    are not served at all (404); a missing or wrong token is a 401.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('INTERNAL_API_TOKEN')
+        if not token:
+            return jsonify({"error": "Not found"}), 404
+        supplied = request.headers.get(HEADER, '')
+        if not (supplied.startswith(SCHEME)
+                and hmac.compare_digest(supplied[len(SCHEME):].encode(), token.encode())):
+            return jsonify({"error": "Authentication required"}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,154 @@
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import func, tuple_
+
+from app import db
+from models.LedgerEntry import LedgerEntry
+from services.money import Money
+
+ACCOUNT = 'account'
+CARD = 'card'
+LOAN = 'loan'
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, Money):
+        return value.to_decimal()
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _to_date(value):
+    if value is None:
+        return datetime.date.today()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def last_entry(kind, account_id):
+    return (
+        LedgerEntry.query
+        .filter_by(account_kind=kind, account_id=account_id)
+        .order_by(LedgerEntry.seq.desc())
+        .first()
+    )
+
+
+def post(kind, account_id, entry_type, amount, opening_balance, date=None, transaction=None, counterparty=None):
+    """Append one entry to an account's ledger (added to the session, not committed).
+
+    The caller must hold a row lock on the owning account/card/loan so that
+    sequence numbers stay gap-free. `opening_balance` is only used for the
+    first entry of an account that predates the ledger; `counterparty` is
+    the other account of a transfer.
+    """
+    amount = _to_decimal(amount)
+    last = last_entry(kind, account_id)
+    if last is not None:
+        seq = last.seq + 1
+        running = last.balance_after
+    else:
+        seq = 1
+        running = _to_decimal(opening_balance or 0)
+    entry = LedgerEntry(
+        account_kind=kind,
+        account_id=account_id,
+        seq=seq,
+        entry_type=entry_type,
+        amount=amount,
+        balance_after=running + amount,
+        entry_date=_to_date(date),
+        transaction=transaction,
+        counterparty_id=counterparty
+    )
+    db.session.add(entry)
+    return entry
+
+
+def post_many(kind, postings, opening_balances):
+    """Append entries for many accounts at once, for batch write paths.
+
+    `postings` is a list of (account_id, entry_type, amount, date), with
+    an optional fifth item for the transfer counterparty, in application
+    order; `opening_balances` maps account_id to its balance before the
+    batch. The last entry of every account is read in one query and the
+    new rows are inserted with a single executemany.
+    """
+    account_ids = {posting[0] for posting in postings}
+    if not account_ids:
+        return
+    latest = (
+        db.session.query(LedgerEntry.account_id, func.max(LedgerEntry.seq))
+        .filter(LedgerEntry.account_kind == kind, LedgerEntry.account_id.in_(account_ids))
+        .group_by(LedgerEntry.account_id)
+        .all()
+    )
+    state = {}
+    if latest:
+        rows = (
+            db.session.query(LedgerEntry.account_id, LedgerEntry.seq, LedgerEntry.balance_after)
+            .filter(LedgerEntry.account_kind == kind,
+                    tuple_(LedgerEntry.account_id, LedgerEntry.seq).in_(latest))
+            .all()
+        )
+        state = {account_id: (seq, balance) for account_id, seq, balance in rows}
+
+    entries = []
+    for account_id, entry_type, amount, date, *counterparty in postings:
+        seq, running = state.get(account_id, (0, _to_decimal(opening_balances.get(account_id) or 0)))
+        amount = _to_decimal(amount)
+        seq += 1
+        running += amount
+        state[account_id] = (seq, running)
+        entries.append({
+            'account_kind': kind,
+            'account_id': account_id,
+            'seq': seq,
+            'entry_type': entry_type,
+            'amount': amount,
+            'balance_after': running,
+            'entry_date': _to_date(date),
+            'counterparty_id': counterparty[0] if counterparty else None,
+            'created_at': datetime.datetime.utcnow(),
+        })
+    db.session.execute(LedgerEntry.__table__.insert(), entries)
+
+
+def statement(kind, account_id, after_seq=0, limit=100):
+    return (
+        LedgerEntry.query
+        .filter(LedgerEntry.account_kind == kind,
+                LedgerEntry.account_id == account_id,
+                LedgerEntry.seq > after_seq)
+        .order_by(LedgerEntry.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def opening_balance(kind, account_id):
+    """Balance before the account's first entry, None if it has none."""
+    first = LedgerEntry.query.filter_by(account_kind=kind, account_id=account_id, seq=1).first()
+    return first.balance_after - first.amount if first is not None else None
+
+
+def balance_at(kind, account_id, date):
+    """Balance at the end of `date`, None if no entry is dated on or before it.
+
+    Entries are summed by entry_date on top of the opening balance: seq is
+    the posting order, so with back-dated postings the balance_after of the
+    latest entry on or before `date` can include later-dated ones.
+    """
+    total, count = (
+        db.session.query(func.sum(LedgerEntry.amount), func.count(LedgerEntry.id))
+        .filter(LedgerEntry.account_kind == kind,
+                LedgerEntry.account_id == account_id,
+                LedgerEntry.entry_date <= _to_date(date))
+        .one()
+    )
+    if not count:
+        return None
+    return _to_decimal(opening_balance(kind, account_id)) + _to_decimal(total)
@@ -0,0 +1,133 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields included."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let the first `burst` records of a kind through per window, then 1 in `rate`.
+
+    Records are grouped by their `sample_key` extra, or by their message
+    template. Kept records carry `sampled_out`, the number dropped since the
+    previous one of the same kind. At most `max_keys` kinds are tracked:
+    counters whose window is over are evicted first, then the least
+    recently seen, so messages with variable text cannot grow it forever.
+    """
+
+    def __init__(self, burst=10, rate=100, window=60, max_keys=10000):
+        super().__init__()
+        self.burst = burst
+        self.rate = rate
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counters = OrderedDict()
+
+    def filter(self, record):
+        if record.levelno >= logging.CRITICAL:
+            return True
+        key = getattr(record, 'sample_key', None) or (record.name, record.levelno, str(record.msg)[:200])
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                self._evict(now)
+                counter = (now, 0, 0)
+            else:
+                self._counters.move_to_end(key)
+            window_start, seen, dropped = counter
+            if now - window_start >= self.window:
+                window_start, seen = now, 0
+            seen += 1
+            keep = seen <= self.burst or seen % self.rate == 0
+            self._counters[key] = (window_start, seen, 0 if keep else dropped + 1)
+        if keep and dropped:
+            record.sampled_out = dropped
+        return keep
+
+    def _evict(self, now):
+        # Least recently seen first: expired windows are at the front
+        while self._counters:
+            key, (window_start, _, _) = next(iter(self._counters.items()))
+            if now - window_start < self.window and len(self._counters) < self.max_keys:
+                break
+            del self._counters[key]
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the request thread: when full, it drops."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Same-process listener: hand over the raw record, so the message and
+        # traceback are formatted in the listener thread and `exc` is kept
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(app):
+    """Send app.logger through a bounded queue to a background file writer.
+
+    The request thread only samples and enqueues the record; the listener
+    thread does the JSON formatting and disk I/O, so a slow disk or a burst
+    of errors cannot add latency to requests.
+    """
+    log_queue = queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+
+    file_handler = RotatingFileHandler(
+        app.config['LOG_FILE'],
+        maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT']
+    )
+    file_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.setLevel(app.config['LOG_LEVEL'])
+    queue_handler.addFilter(SamplingFilter(
+        burst=app.config['LOG_SAMPLE_BURST'],
+        rate=app.config['LOG_SAMPLE_RATE'],
+        window=app.config['LOG_SAMPLE_WINDOW'],
+        max_keys=app.config['LOG_SAMPLE_MAX_KEYS']
+    ))
+    # Flask's stderr handler writes synchronously from the request thread
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,136 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+# Money columns hold hundredths, the precision of the ledger's Numeric(15, 2)
+SCALE = 100
+DIGITS = 2
+_ONE = Decimal(1)
+
+
+def to_minor(value):
+    """Hundredths in `value` (int, float, str or Decimal in major units), banker's rounding."""
+    if isinstance(value, Money):
+        return value.minor
+    if isinstance(value, bool):
+        raise TypeError("Not an amount: bool")
+    if isinstance(value, int):
+        return value * SCALE
+    if isinstance(value, float):
+        # Amounts with at most 2 decimals (nearly all JSON input) round-trip
+        # exactly through one multiplication; anything else goes via Decimal
+        minor = round(value * SCALE)
+        if minor / SCALE == value:
+            return minor
+        value = repr(value)
+    if not isinstance(value, Decimal):
+        value = Decimal(value)
+    return int(value.scaleb(DIGITS).quantize(_ONE, rounding=ROUND_HALF_EVEN))
+
+
+class Money:
+    """An amount as an integer number of hundredths.
+
+    Immutable and a single int wide: adding, subtracting and comparing two
+    amounts is integer arithmetic, with neither the float rounding drift
+    of the old Float columns nor a Decimal context. Plain numbers mixed in
+    are read as major units (12.5 is 1250 hundredths). str() and format()
+    give the exact decimal value, float() the nearest float for JSON.
+    """
+
+    __slots__ = ('minor',)
+
+    def __init__(self, minor=0):
+        self.minor = minor
+
+    @classmethod
+    def of(cls, value):
+        if value is None or isinstance(value, cls):
+            return value
+        return cls(to_minor(value))
+
+    def to_decimal(self):
+        return Decimal(self.minor).scaleb(-DIGITS)
+
+    def __add__(self, other):
+        return Money(self.minor + (other.minor if type(other) is Money else to_minor(other)))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(self.minor - (other.minor if type(other) is Money else to_minor(other)))
+
+    def __rsub__(self, other):
+        return Money(to_minor(other) - self.minor)
+
+    def __neg__(self):
+        return Money(-self.minor)
+
+    def __abs__(self):
+        return Money(abs(self.minor))
+
+    def __eq__(self, other):
+        if type(other) is Money:
+            return self.minor == other.minor
+        try:
+            return self.minor == to_minor(other)
+        except (TypeError, ArithmeticError, ValueError):
+            return NotImplemented
+
+    def __lt__(self, other):
+        return self.minor < (other.minor if type(other) is Money else to_minor(other))
+
+    def __le__(self, other):
+        return self.minor <= (other.minor if type(other) is Money else to_minor(other))
+
+    def __gt__(self, other):
+        return self.minor > (other.minor if type(other) is Money else to_minor(other))
+
+    def __ge__(self, other):
+        return self.minor >= (other.minor if type(other) is Money else to_minor(other))
+
+    def __hash__(self):
+        return hash(self.minor)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __float__(self):
+        return self.minor / SCALE
+
+    def __str__(self):
+        units, cents = divmod(abs(self.minor), SCALE)
+        return f"{'-' if self.minor < 0 else ''}{units}.{cents:02d}"
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec) if spec else str(self)
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+
+class MoneyType(TypeDecorator):
+    """BIGINT column of hundredths, read and written as Money.
+
+    Binds accept Money or any number in major units, so literals and
+    bindparams compared with or added to a money column convert the same way.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return value.minor if type(value) is Money else to_minor(value)
+
+    def process_result_value(self, value, dialect):
+        return Money(int(value)) if value is not None else None
+
+    def coerce_compared_value(self, op, value):
+        return self
+
+    @property
+    def python_type(self):
+        return Money
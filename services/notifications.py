@@ -0,0 +1,33 @@
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+
+def send_email(to, subject, body, reply_to=None):
+    """Send a plain-text email through MAIL_SERVER.
+
+    Without MAIL_SERVER (development, tests) the message is only logged.
+    SMTP errors propagate so that the calling task can retry.
+    """
+    config = current_app.config
+    if not config.get('MAIL_SERVER'):
+        current_app.logger.info("Email not sent (MAIL_SERVER unset)",
+                                extra={'to': to, 'subject': subject})
+        return False
+
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as smtp:
+        if config.get('MAIL_USE_TLS'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME'):
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+    return True
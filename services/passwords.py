@@ -0,0 +1,119 @@
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from werkzeug.security import check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when too many hash operations are already queued."""
+
+
+def _prepare(password):
+    # bcrypt only reads the first 72 bytes: pre-hash so long passwords keep all their entropy
+    digest = hashlib.sha256(password.encode('utf-8')).digest()
+    return base64.b64encode(digest)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(_prepare(password), bcrypt.gensalt(rounds)).decode('ascii')
+
+
+def _verify(password, password_hash):
+    return bcrypt.checkpw(_prepare(password), password_hash.encode('ascii'))
+
+
+def _is_bcrypt(password_hash):
+    return password_hash.startswith(('$2a$', '$2b$', '$2y$'))
+
+
+def _rounds_of(password_hash):
+    return int(password_hash.split('$')[2])
+
+
+class PasswordHasher:
+    """bcrypt hashing run in a bounded process pool.
+
+    Hashing is CPU-bound and holds the GIL, so it runs in worker processes;
+    at most `max_pending` operations may be queued, beyond that callers get
+    HashingBusy straight away instead of waiting behind the queue.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 0
+        self.max_pending = 0
+        self._executor = None
+        self._slots = None
+        self._executor_lock = threading.Lock()
+        self._dummy_hash = None
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 4)
+        self._slots = threading.BoundedSemaphore(self.max_pending) if self.max_pending else None
+        self._dummy_hash = None
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _run(self, func, *args):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many password operations in progress")
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._pool().submit(func, *args).result()
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password_hash, password):
+        """Check a password; return (ok, new_hash).
+
+        new_hash is set when the stored hash is a legacy werkzeug hash or uses
+        a different work factor, and should replace the stored one.
+        """
+        if not password_hash or password is None:
+            return False, None
+        if _is_bcrypt(password_hash):
+            ok = self._run(_verify, password, password_hash)
+            if ok and _rounds_of(password_hash) != self.rounds:
+                return True, self.hash(password)
+            return ok, None
+        # Hashes created before bcrypt (werkzeug scrypt/pbkdf2)
+        if self._run(check_password_hash, password_hash, password):
+            return True, self.hash(password)
+        return False, None
+
+    def reject(self, password):
+        """Fail a login for an unknown user after the same work as verify().
+
+        The password is checked against a throwaway hash at the current cost,
+        so a miss takes as long as a wrong password for a real account.
+        """
+        if password is None:
+            return False
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(base64.b64encode(os.urandom(18)).decode('ascii'))
+        self._run(_verify, password, self._dummy_hash)
+        return False
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that measures how long checkouts wait for a connection.
+
+    Set as `poolclass` in SQLALCHEMY_ENGINE_OPTIONS. A checkout counts as a
+    wait when no idle connection was available and the pool was already at
+    pool_size + max_overflow, which is what tells pool exhaustion apart from
+    a slow database.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'total_checkout_ms': 0.0,
+            'max_checkout_ms': 0.0,
+        }
+
+    def _do_get(self):
+        # No idle connection and no room to open one: this checkout will queue
+        exhausted = self.checkedin() == 0 and self._max_overflow > -1 and self.overflow() >= self._max_overflow
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with self._stats_lock:
+                self._stats['timeouts'] += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self._stats['checkouts'] += 1
+                self._stats['waits'] += int(exhausted)
+                self._stats['total_checkout_ms'] += elapsed_ms
+                self._stats['max_checkout_ms'] = max(self._stats['max_checkout_ms'], elapsed_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['avg_checkout_ms'] = stats['total_checkout_ms'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {
+        'pool_class': type(pool).__name__,
+        'status': pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.stats())
+    return stats
@@ -0,0 +1,256 @@
+import bisect
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from services.fast_json import FastJSONProvider
+
+# Upper bounds of the histogram buckets, in milliseconds (or queries for 'queries')
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+METRICS = {
+    'wall_ms': MS_BUCKETS,
+    'db_ms': MS_BUCKETS,
+    'json_ms': MS_BUCKETS,
+    'queries': QUERY_BUCKETS,
+}
+PROFILE_HEADER = 'X-Profile'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style (the last bucket is +Inf)."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        buckets = {}
+        running = 0
+        for bound, count in zip(list(self.bounds) + ['+Inf'], self.counts):
+            running += count
+            buckets[str(bound)] = running
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': buckets}
+
+
+class RequestMetrics:
+    """Per-endpoint histograms of wall time, DB time, query count and JSON time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, endpoint, values):
+        with self._lock:
+            histograms = self._histograms.get(endpoint)
+            if histograms is None:
+                histograms = {name: Histogram(bounds) for name, bounds in METRICS.items()}
+                self._histograms[endpoint] = histograms
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: {name: h.to_dict() for name, h in histograms.items()}
+                    for endpoint, histograms in self._histograms.items()}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name in METRICS:
+            lines.append(f'# TYPE request_{name} histogram')
+            for endpoint, histograms in snapshot.items():
+                data = histograms[name]
+                for bound, count in data['buckets'].items():
+                    lines.append(f'request_{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'request_{name}_sum{{endpoint="{endpoint}"}} {data["sum"]}')
+                lines.append(f'request_{name}_count{{endpoint="{endpoint}"}} {data["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """Adds the time spent encoding JSON to the current request's totals."""
+
+    def encode(self, obj):
+        start = time.perf_counter()
+        try:
+            return super().encode(obj)
+        finally:
+            _add_json_time(start)
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            _add_json_time(start)
+
+
+def _add_json_time(start):
+    current = _current()
+    if current is not None:
+        current['json_ms'] += (time.perf_counter() - start) * 1000
+
+
+def _current():
+    if has_request_context():
+        return g.get('_profiling')
+    return None
+
+
+# Registered once on the Engine class, so every engine (primary and replica
+# binds) is counted; outside an instrumented request they do nothing.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('_profiling_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    starts = conn.info.get('_profiling_start')
+    if current is None or not starts:
+        return
+    current['db_ms'] += (time.perf_counter() - starts.pop()) * 1000
+    current['queries'] += 1
+    statements = current['statements']
+    if statements is not None:
+        statements[statement] = statements.get(statement, 0) + 1
+
+
+class Profiler:
+    """Opt-in request instrumentation (PROFILING_ENABLED).
+
+    Every request feeds the per-endpoint histograms. A request is also deep
+    profiled under cProfile, with each SQL statement counted, when it sends
+    the X-Profile header with PROFILING_TOKEN, or at random with probability
+    PROFILING_SAMPLE_RATE. Statements run PROFILING_N_PLUS_ONE times or more
+    in one request are reported as likely N+1 lazy loads.
+    """
+
+    def __init__(self):
+        self.metrics = RequestMetrics()
+        self.reports = deque(maxlen=50)
+        # cProfile can only run one profile at a time in a process
+        self._profile_lock = threading.Lock()
+        self.app = None
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        self.app = app
+        self.reports = deque(maxlen=app.config['PROFILING_KEEP_REPORTS'])
+        app.json = TimedJSONProvider(app)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abandon)
+
+    def _wants_deep_profile(self):
+        token = self.app.config.get('PROFILING_TOKEN')
+        if token and request.headers.get(PROFILE_HEADER) == token:
+            return True
+        rate = self.app.config.get('PROFILING_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def _start(self):
+        current = {'start': time.perf_counter(), 'db_ms': 0.0, 'json_ms': 0.0, 'queries': 0,
+                   'statements': None, 'profile': None}
+        if self._wants_deep_profile() and self._profile_lock.acquire(blocking=False):
+            current['statements'] = {}
+            current['profile'] = cProfile.Profile()
+            current['profile'].enable()
+        g._profiling = current
+
+    def _finish(self, response):
+        current = g.pop('_profiling', None)
+        if current is None:
+            return response
+        profile = current['profile']
+        if profile is not None:
+            profile.disable()
+            self._profile_lock.release()
+        wall_ms = (time.perf_counter() - current['start']) * 1000
+        endpoint = request.endpoint or '<unmatched>'
+        self.metrics.observe(endpoint, {
+            'wall_ms': wall_ms,
+            'db_ms': current['db_ms'],
+            'json_ms': current['json_ms'],
+            'queries': current['queries'],
+        })
+        response.headers['Server-Timing'] = (
+            f"app;dur={wall_ms:.1f}, db;dur={current['db_ms']:.1f}, json;dur={current['json_ms']:.1f}"
+        )
+        response.headers['X-Query-Count'] = str(current['queries'])
+        if profile is not None:
+            report = self._report(endpoint, wall_ms, current, profile)
+            self.reports.append(report)
+            response.headers['X-Profile-Id'] = report['id']
+            if report['repeated_statements']:
+                self.app.logger.warning("Possible N+1 queries", extra={
+                    'endpoint': endpoint,
+                    'path': request.path,
+                    'repeated_statements': report['repeated_statements'],
+                })
+        return response
+
+    def _abandon(self, exc=None):
+        # after_request did not run (error while finishing the response):
+        # make sure the profiler is switched off and the lock released
+        current = g.pop('_profiling', None)
+        if current is not None and current['profile'] is not None:
+            current['profile'].disable()
+            self._profile_lock.release()
+
+    def _report(self, endpoint, wall_ms, current, profile):
+        threshold = self.app.config['PROFILING_N_PLUS_ONE']
+        repeated = sorted(
+            ({'statement': statement, 'count': count}
+             for statement, count in current['statements'].items() if count >= threshold),
+            key=lambda item: -item['count']
+        )
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(self.app.config['PROFILING_TOP_FUNCTIONS'])
+        return {
+            'id': f'{int(time.time() * 1000):x}-{random.getrandbits(24):06x}',
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'wall_ms': round(wall_ms, 3),
+            'db_ms': round(current['db_ms'], 3),
+            'json_ms': round(current['json_ms'], 3),
+            'queries': current['queries'],
+            'distinct_statements': len(current['statements']),
+            'repeated_statements': repeated,
+            'profile': out.getvalue(),
+        }
+
+    def get_report(self, report_id):
+        for report in self.reports:
+            if report['id'] == report_id:
+                return report
+        return None
+
+
+profiler = Profiler()
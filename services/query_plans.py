@@ -0,0 +1,156 @@
+import json
+import sys
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from app import db
+from models.User import User
+from models.Account import Account
+from models.Agency import Agency
+from models.Loan import Loan
+from models.Repayment import Repayment
+from models.Card import Card
+from models.Credit import Credit
+from models.LedgerEntry import LedgerEntry
+from services import ledger, statements
+
+CHECKED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+class QueryRecorder:
+    """Records every distinct SELECT/UPDATE/DELETE an engine executes.
+
+    With `path` set, each new statement is also appended to that file as
+    NDJSON, so a dev server or benchmark run can be checked afterwards.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.statements = {}
+        self._engine = None
+
+    def start(self, engine):
+        self._engine = engine
+        event.listen(engine, 'before_cursor_execute', self._record)
+        return self
+
+    def stop(self):
+        if self._engine is not None:
+            event.remove(self._engine, 'before_cursor_execute', self._record)
+            self._engine = None
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(CHECKED_STATEMENTS):
+            return
+        if statement in self.statements:
+            return
+        if executemany and parameters:
+            parameters = parameters[0]
+        self.statements[statement] = parameters
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'statement': statement, 'parameters': parameters}, default=str))
+                f.write('\n')
+
+
+def load_recorded(path):
+    recorded = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                params = item['parameters']
+                recorded[item['statement']] = tuple(params) if isinstance(params, list) else params
+    return recorded
+
+
+def full_scans(connection, statement, parameters):
+    """Return the plan lines of `statement` that read a whole table."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        # detail is e.g. "SCAN accounts" or "SEARCH accounts USING INDEX ..."
+        return [row[-1] for row in rows
+                if row[-1].startswith('SCAN') and 'CONSTANT ROW' not in row[-1]]
+    if dialect == 'mysql':
+        result = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        keys = list(result.keys())
+        scans = []
+        for row in result.fetchall():
+            row = dict(zip(keys, row))
+            if row.get('type') == 'ALL':
+                scans.append(f"full scan on {row.get('table')}")
+        return scans
+    raise click.ClickException(f"EXPLAIN is not supported for dialect {dialect}")
+
+
+def run_hot_queries():
+    """Issue the lookups the routes perform, with placeholder keys."""
+    session = db.session
+    session.expunge_all()
+    session.get(User, 1)
+    User.query.filter_by(email_address='someone@example.com').first()
+    session.get(Account, 1)
+    session.get(Agency, 1)
+    session.get(Loan, 1)
+    session.get(Repayment, 1)
+    session.get(Card, 1)
+    Account.query.filter(Account.id.in_([1, 2])).order_by(Account.id).all()
+    Account.query.filter_by(customer_id=1).all()
+    Loan.query.filter_by(client_id=1).all()
+    Repayment.query.filter_by(loan_id=1).all()
+    Card.query.filter_by(customer_id=1).all()
+    Credit.query.filter_by(card_id=1).all()
+    statements.accounts_page(user_id=1, cursor=statements.encode_cursor(1))
+    statements.transactions_page(1, cursor=statements.encode_cursor('2024-01-01', 1))
+    ledger.last_entry(ledger.ACCOUNT, 1)
+    ledger.statement(ledger.ACCOUNT, 1, after_seq=1)
+    session.query(LedgerEntry).filter_by(account_kind=ledger.LOAN, account_id=1).count()
+    session.rollback()
+
+
+def check(statements_to_check):
+    failures = {}
+    with db.engine.connect() as connection:
+        for statement, parameters in statements_to_check.items():
+            scans = full_scans(connection, statement, parameters)
+            if scans:
+                failures[statement] = scans
+    return failures
+
+
+@click.command('check-query-plans')
+@click.option('--recorded', type=click.Path(exists=True),
+              help='NDJSON file written by a run with QUERY_PLAN_LOG set.')
+@click.option('--create-all', is_flag=True, help='Create missing tables first (empty SQLite files).')
+@with_appcontext
+def check_query_plans_command(recorded, create_all):
+    """EXPLAIN every hot query and fail if any of them scans a whole table."""
+    if create_all:
+        db.create_all()
+    recorder = QueryRecorder().start(db.engine)
+    try:
+        run_hot_queries()
+    finally:
+        recorder.stop()
+    to_check = dict(recorder.statements)
+    if recorded:
+        to_check.update(load_recorded(recorded))
+
+    failures = check(to_check)
+    click.echo(f"{len(to_check)} statements checked on {db.engine.dialect.name}, "
+               f"{len(failures)} with full scans")
+    for statement, scans in failures.items():
+        click.echo(f"\n{statement}\n  -> " + '\n  -> '.join(scans))
+    if failures:
+        sys.exit(1)
+
+
+def init_app(app):
+    app.cli.add_command(check_query_plans_command)
+    log_path = app.config.get('QUERY_PLAN_LOG')
+    if log_path:
+        with app.app_context():
+            QueryRecorder(log_path).start(db.engine)
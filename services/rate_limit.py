@@ -0,0 +1,266 @@
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+# Buckets kept per shard before idle (full again) ones are swept
+SHARD_MAX_BUCKETS = 10000
+
+
+class Limit:
+    """`count` requests per `period` seconds, in bursts of at most `burst`."""
+
+    __slots__ = ('capacity', 'rate', 'text')
+
+    def __init__(self, text):
+        # "5/minute", "100/hour" or "10/minute burst 20"
+        spec, _, burst = text.partition(' burst ')
+        count, _, period = spec.strip().partition('/')
+        if period not in PERIODS:
+            raise ValueError(f"Invalid rate limit {text!r}: period must be one of {', '.join(PERIODS)}")
+        self.capacity = float(burst or count)
+        self.rate = int(count) / PERIODS[period]
+        self.text = text
+
+
+class ShardedBucketStore:
+    """Token buckets in process memory, split across lock-striped shards.
+
+    A bucket is [tokens, updated_at, capacity, rate], refilled lazily when
+    it is next used and written only when tokens are taken, so a check is
+    a few dict lookups and a little arithmetic under the locks of the
+    shards involved: concurrent requests for different keys rarely wait on
+    each other.
+    Buckets idle long enough to be full again are dropped when a shard
+    grows past SHARD_MAX_BUCKETS, as they hold no information.
+    """
+
+    def __init__(self, shards=64):
+        self.shards = [{} for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+
+    def take(self, buckets, cost=1.0):
+        """Remove `cost` tokens from every (key, capacity, rate) bucket, or from none.
+
+        Returns the seconds to wait for each bucket; all 0 when the tokens
+        were taken. The shards' locks are taken in index order, so the
+        check and the take are atomic without risking a deadlock.
+        """
+        indexes = [hash(key) % len(self.shards) for key, _, _ in buckets]
+        locks = [self.locks[index] for index in sorted(set(indexes))]
+        now = time.monotonic()
+        for lock in locks:
+            lock.acquire()
+        try:
+            for (key, _, _), index in zip(buckets, indexes):
+                shard = self.shards[index]
+                if key not in shard and len(shard) >= SHARD_MAX_BUCKETS:
+                    self._sweep(shard, now)
+            states = []
+            waits = []
+            for (key, capacity, rate), index in zip(buckets, indexes):
+                bucket = self.shards[index].setdefault(key, [capacity, now, capacity, rate])
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                states.append((bucket, tokens))
+                waits.append((cost - tokens) / rate if tokens < cost else 0.0)
+            if not any(waits):
+                for bucket, tokens in states:
+                    bucket[0] = tokens - cost
+                    bucket[1] = now
+            return waits
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @staticmethod
+    def _sweep(shard, now):
+        full = [key for key, (tokens, updated_at, capacity, rate) in shard.items()
+                if tokens + (now - updated_at) * rate >= capacity]
+        for key in full:
+            del shard[key]
+
+    def clear(self):
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                shard.clear()
+
+
+# Refill and check every bucket, then take from all of them or none, in one
+# round trip; the server clock is used so that every application process
+# agrees on elapsed time. ARGV is the cost, then capacity and rate per key.
+_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local waits = {}
+local blocked = false
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens[i] = math.min(capacity, available + (now - updated_at) * rate)
+    if tokens[i] < cost then
+        waits[i] = tostring((cost - tokens[i]) / rate)
+        blocked = true
+    else
+        waits[i] = '0'
+    end
+end
+if not blocked then
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i])
+        local rate = tonumber(ARGV[2 * i + 1])
+        redis.call('HSET', key, 'tokens', tostring(tokens[i] - cost), 'updated_at', tostring(now))
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+end
+return waits
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all processes, in Redis or a server speaking its protocol.
+
+    Each check is a single EVALSHA of a script that refills, checks and
+    takes atomically; keys expire once the bucket would be full again.
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND='redis' requires the redis package")
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, buckets, cost=1.0):
+        args = [cost]
+        for _, capacity, rate in buckets:
+            args += [capacity, rate]
+        waits = self._take(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        return [float(wait) for wait in waits]
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+def _client_ip():
+    # The proxy's address unless TRUSTED_PROXY_COUNT lets ProxyFix read X-Forwarded-For
+    return request.remote_addr
+
+
+def _email():
+    data = request.get_json(silent=True)
+    email = data.get('email_address') if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def _account():
+    account_id = (request.view_args or {}).get('account_id')
+    if account_id is None:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            account_id = data.get('from_account_id', data.get('account_id', data.get('card_id')))
+    return str(account_id) if account_id is not None else None
+
+
+# How each scope finds its key in the request; none of them touches the database
+SCOPES = {
+    'ip': _client_ip,
+    'email': _email,
+    'account': _account,
+}
+
+
+class RateLimiter:
+    """Per-route token-bucket limits, checked in a before_request hook.
+
+    RATE_LIMITS maps an endpoint name to {scope: "N/period"}; a request is
+    rejected with a 429 when any of its buckets is empty, and then takes
+    no token from the others, so a request refused by its email limit does
+    not use up its IP's allowance. The check
+    runs before the view, so a rejected login costs neither a user lookup
+    nor a password hash. Scopes whose key is missing from the request
+    (no email in the body...) are not checked.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.store = ShardedBucketStore()
+        self.limits = {}
+        self._lock = threading.Lock()
+        self._rejected = {}
+        self._checked = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', self.enabled)
+        backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+        if backend == 'redis':
+            self.store = RedisBucketStore(app.config['RATE_LIMIT_REDIS_URL'])
+        else:
+            self.store = ShardedBucketStore(app.config.get('RATE_LIMIT_SHARDS', 64))
+        self.limits = {
+            endpoint: {scope: Limit(text) for scope, text in scopes.items()}
+            for endpoint, scopes in app.config.get('RATE_LIMITS', {}).items()
+        }
+        for scopes in self.limits.values():
+            for scope in scopes:
+                if scope not in SCOPES:
+                    raise ValueError(f"Unknown rate limit scope {scope!r}")
+        if self.enabled and self.limits:
+            app.before_request(self.check)
+
+    def check(self):
+        scopes = self.limits.get(request.endpoint)
+        if not scopes:
+            return None
+        with self._lock:
+            self._checked += 1
+        checked = []
+        buckets = []
+        for scope, limit in scopes.items():
+            value = SCOPES[scope]()
+            if value is None:
+                continue
+            checked.append(scope)
+            buckets.append((f'{request.endpoint}:{scope}:{value}', limit.capacity, limit.rate))
+        if not buckets:
+            return None
+        try:
+            waits = self.store.take(buckets)
+        except Exception as e:
+            # A limiter outage must not take the endpoints down with it
+            current_app.logger.error(f"Rate limit store unavailable: {e}")
+            return None
+        retry_after = max(waits)
+        if not retry_after:
+            return None
+        with self._lock:
+            for scope, wait in zip(checked, waits):
+                if wait:
+                    counter = f'{request.endpoint}:{scope}'
+                    self._rejected[counter] = self._rejected.get(counter, 0) + 1
+        return jsonify({'error': 'Too many requests, retry later'}), 429, \
+            {'Retry-After': str(max(1, int(retry_after + 0.999)))}
+
+    def stats(self):
+        with self._lock:
+            rejected = dict(self._rejected)
+            checked = self._checked
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'checked': checked,
+            'rejected': rejected,
+            'limits': {endpoint: {scope: limit.text for scope, limit in scopes.items()}
+                       for endpoint, scopes in self.limits.items()},
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,227 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, func
+
+from app import db
+from models.Loan import Loan
+from models.Repayment import Repayment
+from models.LoanReconciliation import LoanReconciliation
+from services import ledger
+from services.entity_cache import entity_cache
+
+REQUIRED_FIELDS = ('loan_id', 'repayment_date', 'repayment_amount')
+CHUNK_SIZE = 500
+
+
+class RepaymentError(Exception):
+    status_code = 400
+
+
+class LoanNotFound(RepaymentError):
+    status_code = 404
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _validate(item):
+    if not isinstance(item, dict):
+        return None, "Repayment must be an object"
+    for field in REQUIRED_FIELDS:
+        if field not in item:
+            return None, f"Missing required field: {field}"
+    try:
+        amount = Decimal(str(item['repayment_amount'])).quantize(Decimal('0.01'))
+        date = item['repayment_date']
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+        loan_id = int(item['loan_id'])
+    except (TypeError, ValueError, InvalidOperation) as e:
+        return None, str(e)
+    if amount <= 0:
+        return None, "Repayment amount must be positive"
+    return {'loan_id': loan_id, 'repayment_date': date, 'repayment_amount': amount}, None
+
+
+def post_repayment(loan_id, repayment_date, repayment_amount):
+    """Record one repayment and reduce the loan's outstanding balance atomically."""
+    repayment, error = _validate({'loan_id': loan_id, 'repayment_date': repayment_date,
+                                  'repayment_amount': repayment_amount})
+    if error:
+        raise RepaymentError(error)
+    try:
+        loan = Loan.query.filter_by(loan_id=repayment['loan_id']).with_for_update().first()
+        if not loan:
+            raise LoanNotFound("Loan not found")
+        outstanding = loan.outstanding_balance or Decimal('0')
+        if repayment['repayment_amount'] > outstanding:
+            raise RepaymentError("Repayment exceeds outstanding balance")
+
+        new_repayment = Repayment(**repayment)
+        db.session.add(new_repayment)
+        ledger.post(ledger.LOAN, loan.loan_id, 'repayment', -repayment['repayment_amount'],
+                    outstanding, repayment['repayment_date'])
+        loan.outstanding_balance = outstanding - repayment['repayment_amount']
+        loan.needs_reconcile = True
+        db.session.commit()
+        return new_repayment
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def post_repayments(items):
+    """Post a file of repayments in one transaction.
+
+    Affected loans are row-locked with one SELECT; every Repayment row goes in
+    with executemany, then the amounts are summed per loan_id so each loan
+    gets exactly one UPDATE however many repayments it received.
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        repayment, error = _validate(item)
+        if error:
+            results.append({'index': index, 'status': 'rejected', 'error': error})
+        else:
+            results.append({'index': index, 'status': 'pending'})
+            valid.append((index, repayment))
+
+    try:
+        outstanding = {}
+        for chunk in _chunks(sorted({r['loan_id'] for _, r in valid})):
+            rows = (
+                db.session.query(Loan.loan_id, Loan.outstanding_balance)
+                .filter(Loan.loan_id.in_(chunk))
+                .order_by(Loan.loan_id)
+                .with_for_update()
+                .all()
+            )
+            outstanding.update((loan_id, balance or Decimal('0')) for loan_id, balance in rows)
+        opening = dict(outstanding)
+
+        totals = {}
+        inserts = []
+        postings = []
+        for index, repayment in valid:
+            loan_id = repayment['loan_id']
+            amount = repayment['repayment_amount']
+            if loan_id not in outstanding:
+                results[index].update(status='rejected', error="Loan not found")
+                continue
+            if amount > outstanding[loan_id]:
+                results[index].update(status='rejected', error="Repayment exceeds outstanding balance")
+                continue
+            outstanding[loan_id] -= amount
+            totals[loan_id] = totals.get(loan_id, Decimal('0')) + amount
+            inserts.append(repayment)
+            postings.append((loan_id, 'repayment', -amount, repayment['repayment_date']))
+            results[index]['status'] = 'ok'
+
+        for chunk in _chunks(inserts):
+            db.session.execute(Repayment.__table__.insert(), chunk)
+        loans = Loan.__table__
+        update_loan = (
+            loans.update()
+            .where(loans.c.loan_id == bindparam('b_loan_id'))
+            .values(outstanding_balance=func.coalesce(loans.c.outstanding_balance, 0) - bindparam('b_total'),
+                    needs_reconcile=True)
+        )
+        params = [{'b_loan_id': loan_id, 'b_total': total} for loan_id, total in totals.items()]
+        for chunk in _chunks(params):
+            db.session.execute(update_loan, chunk)
+        ledger.post_many(ledger.LOAN, postings, opening)
+        entity_cache.mark_dirty(db.session, 'loan', list(totals))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'accepted': sum(1 for r in results if r['status'] == 'ok'),
+        'rejected': sum(1 for r in results if r['status'] == 'rejected'),
+        'loans_updated': len(totals),
+        'results': results,
+    }
+
+
+def _check(state, loan):
+    opening = loan.opening_balance if loan.opening_balance is not None else loan.loan_amount
+    state.expected_balance = (opening or Decimal('0')) - state.repaid_total
+    state.in_balance = (loan.outstanding_balance or Decimal('0')) == state.expected_balance
+    return state.in_balance
+
+
+def _reconcile_chunk(loans):
+    """Recompute repaid_total for row-locked `loans` and check them; returns the mismatches.
+
+    Writers lock the loan before inserting its repayments and keep the lock
+    until they commit, so with the lock held the sum sees every repayment
+    of these loans and nothing can be added to them until the commit. The
+    sum reads ix_repayments_loan_id_date.
+    """
+    loan_ids = [loan.loan_id for loan in loans]
+    sums = dict(
+        db.session.query(Repayment.loan_id, func.sum(Repayment.repayment_amount))
+        .filter(Repayment.loan_id.in_(loan_ids))
+        .group_by(Repayment.loan_id)
+        .all()
+    )
+    states = {state.loan_id: state for state in
+              LoanReconciliation.query.filter(LoanReconciliation.loan_id.in_(loan_ids))}
+    mismatches = []
+    for loan in loans:
+        state = states.get(loan.loan_id)
+        if state is None:
+            state = LoanReconciliation(loan_id=loan.loan_id)
+            db.session.add(state)
+        state.repaid_total = Decimal(sums.get(loan.loan_id) or 0)
+        loan.needs_reconcile = False
+        if not _check(state, loan):
+            mismatches.append({
+                'loan_id': loan.loan_id,
+                'outstanding_balance': float(loan.outstanding_balance or 0),
+                'expected_balance': float(state.expected_balance)
+            })
+    db.session.commit()
+    return mismatches
+
+
+def reconcile(chunk_size=1000):
+    """Check outstanding balances of the loans repaid since the last run.
+
+    Every repayment flags its loan (needs_reconcile) in the same
+    transaction, so a loan is picked up once the repayment commits, however
+    long that takes. Loans still out of balance from earlier runs, then the
+    flagged ones, are row-locked chunk by chunk and their repayments summed
+    again: in balance when outstanding_balance == opening_balance - repaid.
+    Returns the loans out of balance after this run.
+    """
+    unbalanced = (
+        Loan.query.join(LoanReconciliation, LoanReconciliation.loan_id == Loan.loan_id)
+        .filter(LoanReconciliation.in_balance.is_(False), Loan.needs_reconcile.is_(False))
+    )
+    flagged = Loan.query.filter(Loan.needs_reconcile.is_(True))
+    checked = 0
+    # Keyed by loan: one repaid while the run is going is checked twice
+    mismatches = {}
+    for query in (unbalanced, flagged):
+        after = 0
+        while True:
+            # A locking read first, so the sums of the chunk are read under the locks
+            loans = (
+                query.filter(Loan.loan_id > after)
+                .order_by(Loan.loan_id)
+                .limit(chunk_size)
+                .with_for_update()
+                .all()
+            )
+            if not loans:
+                break
+            mismatches.update((m['loan_id'], m) for m in _reconcile_chunk(loans))
+            checked += len(loans)
+            after = loans[-1].loan_id
+    return {'loans_checked': checked, 'mismatches': list(mismatches.values())}
@@ -0,0 +1,54 @@
+import itertools
+import threading
+import time
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica'
+LAST_WRITE_KEY = 'last_write_at'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(Session):
+    """Session that sends reads of replica-eligible requests to a replica bind.
+
+    A request is replica-eligible when `g.use_replica` is set (see
+    init_app). Flushes, and everything outside such requests, use the
+    primary. Replicas are the SQLALCHEMY_BINDS whose key starts with
+    'replica', picked round-robin.
+    """
+
+    _counter = itertools.count()
+    _counter_lock = threading.Lock()
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica'):
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if key and key.startswith(REPLICA_BIND_PREFIX)]
+            if replicas:
+                with self._counter_lock:
+                    index = next(self._counter)
+                return replicas[index % len(replicas)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app):
+    window = app.config.get('READ_YOUR_WRITES_WINDOW', 5)
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    if not any(key.startswith(REPLICA_BIND_PREFIX) for key in binds):
+        return
+
+    @app.before_request
+    def choose_database():
+        # Reads go to a replica unless this client wrote within the window,
+        # so users always see their own changes.
+        if request.method in READ_METHODS:
+            last_write = session.get(LAST_WRITE_KEY, 0)
+            g.use_replica = time.time() - last_write >= window
+
+    @app.after_request
+    def remember_write(response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            session[LAST_WRITE_KEY] = time.time()
+        return response
@@ -0,0 +1,313 @@
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.Account import Account
+from models.Loan import Loan
+from models.LedgerEntry import LedgerEntry
+from models.JobWatermark import JobWatermark
+from models.AgencyStats import AgencyStats
+from models.AgencyDailyStats import AgencyDailyStats
+from services import ledger
+
+ROLLUP_WATERMARK = 'agency_rollup'
+CHUNK_SIZE = 10000
+# Days rebuilt by reaggregate(): ledger entries are dated today, or back-dated a little
+REAGGREGATE_DAYS = 2
+ZERO = Decimal('0')
+
+
+def _customer_agency():
+    """(customer_id, agency_id): a customer belongs to the agency of their first account.
+
+    Loans only reference the customer, so this is how loan exposure is
+    attributed to an agency.
+    """
+    accounts = Account.__table__
+    first_account = (
+        select(accounts.c.customer_id, func.min(accounts.c.id).label('account_id'))
+        .group_by(accounts.c.customer_id)
+        .subquery()
+    )
+    return (
+        select(first_account.c.customer_id, accounts.c.agency_id)
+        .join(accounts, accounts.c.id == first_account.c.account_id)
+        .subquery()
+    )
+
+
+def customer_agencies(customer_ids):
+    mapping = _customer_agency()
+    rows = db.session.execute(
+        select(mapping.c.customer_id, mapping.c.agency_id).where(mapping.c.customer_id.in_(customer_ids))
+    )
+    return dict(rows.all())
+
+
+def _increment(model, key, deltas):
+    """UPDATE ... SET col = col + delta for one rollup row, inserting it if missing.
+
+    Increments are atomic in the database, so concurrent write paths can
+    update the same row without lost updates.
+    """
+    table = model.__table__
+    where = and_(*(table.c[name] == value for name, value in key.items()))
+    update = table.update().where(where).values(
+        {name: table.c[name] + delta for name, delta in deltas.items()})
+    if db.session.execute(update).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**key, **deltas))
+    except IntegrityError:
+        # Inserted concurrently by another writer
+        db.session.execute(update)
+
+
+def record_account(account):
+    """Count a new account and its opening balance (call before commit)."""
+    _increment(AgencyStats, {'agency_id': account.agency_id},
+               {'account_count': 1, 'total_deposits': Decimal(str(account.balance or 0))})
+
+
+def record_loan(loan):
+    """Count a new loan in its borrower's agency (call before commit)."""
+    agency_id = customer_agencies([loan.client_id]).get(loan.client_id)
+    if agency_id is None:
+        return
+    _increment(AgencyStats, {'agency_id': agency_id},
+               {'loan_count': 1, 'loan_exposure': Decimal(str(loan.outstanding_balance or 0))})
+
+
+def _ledger_chunk(after_id, chunk_size):
+    return (
+        db.session.query(LedgerEntry.id, LedgerEntry.account_kind, LedgerEntry.account_id,
+                         LedgerEntry.entry_date)
+        .filter(LedgerEntry.id > after_id,
+                LedgerEntry.account_kind.in_((ledger.ACCOUNT, ledger.LOAN)))
+        .order_by(LedgerEntry.id)
+        .limit(chunk_size)
+        .all()
+    )
+
+
+def _buckets(entries):
+    """The (agency_id, entry_date) pairs the entries count towards."""
+    account_ids = {e.account_id for e in entries if e.account_kind == ledger.ACCOUNT}
+    loan_ids = {e.account_id for e in entries if e.account_kind == ledger.LOAN}
+    account_agency = dict(
+        db.session.query(Account.id, Account.agency_id).filter(Account.id.in_(account_ids)).all()
+    ) if account_ids else {}
+    loan_agency = {}
+    if loan_ids:
+        borrowers = dict(db.session.query(Loan.loan_id, Loan.client_id).filter(Loan.loan_id.in_(loan_ids)).all())
+        agencies = customer_agencies(set(borrowers.values()))
+        loan_agency = {loan_id: agencies.get(client_id) for loan_id, client_id in borrowers.items()}
+
+    buckets = set()
+    for entry in entries:
+        owners = account_agency if entry.account_kind == ledger.ACCOUNT else loan_agency
+        agency_id = owners.get(entry.account_id)
+        if agency_id is not None:
+            buckets.add((agency_id, entry.entry_date))
+    return buckets
+
+
+def _empty_day():
+    return {'transaction_count': 0, 'credit_volume': ZERO, 'debit_volume': ZERO,
+            'repayment_count': 0, 'repayment_volume': ZERO}
+
+
+def _level_rows(agency_ids=None):
+    """AgencyStats rows summed from accounts and loans, for all agencies or `agency_ids`."""
+    accounts = Account.__table__
+    loans = Loan.__table__
+    mapping = _customer_agency()
+    account_totals = (
+        select(accounts.c.agency_id, func.count(), func.coalesce(func.sum(accounts.c.balance), 0))
+        .group_by(accounts.c.agency_id)
+    )
+    loan_totals = (
+        select(mapping.c.agency_id, func.count(), func.coalesce(func.sum(loans.c.outstanding_balance), 0))
+        .join(mapping, mapping.c.customer_id == loans.c.client_id)
+        .group_by(mapping.c.agency_id)
+    )
+    if agency_ids is not None:
+        account_totals = account_totals.where(accounts.c.agency_id.in_(agency_ids))
+        loan_totals = loan_totals.where(mapping.c.agency_id.in_(agency_ids))
+
+    levels = {}
+    for agency_id, count, deposits in db.session.execute(account_totals):
+        levels[agency_id] = {'agency_id': agency_id, 'account_count': count,
+                             'total_deposits': Decimal(str(deposits)), 'loan_count': 0, 'loan_exposure': ZERO}
+    for agency_id, count, exposure in db.session.execute(loan_totals):
+        level = levels.setdefault(agency_id, {'agency_id': agency_id, 'account_count': 0,
+                                              'total_deposits': ZERO})
+        level.update(loan_count=count, loan_exposure=Decimal(str(exposure)))
+    return levels
+
+
+def _day_rows(agency_ids=None, days=None, since=None, upper_id=None):
+    """AgencyDailyStats rows summed from the ledger, optionally narrowed to
+    `agency_ids`, to the dates in `days` or from `since`, and to entries up
+    to `upper_id`.
+
+    Per agency, entries are reached through the accounts and loans it owns,
+    on the (account_kind, account_id, entry_date) index.
+    """
+    accounts = Account.__table__
+    loans = Loan.__table__
+    entries = LedgerEntry.__table__
+    mapping = _customer_agency()
+    filters = []
+    if days is not None:
+        filters.append(entries.c.entry_date.in_(days))
+    if since is not None:
+        filters.append(entries.c.entry_date >= since)
+    if upper_id is not None:
+        filters.append(entries.c.id <= upper_id)
+
+    positive = case((entries.c.amount > 0, entries.c.amount), else_=0)
+    negative = case((entries.c.amount < 0, -entries.c.amount), else_=0)
+    account_days = (
+        select(accounts.c.agency_id, entries.c.entry_date, func.count(),
+               func.sum(positive), func.sum(negative))
+        .join(accounts, accounts.c.id == entries.c.account_id)
+        .where(entries.c.account_kind == ledger.ACCOUNT, *filters)
+        .group_by(accounts.c.agency_id, entries.c.entry_date)
+    )
+    loan_days = (
+        select(mapping.c.agency_id, entries.c.entry_date, func.count(), func.sum(negative))
+        .join(loans, loans.c.loan_id == entries.c.account_id)
+        .join(mapping, mapping.c.customer_id == loans.c.client_id)
+        .where(entries.c.account_kind == ledger.LOAN, *filters)
+        .group_by(mapping.c.agency_id, entries.c.entry_date)
+    )
+    if agency_ids is not None:
+        account_days = account_days.where(accounts.c.agency_id.in_(agency_ids))
+        loan_days = loan_days.where(mapping.c.agency_id.in_(agency_ids))
+
+    rows = {}
+    for agency_id, day, count, credits, debits in db.session.execute(account_days):
+        row = rows.setdefault((agency_id, day), {'agency_id': agency_id, 'day': day, **_empty_day()})
+        row.update(transaction_count=count, credit_volume=Decimal(str(credits or 0)),
+                   debit_volume=Decimal(str(debits or 0)))
+    for agency_id, day, count, repaid in db.session.execute(loan_days):
+        row = rows.setdefault((agency_id, day), {'agency_id': agency_id, 'day': day, **_empty_day()})
+        row.update(repayment_count=count, repayment_volume=Decimal(str(repaid or 0)))
+    return list(rows.values())
+
+
+def _rebuild(agency_ids=None, days=None, since=None, upper_id=None):
+    """Replace the rollup rows of `agency_ids` (all if None) with fresh sums.
+
+    Daily rows are replaced for the dates in `days`, from `since`, or all
+    of them. Returns the numbers of agency and daily rows written.
+    """
+    levels = _level_rows(agency_ids)
+    rows = _day_rows(agency_ids, days, since, upper_id)
+    stats = db.session.query(AgencyStats)
+    daily = db.session.query(AgencyDailyStats)
+    if agency_ids is not None:
+        stats = stats.filter(AgencyStats.agency_id.in_(agency_ids))
+        daily = daily.filter(AgencyDailyStats.agency_id.in_(agency_ids))
+    if days is not None:
+        daily = daily.filter(AgencyDailyStats.day.in_(days))
+    if since is not None:
+        daily = daily.filter(AgencyDailyStats.day >= since)
+    stats.delete(synchronize_session=False)
+    daily.delete(synchronize_session=False)
+    if levels:
+        db.session.execute(AgencyStats.__table__.insert(), list(levels.values()))
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(AgencyDailyStats.__table__.insert(), rows[i:i + CHUNK_SIZE])
+    return len(levels), len(rows)
+
+
+def _lock_watermark():
+    watermark = db.session.query(JobWatermark).filter_by(name=ROLLUP_WATERMARK).with_for_update().first()
+    if watermark is None:
+        watermark = JobWatermark(name=ROLLUP_WATERMARK, last_id=0)
+        db.session.add(watermark)
+        db.session.flush()
+    return watermark
+
+
+def apply_ledger(chunk_size=CHUNK_SIZE):
+    """Recompute the agency rollups touched by ledger entries posted since the last run.
+
+    Every money movement (transfers, batches, repayments) already writes
+    the ledger, so this one job keeps deposits, loan exposure and the daily
+    volumes current whatever path wrote them. The watermark only tells
+    which agencies and days changed: their rows are rebuilt from sums, so
+    an entry that commits after a higher id was read is counted by the
+    next rebuild of its bucket instead of being lost, and reaggregate()
+    catches it if no later entry touches that bucket. The watermark row
+    is locked for the run, so two workers never rebuild concurrently.
+    """
+    watermark = _lock_watermark()
+    applied = 0
+    while True:
+        entries = _ledger_chunk(watermark.last_id, chunk_size)
+        if not entries:
+            break
+        buckets = _buckets(entries)
+        if buckets:
+            _rebuild({agency_id for agency_id, _ in buckets}, days={day for _, day in buckets})
+        watermark.last_id = entries[-1].id
+        applied += len(entries)
+        db.session.commit()
+        if len(entries) < chunk_size:
+            break
+        watermark = _lock_watermark()
+    db.session.commit()
+    return {'entries': applied, 'watermark': watermark.last_id}
+
+
+def reaggregate(days=REAGGREGATE_DAYS):
+    """Rebuild every agency's totals and its daily rows for the last `days` days.
+
+    Meant to run periodically after apply_ledger, for ledger entries that
+    committed late and whose bucket no later entry touched.
+    """
+    _lock_watermark()
+    since = datetime.date.today() - datetime.timedelta(days=days - 1)
+    agencies, rows = _rebuild(since=since)
+    db.session.commit()
+    return {'agencies': agencies, 'days': rows, 'since': since}
+
+
+def backfill():
+    """Rebuild both rollup tables from the current data.
+
+    Totals come from GROUP BYs over accounts and loans; daily volumes from
+    the whole ledger. The watermark is set to the last ledger entry read,
+    so apply_ledger continues from there.
+    """
+    watermark = _lock_watermark()
+    upper_id = db.session.query(func.max(LedgerEntry.id)).scalar() or 0
+    agencies, rows = _rebuild(upper_id=upper_id)
+    watermark.last_id = upper_id
+    db.session.commit()
+    return {'agencies': agencies, 'days': rows, 'watermark': upper_id}
+
+
+def agency_stats(agency_id, days=1):
+    """Totals plus the last `days` daily rows: primary-key reads only."""
+    totals = db.session.get(AgencyStats, agency_id)
+    since = datetime.date.today() - datetime.timedelta(days=days - 1)
+    daily = (
+        AgencyDailyStats.query
+        .filter(AgencyDailyStats.agency_id == agency_id, AgencyDailyStats.day >= since)
+        .order_by(AgencyDailyStats.day.desc())
+        .all()
+    )
+    result = totals.to_dict() if totals else {
+        'agency_id': agency_id, 'account_count': 0, 'total_deposits': 0.0,
+        'loan_count': 0, 'loan_exposure': 0.0, 'updated_at': None
+    }
+    result['daily'] = [day.to_dict() for day in daily]
+    return result
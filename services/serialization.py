@@ -0,0 +1,88 @@
+from sqlalchemy import Date, DateTime, Float, Numeric, Time, select
+
+from app import db
+from models.User import User
+from models.Account import Account
+from models.Customer import Customer
+from models.Loan import Loan
+from models.Repayment import Repayment
+from models.Transaction import Transaction
+from models.Agency import Agency
+from models.ContactMessage import ContactMessage
+from services.money import MoneyType
+
+# Same keys as each model's to_dict()
+MODEL_FIELDS = {
+    User: ('id', 'username', 'first_name', 'last_name', 'date_of_birth', 'address', 'phone_number',
+           'email_address', 'nin_cust', 'rib_cust', 'agency_id', 'registration_date'),
+    Account: ('id', 'balance', 'currency', 'user_id'),
+    Customer: ('id', 'name', 'email', 'phone', 'address', 'first_name', 'last_name', 'date_of_birth',
+               'phone_number', 'email_address', 'nin_cust', 'rib_cust'),
+    Loan: ('loan_id', 'client_id', 'loan_amount', 'interest_rate', 'start_date', 'end_date',
+           'outstanding_balance', 'accrued_interest', 'accrued_through'),
+    Repayment: ('repayment_id', 'loan_id', 'repayment_date', 'repayment_amount'),
+    Transaction: ('id', 'id_transaction', 'account_id', 'amount', 'currency', 'date', 'transaction_type'),
+    Agency: ('id', 'name', 'location'),
+    ContactMessage: ('id', 'full_name', 'email', 'phone_number', 'message'),
+}
+
+
+def _conversion(column_type, var):
+    if isinstance(column_type, Float):
+        return var
+    if isinstance(column_type, (Numeric, MoneyType)):
+        return f'(float({var}) if {var} is not None else None)'
+    if isinstance(column_type, (Date, DateTime, Time)):
+        return f'({var}.isoformat() if {var} is not None else None)'
+    return var
+
+
+def _compile(name, fields, columns):
+    """Build `serialize(row)`: one tuple unpack and one dict literal per row."""
+    names = [f'c{i}' for i in range(len(fields))]
+    items = ', '.join(f'{field!r}: {_conversion(column.type, var)}'
+                      for field, column, var in zip(fields, columns, names))
+    unpack = ', '.join(names) + (',' if len(names) == 1 else '')
+    source = f'def serialize_{name}(row):\n    {unpack} = row\n    return {{{items}}}\n'
+    namespace = {}
+    exec(compile(source, f'<serializer {name}>', 'exec'), namespace)
+    return namespace[f'serialize_{name}']
+
+
+class ModelSerializer:
+    """JSON-ready dicts for one model, straight from Core rows.
+
+    The row-to-dict function is generated once per model from the column
+    types: Numeric and Money become float, dates become ISO strings,
+    everything else is passed through. Rows must come from select() (same
+    columns, same order), so no ORM objects or identity map are involved.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        table = model.__table__
+        self.columns = [table.c[field] for field in self.fields]
+        self.primary_key = table.primary_key.columns.values()[0]
+        self.serialize = _compile(model.__name__, self.fields, self.columns)
+
+    def select(self):
+        return select(*self.columns)
+
+    def many(self, rows):
+        serialize = self.serialize
+        return [serialize(row) for row in rows]
+
+    def get(self, entity_id):
+        row = db.session.execute(self.select().where(self.primary_key == entity_id)).first()
+        return self.serialize(row) if row is not None else None
+
+
+_serializers = {}
+
+
+def serializer_for(model):
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model, MODEL_FIELDS[model])
+    return serializer
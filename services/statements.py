@@ -0,0 +1,194 @@
+import base64
+import csv
+import datetime
+import io
+import os
+
+from sqlalchemy import and_, or_
+
+from app import db
+from models.Account import Account
+from models.Transaction import Transaction
+from models.LedgerEntry import LedgerEntry
+from services import ledger
+from services.fast_json import dumps
+from services.serialization import ModelSerializer, serializer_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 1000
+
+TRANSACTION_COLUMNS = ('id', 'account_id', 'amount', 'currency', 'date', 'transaction_type')
+_transactions = ModelSerializer(Transaction, TRANSACTION_COLUMNS)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def page_size(value):
+    try:
+        size = int(value) if value is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _transaction_query(account_id):
+    return (
+        db.session.query(*_transactions.columns)
+        .filter(Transaction.account_id == account_id)
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
+    )
+
+
+def transactions_page(account_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of an account's transactions, newest first.
+
+    Pages are keyed on (date, id) of the last row returned, so every page is
+    an index range scan on (account_id, date, id) whatever its depth.
+    """
+    query = _transaction_query(account_id)
+    if cursor:
+        try:
+            last_date, last_id = decode_cursor(cursor)
+            last_date = datetime.date.fromisoformat(last_date)
+            last_id = int(last_id)
+        except ValueError:
+            raise InvalidCursor("Invalid cursor")
+        query = query.filter(or_(
+            Transaction.date < last_date,
+            and_(Transaction.date == last_date, Transaction.id < last_id)
+        ))
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date.isoformat(), rows[-1].id)
+    return {
+        'transactions': _transactions.many(rows),
+        'next_cursor': next_cursor
+    }
+
+
+def accounts_page(user_id=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    accounts = serializer_for(Account)
+    query = accounts.select().order_by(Account.id)
+    if user_id is not None:
+        query = query.where(Account.user_id == user_id)
+    if cursor:
+        try:
+            last_id = int(decode_cursor(cursor)[0])
+        except ValueError:
+            raise InvalidCursor("Invalid cursor")
+        query = query.where(Account.id > last_id)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return {
+        'accounts': accounts.many(rows),
+        'next_cursor': next_cursor
+    }
+
+
+def stream_transactions(account_id, fmt='ndjson'):
+    """Yield an account's full history as NDJSON or CSV text chunks.
+
+    Rows are fetched with yield_per (a server-side cursor on MySQL) and
+    written out in fixed-size chunks, so memory use does not grow with the
+    length of the history.
+    """
+    rows = _transaction_query(account_id).yield_per(STREAM_CHUNK_SIZE)
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(TRANSACTION_COLUMNS)
+
+    count = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow([row.id, row.account_id, row.amount, row.currency,
+                             row.date.isoformat() if row.date else '', row.transaction_type])
+        else:
+            buffer.write(dumps(_transactions.serialize(row)))
+            buffer.write('\n')
+        count += 1
+        if count % STREAM_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_statement(account_id, start, end, directory):
+    """Write an account's ledger entries between two dates to a CSV file.
+
+    The opening balance is the ledger balance at the end of the day before
+    `start`. Entries are streamed in date order (then seq) with yield_per,
+    so long periods do not have to fit in memory; the balance column is
+    the running balance in that order, so back-dated postings show on
+    their own day. Returns a summary of the file.
+    """
+    account = db.session.get(Account, account_id)
+    if account is None:
+        raise LookupError(f"Account {account_id} not found")
+    if isinstance(start, str):
+        start = datetime.date.fromisoformat(start)
+    if isinstance(end, str):
+        end = datetime.date.fromisoformat(end)
+    opening = ledger.balance_at(ledger.ACCOUNT, account_id, start - datetime.timedelta(days=1))
+    if opening is None:
+        # Nothing dated before the period: the balance before the first entry
+        opening = ledger.opening_balance(ledger.ACCOUNT, account_id)
+
+    entries = (
+        db.session.query(LedgerEntry.seq, LedgerEntry.entry_date, LedgerEntry.entry_type,
+                         LedgerEntry.amount)
+        .filter(LedgerEntry.account_kind == ledger.ACCOUNT,
+                LedgerEntry.account_id == account_id,
+                LedgerEntry.entry_date >= start,
+                LedgerEntry.entry_date <= end)
+        .order_by(LedgerEntry.entry_date, LedgerEntry.seq)
+        .yield_per(STREAM_CHUNK_SIZE)
+    )
+    os.makedirs(directory, exist_ok=True)
+    name = f'account-{account_id}-{start.isoformat()}-{end.isoformat()}.csv'
+    count = 0
+    closing = opening
+    with open(os.path.join(directory, name), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('seq', 'date', 'type', 'amount', 'balance_after'))
+        for entry in entries:
+            closing += entry.amount
+            writer.writerow((entry.seq, entry.entry_date.isoformat(), entry.entry_type,
+                             entry.amount, closing))
+            count += 1
+    if opening is None:
+        # No ledger activity yet: the account balance is both ends
+        opening = closing = account.balance
+    return {
+        'account_id': account_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'opening_balance': float(opening),
+        'closing_balance': float(closing),
+        'entries': count,
+        'file': name,
+    }
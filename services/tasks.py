@@ -0,0 +1,161 @@
+import datetime
+import os
+import smtplib
+
+from celery.schedules import crontab
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from kombu.exceptions import OperationalError as BrokerError
+
+from app import db, celery
+from models.ContactMessage import ContactMessage
+from models.User import User
+from services import eod, fx, notifications, rollups, statements
+
+# Tasks sending mail are retried on SMTP/network errors
+MAIL_ERRORS = (smtplib.SMTPException, OSError)
+
+
+def init_app(app):
+    celery.conf.beat_schedule = {
+        'nightly-loan-accrual': {
+            'task': 'loans.accrue_interest',
+            'schedule': crontab(hour=app.config['ACCRUAL_HOUR'], minute=0),
+        },
+        'nightly-fx-revaluation': {
+            'task': 'fx.revalue',
+            'schedule': crontab(hour=app.config['FX_REVALUATION_HOUR'], minute=0),
+        },
+        'end-of-day': {
+            'task': 'eod.run',
+            'schedule': crontab(hour=app.config['EOD_HOUR'], minute=30),
+        },
+        'agency-rollups': {
+            'task': 'rollups.apply_ledger',
+            'schedule': float(app.config['ROLLUP_INTERVAL']),
+        },
+        'agency-rollups-reaggregate': {
+            'task': 'rollups.reaggregate',
+            'schedule': float(app.config['ROLLUP_REAGGREGATE_INTERVAL']),
+        },
+    }
+
+
+def enqueue(task, *args, **kwargs):
+    """Queue a task; returns its id, or None if the broker is unreachable.
+
+    Used for side effects (notifications) that must not fail the request
+    that triggered them.
+    """
+    try:
+        return task.delay(*args, **kwargs).id
+    except BrokerError as e:
+        current_app.logger.error(f"Could not queue {task.name}: {e}")
+        return None
+
+
+def _token_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='task-status')
+
+
+def status_token(task_id, owner_id=None):
+    """Signed reference to a task for /tasks/<token>, bound to the user who queued it."""
+    return _token_serializer().dumps([task_id, owner_id])
+
+
+def read_status_token(token):
+    """(task_id, owner_id) from a status token, or None if it was not issued by us."""
+    try:
+        task_id, owner_id = _token_serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    return task_id, owner_id
+
+
+def statements_dir(user_id):
+    """Where a user's statements are written and served from."""
+    return os.path.join(current_app.config['STATEMENTS_DIR'], f'user-{int(user_id)}')
+
+
+def task_status(task_id):
+    result = celery.AsyncResult(task_id)
+    status = {'task_id': task_id, 'state': result.state}
+    if result.successful():
+        status['result'] = result.result
+    elif result.failed():
+        status['error'] = str(result.result)
+    return status
+
+
+@celery.task(name='contact.process', bind=True, max_retries=5, default_retry_delay=60)
+def process_contact_message(self, message_id):
+    message = db.session.get(ContactMessage, message_id)
+    if message is None:
+        return {'message_id': message_id, 'status': 'missing'}
+    try:
+        inbox = current_app.config.get('CONTACT_INBOX')
+        if inbox:
+            notifications.send_email(
+                inbox,
+                f"Contact form: {message.full_name}",
+                f"From: {message.full_name} <{message.email}>, {message.phone_number}\n\n{message.message}",
+                reply_to=message.email
+            )
+        notifications.send_email(
+            message.email,
+            "We received your message",
+            f"Hello {message.full_name},\n\nThank you for contacting us. We will get back to you shortly."
+        )
+    except MAIL_ERRORS as e:
+        raise self.retry(exc=e)
+    return {'message_id': message_id, 'status': 'processed'}
+
+
+@celery.task(name='notifications.welcome', bind=True, max_retries=5, default_retry_delay=60)
+def send_welcome(self, user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return {'user_id': user_id, 'status': 'missing'}
+    name = user.first_name or user.username or user.email_address
+    try:
+        sent = notifications.send_email(
+            user.email_address,
+            "Welcome",
+            f"Hello {name},\n\nYour account has been created. Welcome aboard!"
+        )
+    except MAIL_ERRORS as e:
+        raise self.retry(exc=e)
+    return {'user_id': user_id, 'status': 'sent' if sent else 'logged'}
+
+
+@celery.task(name='statements.generate')
+def generate_statement(account_id, start, end, user_id):
+    return statements.write_statement(account_id, start, end, statements_dir(user_id))
+
+
+@celery.task(name='loans.accrue_interest')
+def accrue_interest(as_of=None):
+    # NumPy is only needed by the worker running the accrual
+    from services.amortization import accrue_interest as accrue
+    return accrue(datetime.date.fromisoformat(as_of) if as_of else None)
+
+
+@celery.task(name='rollups.apply_ledger')
+def apply_ledger_rollups():
+    return rollups.apply_ledger()
+
+
+@celery.task(name='rollups.reaggregate')
+def reaggregate_rollups():
+    result = rollups.reaggregate()
+    return {**result, 'since': result['since'].isoformat()}
+
+
+@celery.task(name='fx.revalue')
+def revalue_balances(as_of=None):
+    return fx.revalue(datetime.date.fromisoformat(as_of) if as_of else None)
+
+
+@celery.task(name='eod.run')
+def run_eod(day=None):
+    return eod.run_eod(datetime.date.fromisoformat(day) if day else None)
@@ -0,0 +1,187 @@
+import datetime
+import random
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from models.Account import Account
+from models.Transaction import Transaction
+from services import ledger
+from services.fraud import fraud_engine
+from services.fx import FxError, check_amount, check_currency, rate_cache
+from services.money import Money
+
+# MySQL/MariaDB error codes worth retrying: deadlock and lock wait timeout
+RETRYABLE_ERRORS = (1213, 1205)
+
+
+class TransferError(Exception):
+    status_code = 400
+
+
+class InvalidAccounts(TransferError):
+    status_code = 404
+
+
+class InsufficientFunds(TransferError):
+    status_code = 400
+
+
+class TransferBlocked(TransferError):
+    status_code = 403
+
+
+class CurrencyError(TransferError):
+    status_code = 422
+
+
+def _is_retryable(error):
+    code = getattr(error.orig, 'args', [None])[0] if error.orig is not None else None
+    if code in RETRYABLE_ERRORS:
+        return True
+    # SQLite reports lock contention as "database is locked"
+    return 'locked' in str(error.orig).lower() or 'deadlock' in str(error.orig).lower()
+
+
+class TransferEngine:
+    """Moves money between two accounts in a single locked transaction.
+
+    Both account rows are fetched with one SELECT ... FOR UPDATE ordered by id,
+    so concurrent transfers always lock rows in the same order and cannot
+    deadlock against each other; deadlocks caused by other writers are retried
+    with exponential backoff.
+    """
+
+    def __init__(self, max_retries=5, backoff=0.01):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._stats = {
+            'transfers': 0,
+            'failed': 0,
+            'retries': 0,
+            'blocked': 0,
+            'total_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+        }
+        self._started = time.monotonic()
+
+    def init_app(self, app):
+        self.max_retries = app.config.get('TRANSFER_MAX_RETRIES', self.max_retries)
+        self.backoff = app.config.get('TRANSFER_RETRY_BACKOFF', self.backoff)
+
+    def transfer(self, from_account_id, to_account_id, amount, currency, date):
+        if from_account_id == to_account_id:
+            raise InvalidAccounts("Cannot transfer to the same account")
+        if amount is None or amount <= 0:
+            raise TransferError("Amount must be positive")
+        if isinstance(date, str):
+            try:
+                date = datetime.date.fromisoformat(date)
+            except ValueError:
+                raise TransferError(f"Invalid date: {date}")
+
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    debited = self._apply(from_account_id, to_account_id, amount, currency, date)
+                    break
+                except OperationalError as e:
+                    db.session.rollback()
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    attempt += 1
+                    self._record_retry()
+                    # Exponential backoff with jitter so retrying workers spread out
+                    time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+                except Exception:
+                    db.session.rollback()
+                    raise
+        except TransferBlocked:
+            self._record_blocked()
+            raise
+        except Exception:
+            self._record(start, ok=False)
+            raise
+        self._record(start, ok=True)
+        fraud_engine.record(ledger.ACCOUNT, from_account_id, debited, to_account_id)
+
+    def _apply(self, from_account_id, to_account_id, amount, currency, date):
+        accounts = (
+            db.session.query(Account)
+            .filter(Account.id.in_([from_account_id, to_account_id]))
+            .order_by(Account.id)
+            .with_for_update()
+            .all()
+        )
+        by_id = {account.id: account for account in accounts}
+        sender = by_id.get(from_account_id)
+        receiver = by_id.get(to_account_id)
+        if sender is None or receiver is None:
+            raise InvalidAccounts("Invalid accounts")
+        # Each side moves the amount converted into its account's currency
+        # (exact Decimal arithmetic, rounded to the currency's minor unit);
+        # same-currency transfers skip the conversion altogether
+        try:
+            check_amount(amount, currency)
+            for account in (sender, receiver):
+                check_currency(account.currency)
+            if sender.currency == currency == receiver.currency:
+                debited = credited = Money.of(amount)
+            else:
+                debited = Money.of(rate_cache.convert(amount, currency, sender.currency, date))
+                credited = Money.of(rate_cache.convert(amount, currency, receiver.currency, date))
+        except FxError as e:
+            raise CurrencyError(str(e))
+        # Scored in the sender's currency, like the windows rebuilt from the ledger
+        decision = fraud_engine.score(ledger.ACCOUNT, sender.id, debited, receiver.id)
+        if decision.blocked:
+            raise TransferBlocked(f"Transfer refused by risk rules: {', '.join(decision.rules)}")
+        if sender.balance < debited:
+            raise InsufficientFunds("Insufficient funds")
+
+        debit = Transaction(account_id=sender.id, amount=debited, currency=sender.currency,
+                            date=date, transaction_type='debit')
+        credit = Transaction(account_id=receiver.id, amount=credited, currency=receiver.currency,
+                             date=date, transaction_type='credit')
+        db.session.add_all([debit, credit])
+        ledger.post(ledger.ACCOUNT, sender.id, 'debit', -debited, sender.balance, date, debit, receiver.id)
+        ledger.post(ledger.ACCOUNT, receiver.id, 'credit', credited, receiver.balance, date, credit, sender.id)
+        sender.balance -= debited
+        receiver.balance += credited
+        db.session.commit()
+        return debited
+
+    def _record_blocked(self):
+        with self._lock:
+            self._stats['blocked'] += 1
+
+    def _record_retry(self):
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def _record(self, start, ok):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            if ok:
+                self._stats['transfers'] += 1
+            else:
+                self._stats['failed'] += 1
+            self._stats['total_latency_ms'] += elapsed_ms
+            self._stats['max_latency_ms'] = max(self._stats['max_latency_ms'], elapsed_ms)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        uptime = time.monotonic() - self._started
+        calls = stats['transfers'] + stats['failed']
+        stats['avg_latency_ms'] = stats['total_latency_ms'] / calls if calls else 0.0
+        stats['throughput_per_s'] = stats['transfers'] / uptime if uptime > 0 else 0.0
+        return stats
+
+
+transfer_engine = TransferEngine()
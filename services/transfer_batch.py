@@ -0,0 +1,195 @@
+import datetime
+import json
+
+from sqlalchemy import bindparam
+
+from app import db, celery
+from models.Account import Account
+from models.Transaction import Transaction
+from services import ledger
+from services.entity_cache import entity_cache
+from services.fraud import fraud_engine
+from services.fx import FxError, check_amount, check_currency, rate_cache
+from services.money import Money
+
+REQUIRED_FIELDS = ('from_account_id', 'to_account_id', 'amount', 'currency', 'date')
+
+# Keep IN (...) lists and executemany batches within what MySQL and SQLite accept
+CHUNK_SIZE = 500
+ZERO = Money(0)
+
+
+def parse_ndjson(lines):
+    """Yield one transfer dict per non-empty NDJSON line."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _validate(item):
+    if not isinstance(item, dict):
+        return None, "Transfer must be an object"
+    for field in REQUIRED_FIELDS:
+        if field not in item:
+            return None, f"Missing required field: {field}"
+    try:
+        from_account_id = int(item['from_account_id'])
+        to_account_id = int(item['to_account_id'])
+        amount = Money.of(item['amount'])
+        date = item['date']
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+    except ArithmeticError:
+        return None, f"Invalid amount: {item['amount']!r}"
+    except (TypeError, ValueError) as e:
+        return None, str(e)
+    if amount is None or amount <= 0:
+        return None, "Amount must be positive"
+    if from_account_id == to_account_id:
+        return None, "Cannot transfer to the same account"
+    return {
+        'from_account_id': from_account_id,
+        'to_account_id': to_account_id,
+        'amount': amount,
+        'currency': item['currency'],
+        'date': date,
+    }, None
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _lock_balances(account_ids):
+    balances = {}
+    currencies = {}
+    for chunk in _chunks(sorted(account_ids)):
+        rows = (
+            db.session.query(Account.id, Account.balance, Account.currency)
+            .filter(Account.id.in_(chunk))
+            .order_by(Account.id)
+            .with_for_update()
+            .all()
+        )
+        for account_id, balance, currency in rows:
+            balances[account_id] = balance
+            currencies[account_id] = currency
+    return balances, currencies
+
+
+def apply_batch(items):
+    """Apply a batch of transfers in one transaction.
+
+    Transfers are checked in order against balances fetched (and row-locked)
+    up front; each accepted transfer updates the in-memory running balance so
+    later items see its effect, and goes through the same fraud rules as a
+    single transfer. Only the net delta per account is written,
+    with one executemany UPDATE, and all Transaction rows are inserted with
+    one executemany INSERT. Returns one status dict per input item.
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        transfer, error = _validate(item)
+        if error:
+            results.append({'index': index, 'status': 'rejected', 'error': error})
+        else:
+            results.append({'index': index, 'status': 'pending'})
+            valid.append((index, transfer))
+
+    account_ids = set()
+    for _, transfer in valid:
+        account_ids.add(transfer['from_account_id'])
+        account_ids.add(transfer['to_account_id'])
+
+    try:
+        balances, currencies = _lock_balances(account_ids) if account_ids else ({}, {})
+        opening_balances = dict(balances)
+        deltas = {}
+        transactions = []
+        postings = []
+        for index, transfer in valid:
+            sender = transfer['from_account_id']
+            receiver = transfer['to_account_id']
+            amount = transfer['amount']
+            if sender not in balances or receiver not in balances:
+                results[index].update(status='rejected', error="Invalid accounts")
+                continue
+            # Rates come from the in-memory cache, as in the single transfer path
+            currency = transfer['currency']
+            try:
+                check_amount(amount, currency)
+                for account_id in (sender, receiver):
+                    check_currency(currencies[account_id])
+                if currencies[sender] == currency == currencies[receiver]:
+                    debited = credited = Money.of(amount)
+                else:
+                    debited = Money.of(rate_cache.convert(amount, currency, currencies[sender],
+                                                          transfer['date']))
+                    credited = Money.of(rate_cache.convert(amount, currency, currencies[receiver],
+                                                           transfer['date']))
+            except FxError as e:
+                results[index].update(status='rejected', error=str(e))
+                continue
+            # Scored in the sender's currency, like the windows rebuilt from the ledger
+            decision = fraud_engine.score(ledger.ACCOUNT, sender, debited, receiver)
+            if decision.blocked:
+                results[index].update(status='rejected',
+                                      error=f"Transfer refused by risk rules: {', '.join(decision.rules)}")
+                continue
+            if balances[sender] < debited:
+                results[index].update(status='rejected', error="Insufficient funds")
+                continue
+            balances[sender] -= debited
+            balances[receiver] += credited
+            deltas[sender] = deltas.get(sender, ZERO) - debited
+            deltas[receiver] = deltas.get(receiver, ZERO) + credited
+            for account_id, transaction_type, moved, signed, counterparty in (
+                    (sender, 'debit', debited, -debited, receiver),
+                    (receiver, 'credit', credited, credited, sender)):
+                transactions.append({
+                    'account_id': account_id,
+                    'amount': moved,
+                    'currency': currencies[account_id],
+                    'date': transfer['date'],
+                    'transaction_type': transaction_type,
+                })
+                postings.append((account_id, transaction_type, signed, transfer['date'], counterparty))
+            # Recorded now so that later items of the batch are scored with it;
+            # if the batch then fails, the windows err on the side of blocking
+            fraud_engine.record(ledger.ACCOUNT, sender, debited, receiver)
+            results[index]['status'] = 'ok'
+
+        accounts = Account.__table__
+        update_balance = (
+            accounts.update()
+            .where(accounts.c.id == bindparam('account_id'))
+            .values(balance=accounts.c.balance + bindparam('delta'))
+        )
+        params = [{'account_id': account_id, 'delta': delta}
+                  for account_id, delta in deltas.items() if delta]
+        for chunk in _chunks(params):
+            db.session.execute(update_balance, chunk)
+        for chunk in _chunks(transactions):
+            db.session.execute(Transaction.__table__.insert(), chunk)
+        ledger.post_many(ledger.ACCOUNT, postings, opening_balances)
+        entity_cache.mark_dirty(db.session, 'account', [p['account_id'] for p in params])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'accepted': sum(1 for r in results if r['status'] == 'ok'),
+        'rejected': sum(1 for r in results if r['status'] == 'rejected'),
+        'results': results,
+    }
+
+
+@celery.task(name='transfers.apply_batch')
+def apply_batch_task(items):
+    return apply_batch(items)